@@ -0,0 +1,659 @@
+"""
+Local stand-in for a warehouse server, used by the benchmark suite
+
+Implements the subset of the warehouse HTTP API used by the client library
+on top of the standard library http.server module: organizations, projects,
+bundles, files with upload and ranged download, /search/keys and project
+subscriptions. All state is kept in memory. Latency, bandwidth, response
+compression and a concurrency limit can be configured to simulate remote
+instances, and MockState.populate creates large result sets quickly.
+
+Usage: python benchmarks/mockserver.py [--port 8080] [--latency 0.05] [--bandwidth 10e6] [--bundles 10000]
+"""
+
+import argparse
+import fnmatch
+import gzip
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+
+class MockState():
+    """In-memory warehouse contents"""
+
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.organizations: Dict[str, Dict[str, Any]] = {}
+        self.projects: Dict[str, Dict[str, Any]] = {}
+        self.bundles: Dict[str, Dict[str, Any]] = {}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.subscriptions: Dict[str, Dict[str, Any]] = {}
+
+    def create_organization(self, name: str) -> str:
+        """Creates an organization and returns its ID"""
+        org_id = str(uuid.uuid4())
+        self.organizations[org_id] = {'id': org_id, 'name': name, 'projects': []}
+        return org_id
+
+    def find_organization(self, ident: str) -> Optional[Dict[str, Any]]:
+        """Looks up an organization by ID or name"""
+        if ident in self.organizations:
+            return self.organizations[ident]
+        for org in self.organizations.values():
+            if org['name'] == ident:
+                return org
+        return None
+
+    def create_project(self, org: Dict[str, Any], name: str) -> str:
+        """Creates a project within an organization and returns its ID"""
+        project_id = str(uuid.uuid4())
+        self.projects[project_id] = {'id': project_id, 'name': name, 'organization': org['id']}
+        org['projects'].append(project_id)
+        return project_id
+
+    def project_name(self, project: Dict[str, Any]) -> str:
+        """Returns the full 'organization/project' name of a project"""
+        return '%s/%s' % (self.organizations[project['organization']]['name'], project['name'])
+
+    def find_project(self, ident: str) -> Optional[Dict[str, Any]]:
+        """Looks up a project by ID or full name"""
+        if ident in self.projects:
+            return self.projects[ident]
+        for project in self.projects.values():
+            if self.project_name(project) == ident:
+                return project
+        return None
+
+    def create_bundle(self, project_id: str, props: Dict[str, Any]) -> str:
+        """Creates a bundle and returns its ID"""
+        bundle_id = str(uuid.uuid4())
+        self.bundles[bundle_id] = {'id': bundle_id, 'project': project_id, 'props': dict(props),
+                                   'files': [], 'trashed': False}
+        self.publish(project_id, {'event': 'bundle_created', 'bundle_id': bundle_id})
+        return bundle_id
+
+    def create_file(self, bundle_id: str, data: bytes, props: Dict[str, Any]) -> str:
+        """Creates a file within a bundle and returns its ID"""
+        file_id = str(uuid.uuid4())
+        self.files[file_id] = {'id': file_id, 'bundle': bundle_id, 'props': dict(props),
+                               'data': data, 'etag': '"%s"' % hashlib.sha1(data).hexdigest(), 'trashed': False}
+        self.bundles[bundle_id]['files'].append(file_id)
+        self.publish(self.bundles[bundle_id]['project'],
+                     {'event': 'file_created', 'bundle_id': bundle_id, 'file_id': file_id})
+        return file_id
+
+    def populate(self, project_id: str, bundles: int, properties: int=5, value_size: int=16,
+                 files_per_bundle: int=0, file_size: int=0) -> List[str]:
+        """Creates bundles with generated properties directly in the state, returning their IDs
+
+        Every bundle gets an integer 'index' property and properties 'p0'...
+        with strings of value_size characters, and files_per_bundle files of
+        file_size bytes. No events are published."""
+        data = b'x' * file_size
+        etag = '"%s"' % hashlib.sha1(data).hexdigest()
+        ids = []
+        for index in range(bundles):
+            bundle_id = str(uuid.uuid4())
+            props: Dict[str, Any] = {'index': index}
+            for n in range(properties):
+                props['p%d' % n] = ('%d-' % index).ljust(value_size, 'v')
+            self.bundles[bundle_id] = {'id': bundle_id, 'project': project_id, 'props': props,
+                                       'files': [], 'trashed': False}
+            for n in range(files_per_bundle):
+                file_id = str(uuid.uuid4())
+                self.files[file_id] = {'id': file_id, 'bundle': bundle_id, 'props': {'filename': 'f%d' % n},
+                                       'data': data, 'etag': etag, 'trashed': False}
+                self.bundles[bundle_id]['files'].append(file_id)
+            ids.append(bundle_id)
+        return ids
+
+    def publish(self, project_id: str, event: Dict[str, Any]):
+        """Appends an event to all subscriptions of a project"""
+        for subscription in self.subscriptions.values():
+            if subscription['project'] == project_id:
+                subscription['events'].append(event)
+        self.lock.notify_all()
+
+    def row_value(self, table: str, row: Dict[str, Any], key: str) -> Any:
+        """Resolves a search key for a bundle or file row"""
+        if table == 'files':
+            file_row = row
+            bundle_row = self.bundles[row['bundle']]
+        else:
+            file_row = None
+            bundle_row = row
+
+        project = self.projects[bundle_row['project']]
+        organization = self.organizations[project['organization']]
+
+        if key == 'bundle.id':
+            return bundle_row['id']
+        if key == 'file.id' and file_row is not None:
+            return file_row['id']
+        if key == 'project.id':
+            return project['id']
+        if key == 'project.name':
+            return self.project_name(project)
+        if key == 'organization.id':
+            return organization['id']
+        if key == 'organization.name':
+            return organization['name']
+        if key.startswith('bundle.'):
+            return bundle_row['props'].get(key[len('bundle.'):])
+        if key.startswith('file.') and file_row is not None:
+            return file_row['props'].get(key[len('file.'):])
+        return None
+
+    def matches(self, table: str, row: Dict[str, Any], query: Dict[str, Any]) -> bool:
+        """Evaluates a query object against a row"""
+        # pylint: disable=too-many-return-statements
+        if 'and' in query:
+            return all(self.matches(table, row, item) for item in query['and'])
+        if 'or' in query:
+            return any(self.matches(table, row, item) for item in query['or'])
+        if 'natural_query' in query:
+            text = query['natural_query'].strip()
+            if text.startswith('not (') and text.endswith(')'):
+                return not self.matches(table, row, {'natural_query': text[len('not ('):-1]})
+            if text.endswith(' exists'):
+                return self.row_value(table, row, text[:-len(' exists')].strip()) is not None
+            return True
+
+        comparisons = {
+            'equals': lambda a, b: str(a) == str(b),
+            'str_pattern_matches': lambda a, b: fnmatch.fnmatchcase(str(a), str(b).replace('%', '*')),
+            'greater_than': lambda a, b: a > b,
+            'greater_than_or_equals': lambda a, b: a >= b,
+            'less_than': lambda a, b: a < b,
+            'less_than_or_equals': lambda a, b: a <= b,
+        }
+        for name, compare in comparisons.items():
+            if name in query:
+                value = self.row_value(table, row, query[name]['key'])
+                if value is None:
+                    return False
+                try:
+                    return compare(value, query[name]['value'])
+                except TypeError:
+                    return False
+
+        raise ValueError('unsupported query: %r' % query)
+
+    def search(self, spec: Dict[str, Any]) -> List[List[Any]]:
+        """Executes a /search/keys request"""
+        table = spec['table']
+        rows = self.bundles if table == 'bundles' else self.files
+        matching = [row for row in rows.values()
+                    if not row['trashed'] and self.matches(table, row, spec.get('query') or {})]
+
+        sorting = spec.get('sorting') or {}
+        if sorting.get('key'):
+            def sort_key(row: Dict[str, Any]) -> Tuple[int, Any]:
+                value = self.row_value(table, row, sorting['key'])
+                return (value is None, value if value is not None else 0)
+
+            matching.sort(key=sort_key, reverse=sorting.get('order') == 'desc')
+
+        if spec.get('limit'):
+            matching = matching[:spec['limit']]
+
+        return [[self.row_value(table, row, key) for key in spec['keys']] for row in matching]
+
+
+class MockConfig():
+    """Simulated network conditions"""
+
+    def __init__(self, latency: float=0.0, bandwidth: float=0.0, compress: bool=True,
+                 support_ranges: bool=True, support_etags: bool=True, max_concurrent: int=0,
+                 retry_after: Optional[str]=None):
+        # Seconds added to every request
+        self.latency = latency
+        # Response bytes per second, 0 for unlimited
+        self.bandwidth = bandwidth
+        # gzip JSON responses larger than 1 KiB when the client accepts it
+        self.compress = compress
+        self.support_ranges = support_ranges
+        self.support_etags = support_etags
+        # Requests handled at once; more are answered 503, with Retry-After if set
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the warehouse API"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes, Nagle would delay the body by a delayed ACK
+    disable_nagle_algorithm = True
+    server: 'MockServer'
+
+    def log_message(self, format: str, *args: Any):  # pylint: disable=redefined-builtin
+        pass
+
+    # Transport helpers
+
+    def read_body(self) -> bytes:
+        """Reads the request body, honouring chunked transfer encoding"""
+        self.body_read = True
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = b''.join(chunks)
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+        self.server.stats['bytes_received'] += len(body)
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return body
+
+    def read_json(self) -> Any:
+        """Reads and decodes a JSON request body"""
+        body = self.read_body()
+        return json.loads(body) if body else None
+
+    def write_body(self, body: bytes):
+        """Writes a response body, throttled to the configured bandwidth"""
+        bandwidth = self.server.config.bandwidth
+        view = memoryview(body)
+        step = 64 * 1024
+        for offset in range(0, len(view), step):
+            chunk = view[offset:offset + step]
+            self.wfile.write(chunk)
+            if bandwidth > 0:
+                time.sleep(len(chunk) / bandwidth)
+        self.server.stats['bytes_sent'] += len(body)
+
+    def send(self, status: int, body: bytes=b'', headers: Optional[Dict[str, str]]=None):
+        """Queues a complete response, written once the state lock is released"""
+        self.response = (status, body, headers or {})
+
+    def flush_response(self):
+        """Writes the queued response"""
+        status, body, headers = self.response
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.write_body(body)
+
+    def send_json(self, obj: Any, status: int=200, cacheable: bool=False):
+        """Sends a JSON response, with ETag and gzip support"""
+        body = json.dumps(obj).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+
+        if cacheable and self.server.config.support_etags:
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                self.send(304, headers={'ETag': etag})
+                return
+
+        if (self.server.config.compress and len(body) > 1024
+                and 'gzip' in self.headers.get('Accept-Encoding', '')):
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+
+        self.send(status, body, headers)
+
+    def send_error_json(self, status: int, message: str):
+        """Sends an error response"""
+        self.send(status, message.encode('utf-8'), {'Content-Type': 'text/plain'})
+
+    # Dispatch
+
+    def handle_any(self):
+        """Routes a request to the matching API method"""
+        config = self.server.config
+        with self.server.active_lock:
+            self.server.active += 1
+            overloaded = 0 < config.max_concurrent < self.server.active
+        try:
+            if overloaded:
+                # Reject requests beyond the configured capacity
+                self.server.stats['rejected'] += 1
+                self.body_read = False
+                self.read_body()
+                self.send(503, b'overloaded', {'Retry-After': config.retry_after} if config.retry_after else {})
+                self.flush_response()
+                return
+            self.route_request()
+        finally:
+            with self.server.active_lock:
+                self.server.active -= 1
+
+    def route_request(self):
+        """Routes a request within the capacity of the server"""
+        if self.server.config.latency > 0:
+            time.sleep(self.server.config.latency)
+
+        self.server.stats['requests'] += 1
+        path = urlsplit(self.path).path
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        route = getattr(self, 'route_%s' % parts[0].replace('-', '_'), None)
+        self.body_read = False
+
+        try:
+            with self.server.state.lock:
+                if route is None or not route(parts[1:]):
+                    self.send_error_json(404, 'not found')
+        except (KeyError, ValueError) as e:
+            self.send_error_json(400, 'bad request: %s' % e)
+
+        try:
+            if not self.body_read:
+                # Drain unread bodies of failed requests, keeping the connection usable
+                self.read_body()
+            self.flush_response()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    do_GET = do_POST = do_PATCH = do_DELETE = do_HEAD = handle_any
+
+    # Routes
+
+    def route_ping(self, _parts: List[str]) -> bool:
+        """GET /ping"""
+        self.send(200)
+        return True
+
+    def route_checkToken(self, _parts: List[str]) -> bool:  # pylint: disable=invalid-name
+        """POST /checkToken"""
+        if not self.headers.get('Authorization'):
+            self.send_error_json(401, 'permission denied')
+        else:
+            self.send(200)
+        return True
+
+    def route_organizations(self, parts: List[str]) -> bool:
+        """/organizations endpoints"""
+        state = self.server.state
+        if not parts:
+            if self.command == 'POST':
+                org_id = state.create_organization(self.read_json()['name'])
+                self.send_json({'organization_id': org_id})
+                return True
+
+            self.send_json({'organizations': [{
+                'organization_id': org['id'],
+                'organization_name': org['name'],
+                'projects': [{'project_id': project_id,
+                              'project_name': state.projects[project_id]['name']}
+                             for project_id in org['projects']]
+            } for org in state.organizations.values()]}, cacheable=True)
+            return True
+
+        org = state.find_organization(parts[0])
+        if org is None:
+            if self.command == 'POST' and parts[1:] == ['projects']:
+                org = state.organizations[state.create_organization(parts[0])]
+            else:
+                return False
+
+        if parts[1:] == ['projects'] and self.command == 'POST':
+            self.send_json({'project_id': state.create_project(org, self.read_json()['name'])})
+        elif len(parts) == 1 and self.command == 'GET':
+            self.send_json({'organization_id': org['id'], 'organization_name': org['name']},
+                           cacheable=True)
+        elif len(parts) == 1 and self.command == 'DELETE':
+            del state.organizations[org['id']]
+            self.send_json({})
+        else:
+            return False
+        return True
+
+    def route_projects(self, parts: List[str]) -> bool:
+        """/projects endpoints"""
+        state = self.server.state
+        project = state.find_project(parts[0])
+        if project is None:
+            return False
+
+        if len(parts) == 1:
+            if self.command == 'DELETE':
+                del state.projects[project['id']]
+                state.organizations[project['organization']]['projects'].remove(project['id'])
+                self.send_json({})
+            else:
+                self.send_json({'project_id': project['id'],
+                                'project_name': state.project_name(project)}, cacheable=True)
+        elif parts[1] == 'bundles' and self.command == 'POST':
+            self.send_json({'bundle_id': state.create_bundle(project['id'], self.read_json() or {})})
+        elif parts[1] == 'subscriptions':
+            return self.handle_subscription(project, parts[2:])
+        else:
+            return False
+        return True
+
+    def handle_subscription(self, project: Dict[str, Any], parts: List[str]) -> bool:
+        """Subscription create/poll/delete"""
+        state = self.server.state
+        if not parts and self.command == 'POST':
+            subscription_id = str(uuid.uuid4())
+            state.subscriptions[subscription_id] = {'project': project['id'], 'events': []}
+            self.send_json({'subscription_id': subscription_id})
+            return True
+
+        subscription = state.subscriptions.get(parts[0]) if parts else None
+        if subscription is None:
+            return False
+
+        if self.command == 'DELETE':
+            del state.subscriptions[parts[0]]
+            self.send_json({})
+            return True
+
+        deadline = time.monotonic() + self.server.poll_timeout
+        while not subscription['events'] and time.monotonic() < deadline:
+            state.lock.wait(deadline - time.monotonic())
+
+        events, subscription['events'] = subscription['events'], []
+        self.send_json({'events': events})
+        return True
+
+    def route_bundles(self, parts: List[str]) -> bool:
+        """/bundles endpoints"""
+        state = self.server.state
+        bundle = state.bundles.get(parts[0])
+        if bundle is None:
+            return False
+
+        action = parts[1] if len(parts) > 1 else None
+        if action is None and self.command == 'GET':
+            doc = dict(bundle['props'])
+            doc['bundle_id'] = bundle['id']
+            doc['files'] = [{'file_id': file_id} for file_id in bundle['files']
+                            if not state.files[file_id]['trashed']]
+            self.send_json(doc, cacheable=True)
+        elif action is None and self.command == 'PATCH':
+            self.apply_patch(bundle['props'], self.read_json())
+            state.publish(bundle['project'], {'event': 'bundle_updated', 'bundle_id': bundle['id']})
+            self.send_json(bundle['props'])
+        elif action is None and self.command == 'DELETE':
+            for file_id in bundle['files']:
+                del state.files[file_id]
+            del state.bundles[bundle['id']]
+            self.send_json({})
+        elif action in ('trash', 'restore'):
+            bundle['trashed'] = action == 'trash'
+            self.send_json({})
+        elif action == 'files' and self.command == 'POST':
+            data, props = self.read_multipart()
+            self.send_json({'file_id': state.create_file(bundle['id'], data, props)})
+        else:
+            return False
+        return True
+
+    def route_files(self, parts: List[str]) -> bool:
+        """/files endpoints"""
+        state = self.server.state
+        file_row = state.files.get(parts[0])
+        if file_row is None:
+            return False
+
+        action = parts[1] if len(parts) > 1 else None
+        if action is None and self.command == 'GET':
+            doc = dict(file_row['props'])
+            doc['file_id'] = file_row['id']
+            doc['bundle_id'] = file_row['bundle']
+            self.send_json(doc, cacheable=True)
+        elif action is None and self.command == 'PATCH':
+            self.apply_patch(file_row['props'], self.read_json())
+            self.send_json(file_row['props'])
+        elif action is None and self.command == 'DELETE':
+            state.bundles[file_row['bundle']]['files'].remove(file_row['id'])
+            del state.files[file_row['id']]
+            self.send_json({})
+        elif action in ('trash', 'restore'):
+            file_row['trashed'] = action == 'trash'
+            self.send_json({})
+        elif action == 'download' and self.command in ('GET', 'HEAD'):
+            self.send_download(file_row)
+        else:
+            return False
+        return True
+
+    def route_search(self, parts: List[str]) -> bool:
+        """POST /search/keys"""
+        if parts != ['keys'] or self.command != 'POST':
+            return False
+        self.send_json({'results': self.server.state.search(self.read_json())})
+        return True
+
+    # Payload helpers
+
+    @staticmethod
+    def apply_patch(props: Dict[str, Any], operations: List[Dict[str, Any]]):
+        """Applies a list of assign/delete operations"""
+        for operation in operations:
+            if 'assign' in operation:
+                props[operation['assign']['key']] = operation['assign']['value']
+            elif 'delete' in operation:
+                props.pop(operation['delete']['key'], None)
+
+    def read_multipart(self) -> Tuple[bytes, Dict[str, Any]]:
+        """Parses the multipart upload body into file data and properties"""
+        content_type = self.headers['Content-Type']
+        boundary = content_type.split('boundary=')[1].strip('"').encode('ascii')
+        body = self.read_body()
+
+        data = b''
+        props: Dict[str, Any] = {}
+        for part in body.split(b'--' + boundary)[1:]:
+            if part.startswith(b'--'):
+                break
+            head, _, content = part[2:].partition(b'\r\n\r\n')
+            content = content[:-2]
+            if b'name="properties"' in head:
+                props = json.loads(content)
+            elif b'name="file"' in head:
+                data = content
+        return data, props
+
+    def send_download(self, file_row: Dict[str, Any]):
+        """Sends file contents, honouring Range and If-Range"""
+        data = file_row['data']
+        etag = file_row['etag']
+        headers = {
+            'Content-Type': 'application/octet-stream',
+            'x-content-filename': file_row['props'].get('filename', 'download'),
+            'ETag': etag,
+        }
+
+        byte_range = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if (byte_range and self.server.config.support_ranges
+                and (if_range is None or if_range == etag)):
+            headers['Accept-Ranges'] = 'bytes'
+            start_text, _, end_text = byte_range.split('=')[1].partition('-')
+            start = int(start_text)
+            end = int(end_text) if end_text else len(data) - 1
+            end = min(end, len(data) - 1)
+            if start >= len(data):
+                self.send(416, headers={'Content-Range': 'bytes */%d' % len(data)})
+                return
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, len(data))
+            self.send(206, data[start:end + 1], headers)
+            return
+
+        if self.server.config.support_ranges:
+            headers['Accept-Ranges'] = 'bytes'
+        self.send(200, data, headers)
+
+
+class MockServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the mock warehouse state"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int]=('127.0.0.1', 0), config: Optional[MockConfig]=None,
+                 poll_timeout: float=30.0):
+        super().__init__(address, MockHandler)
+        self.state = MockState()
+        self.config = config or MockConfig()
+        self.poll_timeout = poll_timeout
+        self.stats = {'requests': 0, 'bytes_sent': 0, 'bytes_received': 0, 'rejected': 0}
+        self.active = 0
+        self.active_lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the running server"""
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def start(self) -> 'MockServer':
+        """Serves requests in a background thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stops the background thread"""
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args: Any):
+        self.stop()
+
+
+def main():
+    """Runs the mock server in the foreground"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--bandwidth', type=float, default=0.0, help='bytes per second, 0 for unlimited')
+    parser.add_argument('--bundles', type=int, default=0, help='bundles created in the project mock/data')
+    args = parser.parse_args()
+
+    server = MockServer((args.host, args.port), MockConfig(args.latency, args.bandwidth))
+    if args.bundles:
+        state = server.state
+        organization = state.organizations[state.create_organization('mock')]
+        state.populate(state.create_project(organization, 'data'), args.bundles)
+    print('Serving mock warehouse on %s' % server.url)
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Result set memory benchmark
+
+Compares the memory held by search results stored as a list of WHBundle
+objects (find_bundles) and as a ResultSet (find_bundles with compact=True),
+with and without a projected search key. The rows are generated locally and
+fed through the same code paths as a search response, so no server is
+needed.
+
+Usage: python benchmarks/resultset_memory.py [--rows 1000000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import warehouse as wh  # pylint: disable=wrong-import-position
+
+
+def measure(build):
+    """Returns the bytes allocated by build that are still held by its result"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='number of result rows')
+    args = parser.parse_args()
+
+    client = wh.Client('http://127.0.0.1:1', wh.ApikeyAuth('benchmark'))
+
+    def rows(keys):
+        # Rows are generated as they are consumed, like a streamed search response
+        for i in range(args.rows):
+            yield [str(uuid.uuid4())] + [i] * len(keys)
+
+    def objects(keys):
+        columns = ['bundle.id'] + keys
+        return [client.bundle(row[0], client.internal_row_properties(columns, keys or None, row))
+                for row in rows(keys)]
+
+    def result_set(keys):
+        result = wh.ResultSet(client.bundle, keys or None)
+        result.extend_rows(['bundle.id'] + keys, rows(keys))
+        return result
+
+    print('%-10s %-10s %14s %10s' % ('storage', 'keys', 'bytes/row', 'ratio'))
+    for keys in ([], ['bundle.size']):
+        baseline = measure(lambda: objects(keys)) / args.rows
+        compact = measure(lambda: result_set(keys)) / args.rows
+        print('%-10s %-10d %14.1f %10s' % ('objects', len(keys), baseline, ''))
+        print('%-10s %-10d %14.1f %9.1fx' % ('resultset', len(keys), compact, baseline / compact))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""
+Benchmark suite
+
+Measures the client against the local mock server (benchmarks/mockserver.py),
+which runs in a separate process so its CPU time does not compete with the
+client: search throughput, property fetch rate, upload and download MB/s,
+memory per search result row and import time. Results are compared with a
+stored baseline; --save replaces the baseline with the current results, and
+--check exits with status 1 when a result is worse than the baseline by more
+than the tolerance.
+
+Baselines are only comparable on the same machine and settings, which are
+stored next to the results.
+
+Usage: python benchmarks/suite.py [--bundles 20000] [--file-mb 64] [--latency 0] [--save] [--check]
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import warehouse as wh  # pylint: disable=wrong-import-position
+from mockserver import MockConfig, MockServer  # pylint: disable=wrong-import-position
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Benchmarks by name: unit, and whether higher values are better
+BENCHMARKS = {
+    'import_time': ('ms', False),
+    'search': ('rows/s', True),
+    'search_compact': ('rows/s', True),
+    'property_fetch': ('req/s', True),
+    'property_fetch_threaded': ('req/s', True),
+    'upload_file': ('MB/s', True),
+    'upload_path': ('MB/s', True),
+    'download': ('MB/s', True),
+    'memory_per_row': ('bytes', False),
+    'memory_per_row_compact': ('bytes', False),
+}
+
+
+def serve(conn, settings):
+    """Runs the mock server with generated data, sending its URL through conn"""
+    server = MockServer(config=MockConfig(latency=settings['latency'], bandwidth=settings['bandwidth']))
+    state = server.state
+    organization = state.organizations[state.create_organization('benchmark')]
+    project_id = state.create_project(organization, 'data')
+    state.populate(project_id, settings['bundles'], settings['properties'], settings['value_size'])
+    state.create_project(organization, 'uploads')
+    conn.send(server.url)
+    server.serve_forever()
+
+
+def best_rate(amount, run, repeat):
+    """Returns the highest rate of amount per second over repeat runs"""
+    best = 0.0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = max(best, amount / (time.perf_counter() - started))
+    return best
+
+
+def retained_bytes(build):
+    """Returns the bytes allocated by build that are still held by its result"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def import_time(repeat):
+    """Returns the median time in milliseconds to import warehouse in a new interpreter"""
+    code = 'import time; t = time.perf_counter(); import warehouse; print(time.perf_counter() - t)'
+    times = []
+    for _ in range(max(repeat, 5)):
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, capture_output=True, text=True)
+        times.append(float(output.stdout) * 1000)
+    return statistics.median(times)
+
+
+def run_benchmarks(client, args):
+    """Runs the benchmarks and returns their results by name"""
+    results = {}
+    results['import_time'] = import_time(args.repeat)
+
+    project = client.project('benchmark/data')
+    keys = ['bundle.index'] + ['bundle.p%d' % n for n in range(args.properties)]
+    results['search'] = best_rate(args.bundles, lambda: project.find_bundles('', keys=keys), args.repeat)
+    results['search_compact'] = best_rate(args.bundles, lambda: project.find_bundles('', keys=keys, compact=True),
+                                          args.repeat)
+
+    results['memory_per_row'] = retained_bytes(lambda: project.find_bundles('', keys=keys)) / args.bundles
+    results['memory_per_row_compact'] = retained_bytes(
+        lambda: project.find_bundles('', keys=keys, compact=True)) / args.bundles
+
+    bundles = project.find_bundles('', limit=args.fetches)
+    results['property_fetch'] = best_rate(len(bundles), lambda: [b.get_properties() for b in bundles], args.repeat)
+
+    def fetch_threaded():
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda b: b.get_properties(), bundles))
+    results['property_fetch_threaded'] = best_rate(len(bundles), fetch_threaded, args.repeat)
+
+    size = args.file_mb * 1024 * 1024
+    uploads = client.project('benchmark/uploads')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'upload.bin')
+        with open(path, 'wb') as f:
+            block = os.urandom(1024 * 1024)
+            for _ in range(args.file_mb):
+                f.write(block)
+
+        bundle = uploads.create_bundle({})
+        uploaded = []
+
+        def upload_file():
+            with open(path, 'rb') as f:
+                uploaded.append(bundle.upload_file(f, 'upload.bin'))
+        results['upload_file'] = best_rate(args.file_mb, upload_file, args.repeat)
+        results['upload_path'] = best_rate(args.file_mb, lambda: bundle.upload_path(path), args.repeat)
+
+        target = os.path.join(tmp, 'download')
+        os.mkdir(target)
+        results['download'] = best_rate(args.file_mb, lambda: uploaded[0].download(target + '/'), args.repeat)
+        if os.path.getsize(os.path.join(target, 'upload.bin')) != size:
+            raise RuntimeError('downloaded file has the wrong size')
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Prints the results next to the baseline, returning the names of regressed benchmarks"""
+    regressions = []
+    print('%-26s %14s %14s %9s' % ('benchmark', 'result', 'baseline', 'change'))
+    for name, value in results.items():
+        unit, higher_better = BENCHMARKS[name]
+        base = baseline.get(name)
+        line = '%-26s %14s' % (name, '%.1f %s' % (value, unit))
+        if base:
+            change = value / base - 1
+            worse = -change if higher_better else change
+            flag = ''
+            if worse > tolerance:
+                flag = '  REGRESSION'
+                regressions.append(name)
+            line += ' %14s %+8.1f%%%s' % ('%.1f' % base, change * 100, flag)
+        print(line)
+
+    return regressions
+
+
+def environment(args):
+    """Returns the machine and settings the results were measured with"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'settings': {key: getattr(args, key) for key in ('bundles', 'properties', 'value_size', 'fetches',
+                                                         'file_mb', 'latency', 'bandwidth')},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bundles', type=int, default=20000, help='bundles returned by the search benchmarks')
+    parser.add_argument('--properties', type=int, default=5, help='string properties per bundle')
+    parser.add_argument('--value-size', type=int, default=16, help='characters per property value')
+    parser.add_argument('--fetches', type=int, default=500, help='bundles fetched by the property benchmarks')
+    parser.add_argument('--file-mb', type=int, default=64, help='size of the uploaded and downloaded file')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the server adds to every request')
+    parser.add_argument('--bandwidth', type=float, default=0.0, help='server bytes per second, 0 for unlimited')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the best is reported')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='relative change reported as regression')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 on regressions')
+    args = parser.parse_args()
+
+    settings = {'latency': args.latency, 'bandwidth': args.bandwidth, 'bundles': args.bundles,
+                'properties': args.properties, 'value_size': args.value_size}
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    server = multiprocessing.Process(target=serve, args=(sender, settings), daemon=True)
+    server.start()
+    try:
+        url = receiver.recv()
+        client = wh.Client(url, wh.ApikeyAuth('benchmark'))
+        results = run_benchmarks(client, args)
+    finally:
+        server.terminate()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored['environment'] != environment(args):
+            print('Baseline was measured on another machine or with other settings: %s\n' % stored['environment'])
+        baseline = stored['results']
+
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({'environment': environment(args), 'results': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('\nBaseline saved to %s' % args.baseline)
+
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Upload CPU benchmark
+
+Compares the CPU time per GB spent by the client in WHBundle.upload_file
+(streaming read of a file object) and WHBundle.upload_path (sendfile over
+plain HTTP, memory map otherwise). Uploads go to a local sink server,
+running in a separate process so its CPU time is not counted, which
+discards the body and answers with a file ID.
+
+Usage: python benchmarks/upload_cpu.py [--size-mb 1024] [--repeat 3]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import warehouse as wh  # pylint: disable=wrong-import-position
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    """Reads and discards request bodies"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        remaining = int(self.headers.get('Content-Length') or 0)
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+        body = json.dumps({'file_id': 'sink'}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port):
+    """Runs the sink server"""
+    ThreadingHTTPServer(('127.0.0.1', port), SinkHandler).serve_forever()
+
+
+def measure(upload, size):
+    """Returns the CPU seconds per GB and wall time of an upload"""
+    cpu = time.process_time()
+    wall = time.monotonic()
+    upload()
+    cpu = time.process_time() - cpu
+    wall = time.monotonic() - wall
+    return cpu * 1024 ** 3 / size, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=1024, help='size of the uploaded file')
+    parser.add_argument('--repeat', type=int, default=3, help='uploads per method, the best is reported')
+    parser.add_argument('--port', type=int, default=18765, help='port of the sink server')
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=serve, args=(args.port,), daemon=True)
+    server.start()
+    time.sleep(0.5)
+
+    client = wh.Client('http://127.0.0.1:%d' % args.port, wh.ApikeyAuth('benchmark'))
+    bundle = client.bundle('benchmark')
+    size = args.size_mb * 1024 * 1024
+
+    with tempfile.NamedTemporaryFile() as tmp:
+        block = os.urandom(1024 * 1024)
+        for _ in range(args.size_mb):
+            tmp.write(block)
+        tmp.flush()
+
+        def upload_file():
+            with open(tmp.name, 'rb') as f:
+                bundle.upload_file(f, 'benchmark')
+
+        methods = [
+            ('upload_file', upload_file),
+            ('upload_path', lambda: bundle.upload_path(tmp.name)),
+        ]
+
+        print('%-12s %12s %10s' % ('method', 'CPU s/GB', 'MB/s'))
+        for name, upload in methods:
+            cpu, wall = min(measure(upload, size) for _ in range(args.repeat))
+            print('%-12s %12.3f %10.0f' % (name, cpu, args.size_mb / wall))
+
+    server.terminate()
+
+
+if __name__ == '__main__':
+    main()
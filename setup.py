@@ -19,6 +19,12 @@ setup(
     install_requires=[
         'requests',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'compression': ['urllib3[brotli,zstd]'],
+        'json': ['orjson'],
+        'table': ['numpy', 'pyarrow', 'pandas'],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',
@@ -0,0 +1,120 @@
+import pytest
+import requests
+
+import warehouse as wh
+from warehouse.admission import backoff_delay, retry_after
+
+def test_additive_increase():
+    controller = wh.AdmissionController(initial=2, maximum=4)
+    for _ in range(20):
+        controller.acquire()
+        controller.release(0.01, False)
+
+    assert controller.stats()['limit'] == 4
+
+def test_multiplicative_decrease():
+    controller = wh.AdmissionController(initial=8, minimum=2)
+    controller.acquire()
+    controller.release(0.0, True)
+    assert controller.stats()['limit'] == 4
+
+    controller.acquire()
+    controller.release(0.0, True)
+    controller.acquire()
+    controller.release(0.0, True)
+    assert controller.stats()['limit'] == 2
+    assert controller.stats()['overloads'] == 3
+
+def test_target_latency():
+    controller = wh.AdmissionController(initial=8, target_latency=0.5)
+    controller.acquire()
+    controller.release(1.0, False)
+    assert controller.stats()['limit'] == 4
+
+def test_retry_after():
+    assert retry_after('3') == 3.0
+    assert retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert retry_after('soon') is None
+    assert retry_after(None) is None
+    assert 0 <= backoff_delay(10, maximum=2.0) <= 2.0
+
+def test_connection_refused_not_overload():
+    client = wh.Client('http://127.0.0.1:1', None, admission=wh.AdmissionController(initial=8), retries=1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.ping()
+
+    assert client.session.admission.stats()['limit'] == 8
+    assert client.session.admission.stats()['overloads'] == 0
+
+class ScriptedAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, script):
+        super().__init__()
+        self.script = list(script)
+        self.methods = []
+
+    def send(self, request, **kwargs):
+        self.methods.append(request.method)
+        item = self.script.pop(0)
+        if isinstance(item, Exception):
+            raise item
+
+        status, headers = item
+        res = requests.Response()
+        res.status_code = status
+        res.headers.update(headers)
+        res._content = b'{}'
+        res.request = request
+        res.url = request.url
+        return res
+
+    def close(self):
+        pass
+
+def scripted_client(script, **kwargs):
+    client = wh.Client('http://stub', None, **kwargs)
+    adapter = ScriptedAdapter(script)
+    client.session.mount('http://stub', adapter)
+    return client, adapter
+
+def test_retry_idempotent(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('warehouse.client.time.sleep', sleeps.append)
+    client, adapter = scripted_client([(503, {}), requests.exceptions.ReadTimeout(), (200, {})], retries=2)
+
+    assert client.session.get('http://stub/ping').status_code == 200
+    assert adapter.methods == ['GET', 'GET', 'GET']
+    assert len(sleeps) == 2
+    assert client.stats()['endpoints']['GET /ping']['retries'] == 2
+
+def test_retry_exhausted(monkeypatch):
+    monkeypatch.setattr('warehouse.client.time.sleep', lambda delay: None)
+    client, adapter = scripted_client([(502, {}), (502, {})], retries=1)
+
+    assert client.session.get('http://stub/ping').status_code == 502
+    assert len(adapter.methods) == 2
+
+def test_no_retry_post(monkeypatch):
+    monkeypatch.setattr('warehouse.client.time.sleep', lambda delay: None)
+    client, adapter = scripted_client([(503, {}), requests.exceptions.ReadTimeout()], retries=3)
+
+    assert client.session.post('http://stub/ping').status_code == 503
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.session.post('http://stub/ping')
+    assert adapter.methods == ['POST', 'POST']
+
+def test_no_retry_by_default(monkeypatch):
+    monkeypatch.setattr('warehouse.client.time.sleep', lambda delay: None)
+    client, adapter = scripted_client([(503, {})])
+
+    assert client.session.get('http://stub/ping').status_code == 503
+    assert len(adapter.methods) == 1
+
+def test_retry_honours_retry_after(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('warehouse.client.time.sleep', sleeps.append)
+    client, adapter = scripted_client([(429, {'Retry-After': '7'}), (200, {})], retries=1)
+    client.session.max_backoff = 0.1
+
+    assert client.session.get('http://stub/ping').status_code == 200
+    assert sleeps == [7.0]
+    assert len(adapter.methods) == 2
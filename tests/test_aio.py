@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+import helper
+
+aio = pytest.importorskip('warehouse.aio')
+
+sync_client = helper.get_wh_client()
+
+def async_client():
+    return aio.AsyncClient(sync_client.url, sync_client.auth, max_concurrency=8)
+
+def test_bundle_properties():
+    async def run(project_id):
+        async with async_client() as c:
+            p = c.project(project_id)
+            bundle = await p.create_bundle({'integer': 123})
+            await bundle.update_properties({'integer': 321, 'new': 'testvalue'})
+
+            props = await bundle.get_properties()
+            assert props['integer'] == 321
+            assert props['new'] == 'testvalue'
+
+    with helper.TemporaryProject(sync_client) as p:
+        asyncio.run(run(p.id))
+
+def test_concurrent_upload_and_search():
+    async def run(project_id):
+        async with async_client() as c:
+            p = c.project(project_id)
+            bundle = await p.create_bundle({})
+            await asyncio.gather(*[bundle.upload_file(b'data', 'file%d' % i) for i in range(10)])
+
+            files = [f async for f in p.iter_files('', page_size=3)]
+            assert len(files) == 10
+
+    with helper.TemporaryProject(sync_client) as p:
+        asyncio.run(run(p.id))
+
+def test_event_dispatcher():
+    async def run(project_id):
+        async with async_client() as c:
+            async with aio.EventDispatcher(c, [project_id], maxsize=10) as dispatcher:
+                await asyncio.sleep(1)
+                await c.project(project_id).create_bundle({})
+
+                project, events = await asyncio.wait_for(dispatcher.get(), 60)
+                assert project.id == project_id
+                assert events
+                assert not dispatcher.errors
+
+            assert not dispatcher.tasks
+
+    with helper.TemporaryProject(sync_client) as p:
+        asyncio.run(run(p.id))
@@ -1,4 +1,5 @@
 import tempfile
+import os
 import warehouse as wh
 import helper
 
@@ -71,8 +72,92 @@ def test_upload_file_object():
         files = bundle.files()
         assert len(files) == 1
 
+def test_upload_iterable():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+        file = bundle.upload_file((b'chunk%d' % i for i in range(3)), 'filename', checksum='sha256')
+
+        with tempfile.TemporaryDirectory() as directory:
+            target = file.download(directory + '/', verify=True)
+            assert open(target, 'rb').read() == b'chunk0chunk1chunk2'
+
+def test_upload_path():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+
+        with tempfile.TemporaryDirectory() as directory:
+            open(directory + '/source', 'wb').write(b'filedata' * 1000)
+            file = bundle.upload_path(directory + '/source', checksum='sha256')
+
+            target = file.download(directory + '/', verify=True)
+            assert target == directory + '/source'
+            assert open(target, 'rb').read() == b'filedata' * 1000
+
+def test_upload_tree():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(directory + '/sub')
+            for name in ('a.txt', 'b.bin', 'sub/c.txt'):
+                open(directory + '/' + name, 'wb').write(name.encode())
+
+            result = bundle.upload_tree(directory, '*.txt', workers=2, props_fn=lambda path: {'path': path})
+            assert result.ok
+            assert sorted(result.results) == ['a.txt', 'sub/c.txt']
+            assert result.results['sub/c.txt'].get_properties()['filename'] == 'sub/c.txt'
+            assert result.results['sub/c.txt'].get_properties()['path'] == 'sub/c.txt'
+
+            result = bundle.upload_tree(directory, '*.txt', workers=2, props_fn=lambda path: {'a.txt': {}}[path])
+            assert sorted(result.results) == ['a.txt']
+            assert isinstance(result.errors['sub/c.txt'], KeyError)
+
+def test_batched_updates():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({'removed': 1})
+
+        with bundle.batched_updates() as b:
+            for i in range(10):
+                b.update_properties({'counter': i, 'status': 'running'})
+            b.update_properties({'removed': None})
+
+        assert b.flushes == 1
+        props = bundle.get_properties()
+        assert props['counter'] == 9
+        assert 'removed' not in props
+
 def test_find_file():
     with helper.TemporaryProject(client) as p:
         bundle = p.create_bundle({})
         bundle.upload_file(b'test', 'testfile')
-        assert type(bundle.find_file('')) is wh.WHFile
\ No newline at end of file
+        assert type(bundle.find_file('')) is wh.WHFile
+
+def test_iter_files():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+        for _ in range(5):
+            bundle.upload_file(b'test', 'testfile')
+
+        assert len(list(bundle.iter_files('', page_size=2))) == 5
+
+def test_find_files_keys():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+        bundle.upload_file(b'test', 'testfile')
+
+        files = bundle.find_files('', keys=['file.filename'])
+        assert files[0].properties == {'file.filename': 'testfile'}
+
+def test_property_cache():
+    cached_client = wh.Client(client.url, client.auth, property_cache=wh.LRUCache())
+    with helper.TemporaryProject(cached_client) as p:
+        bundle = p.create_bundle({'integer': 1})
+        bundle.get_properties()
+        assert cached_client.bundle(bundle.id).get_properties()['integer'] == 1
+        assert cached_client.property_cache.stats()['hits'] == 1
+
+        bundle.update_properties({'integer': 2})
+        assert bundle.get_properties()['integer'] == 2
+
+        bundle.upload_file(b'data', 'filename')
+        assert len(bundle.files()) == 1
@@ -0,0 +1,73 @@
+import tempfile
+import time
+import pytest
+import warehouse as wh
+from warehouse.cache import canonical_key
+
+def test_lru_eviction():
+    cache = wh.LRUCache(maxsize=2, ttl=None)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+def test_ttl_expiry():
+    cache = wh.LRUCache(maxsize=2, ttl=0.01)
+    cache.put('a', {'key': 'value'})
+    time.sleep(0.02)
+
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+def test_copies_values():
+    cache = wh.LRUCache()
+    cache.put('a', {'key': 'value'})
+    cache.get('a')['key'] = 'changed'
+
+    assert cache.get('a') == {'key': 'value'}
+
+def test_canonical_key():
+    a = wh.Client.equals_query('a', '1')
+    b = wh.Client.str_matches_query('b', '2*')
+    query = {'table': 'bundles', 'keys': ['bundle.id'], 'query': wh.Client.and_query([a, b])}
+    reordered = {'query': wh.Client.and_query([b, a]), 'keys': ['bundle.id'], 'table': 'bundles'}
+    assert canonical_key(query) == canonical_key(reordered)
+
+    query['keys'] = ['bundle.id', 'bundle.version']
+    assert canonical_key(query) != canonical_key(reordered)
+
+def test_lru_shared_values():
+    cache = wh.LRUCache()
+    rows = ((1, 'a'), (2, 'b'))
+    cache.put('rows', rows, copy_value=False)
+    assert cache.get('rows', copy_value=False) is rows
+
+def test_disk_response_store():
+    with tempfile.TemporaryDirectory() as directory:
+        entry = {'status_code': 200, 'headers': {'ETag': '"abc"'}, 'content': b'{"key": "value"}'}
+        wh.DiskResponseStore(directory).put('https://warehouse/bundles/1', entry)
+
+        assert wh.DiskResponseStore(directory).get('https://warehouse/bundles/1') == entry
+        assert wh.DiskResponseStore(directory).get('https://warehouse/bundles/2') is None
+
+def test_disk_response_store_eviction():
+    with tempfile.TemporaryDirectory() as directory:
+        store = wh.DiskResponseStore(directory, max_entries=10)
+        for i in range(11):
+            store.put('https://warehouse/bundles/%d' % i, {'status_code': 200, 'headers': {}, 'content': b'x'})
+            time.sleep(0.01)
+
+        assert store.evictions == 2
+        assert store.get('https://warehouse/bundles/0') is None
+        assert store.get('https://warehouse/bundles/10') is not None
+
+        store.clear()
+        assert store.get('https://warehouse/bundles/10') is None
+
+def test_response_store_abstract():
+    with pytest.raises(TypeError):
+        wh.ResponseStore()  # pylint: disable=abstract-class-instantiated
@@ -1,4 +1,5 @@
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 import warehouse as wh
 import helper
 
@@ -59,3 +60,129 @@ def test_find_file():
         bundle.upload_file(b'test', 'testfile')
         assert type(client.find_file('')) is wh.WHFile
 
+def test_iter_bundles():
+    with helper.TemporaryProject(client) as p:
+        for _ in range(5):
+            p.create_bundle({})
+
+        bundles = list(client.iter_bundles('', page_size=2))
+        assert len(bundles) >= 5
+        assert len(set(b.id for b in bundles)) == len(bundles)
+
+def test_iter_files():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+        for _ in range(5):
+            bundle.upload_file(b'test', 'testfile')
+
+        assert len(list(client.iter_files('', limit=3, page_size=2))) == 3
+
+def test_find_bundles_keys():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({'version': '1.2.3'})
+
+        found = p.find_bundle('', keys=['bundle.version'])
+        assert found.id == bundle.id
+        assert found.properties == {'bundle.version': '1.2.3'}
+
+def test_find_bundles_compact():
+    with helper.TemporaryProject(client) as p:
+        bundles = [p.create_bundle({'version': str(i)}) for i in range(3)]
+
+        found = p.find_bundles('', keys=['bundle.version'], compact=True)
+        assert isinstance(found, wh.ResultSet)
+        assert sorted(found.ids()) == sorted(b.id for b in bundles)
+        assert sorted(b.properties['bundle.version'] for b in found) == ['0', '1', '2']
+
+def test_search_table():
+    pytest.importorskip('numpy')
+    with helper.TemporaryProject(client) as p:
+        bundles = {p.create_bundle({'size': i}).id: i for i in range(3)}
+
+        table = client.search_table('bundles', '', ['bundle.size'], page_size=2)
+        assert table.dtype.names == ('bundle.id', 'bundle.size')
+        sizes = dict(zip(table['bundle.id'], table['bundle.size']))
+        assert {bundle_id: sizes[bundle_id] for bundle_id in bundles} == bundles
+
+def test_http_cache():
+    cached_client = wh.Client(client.url, client.auth, http_cache=True)
+    with helper.TemporaryProject(cached_client) as p:
+        bundle = p.create_bundle({'integer': 1})
+        url = '%s/bundles/%s' % (cached_client.url, bundle.id)
+        first = cached_client.session.get(url)
+        assert first.json()['integer'] == 1
+        assert not getattr(first, 'from_cache', False)
+
+        second = cached_client.session.get(url)
+        assert second.json()['integer'] == 1
+        assert second.from_cache
+        assert 'If-None-Match' in second.request.headers
+        assert bundle.get_properties()['integer'] == 1
+
+        bundle.update_properties({'integer': 2})
+        assert bundle.get_properties()['integer'] == 2
+        assert sum(counters.get('statuses', {}).get(304, 0)
+                   for counters in cached_client.stats()['endpoints'].values()) == 2
+
+def test_search_cache():
+    cached_client = wh.Client(client.url, client.auth, search_cache=wh.LRUCache())
+    with helper.TemporaryProject(cached_client) as p:
+        bundle = p.create_bundle({'integer': 1})
+        assert [b.id for b in p.find_bundles('')] == [bundle.id]
+        assert [b.id for b in p.find_bundles('')] == [bundle.id]
+        assert cached_client.search_cache.stats()['hits'] == 1
+
+        other = p.create_bundle({'integer': 2})
+        assert sorted(b.id for b in p.find_bundles('')) == sorted([bundle.id, other.id])
+
+def test_stats():
+    metrics_client = wh.Client(client.url, client.auth, property_cache=wh.LRUCache())
+    with helper.TemporaryProject(metrics_client) as p:
+        bundle = p.create_bundle({'integer': 1})
+        bundle.get_properties()
+
+        stats = metrics_client.stats()
+        assert stats['endpoints']['GET /bundles/{id}']['statuses'] == {200: 1}
+        assert stats['endpoints']['GET /bundles/{id}']['received'] > 0
+        assert stats['calls']['WHBundle.get_properties']['calls'] == 1
+        assert stats['calls']['WHProject.create_bundle']['errors'] == 0
+        assert 'property' in stats['caches']
+        assert stats['admission'] is None
+
+def test_update_properties_many():
+    with helper.TemporaryProject(client) as p:
+        bundles = [p.create_bundle({'n': i}) for i in range(5)]
+        updates = [(b, {'tag': 'a'}) for b in bundles] + [(bundles[0].id, {'tag': 'b', 'n': None})]
+
+        result = client.update_properties_many(updates, workers=4)
+        assert result.ok
+        assert len(result.results) == 5
+        assert bundles[0].get_properties().get('n') is None
+        assert bundles[0].get_properties()['tag'] == 'b'
+        assert bundles[1].get_properties()['tag'] == 'a'
+
+def test_threads():
+    threaded_client = wh.Client(client.url, client.auth, pool_maxsize=8, pool_block=True)
+    assert threaded_client.warmup(8) == 8
+
+    with helper.TemporaryProject(threaded_client) as p:
+        bundles = [p.create_bundle({'n': i}) for i in range(16)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            props = list(executor.map(lambda b: b.get_properties()['n'], bundles * 4))
+
+        assert props == list(range(16)) * 4
+        stats = threaded_client.pool_stats()
+        assert all(pool['opened'] <= pool['maxsize'] for pool in stats.values())
+
+def test_transfer_stats():
+    compressing_client = wh.Client(client.url, client.auth, compress_requests=0)
+
+    with helper.TemporaryProject(compressing_client) as p:
+        bundle = p.create_bundle({})
+        bundle.update_properties({'key%d' % i: 'value' for i in range(100)})
+        assert len(bundle.get_properties()) > 100
+
+        stats = compressing_client.transfer_stats()
+        assert stats['PATCH /bundles/{id}']['sent'] < stats['PATCH /bundles/{id}']['sent_decoded']
+        assert stats['GET /bundles/{id}']['received_decoded'] > 0
@@ -1,6 +1,9 @@
 import warehouse as wh
 import helper
 import tempfile
+import hashlib
+import os
+import pytest
 
 client = helper.get_wh_client()
 
@@ -48,3 +51,105 @@ def test_file_download():
             file.download(f.name)
 
             assert open(f.name, 'rb').read() == b'data'
+
+def test_download_many():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+        for i in range(5):
+            bundle.upload_file(b'data%d' % i, 'testfile')
+
+        with tempfile.TemporaryDirectory() as directory:
+            result = bundle.download_all(directory, workers=4)
+            assert result.ok
+            assert len(result.results) == 5
+            assert sorted(open(path, 'rb').read() for path in result.results.values()) == \
+                [b'data%d' % i for i in range(5)]
+
+def test_download_many_errors():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+        f = bundle.upload_file(b'data', 'testfile')
+
+        with tempfile.TemporaryDirectory() as directory:
+            result = client.download_many([f, client.file('nonexistent')], directory)
+            assert list(result.results) == [f.id]
+            assert list(result.errors) == ['nonexistent']
+
+def test_file_download_resume():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+        data = bytes(range(256)) * 1024
+        file = bundle.upload_file(data, 'testfile')
+
+        with tempfile.TemporaryDirectory() as directory:
+            target = directory + '/testfile'
+            file.download(target, resume=True)
+            assert open(target, 'rb').read() == data
+
+            # Leave a partial download behind and continue it
+            with client.session.get('%s/files/%s/download' % (client.url, file.id)) as req:
+                validator = wh.WHFile.response_validator(req)
+            open(target + '.part', 'wb').write(data[:1000])
+            open(target + '.part.validator', 'w').write(validator or '')
+
+            assert file.download(target, resume=True) == target
+            assert open(target, 'rb').read() == data
+
+def test_file_download_segmented():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+        data = bytes(range(256)) * 4096
+        file = bundle.upload_file(data, 'testfile')
+
+        with tempfile.TemporaryDirectory() as directory:
+            target = file.download(directory + '/', segments=4, segment_size=100000)
+            assert open(target, 'rb').read() == data
+
+def test_file_download_verify():
+    with helper.TemporaryProject(client) as p:
+        bundle = p.create_bundle({})
+        file = bundle.upload_file(b'data', 'testfile', checksum='sha256')
+        assert file.get_properties()['checksum'] == {'sha256': hashlib.sha256(b'data').hexdigest()}
+
+        with tempfile.TemporaryDirectory() as directory:
+            file.download(directory + '/a', verify=True)
+            assert file.digests == {'sha256': hashlib.sha256(b'data').hexdigest()}
+
+            with pytest.raises(wh.ChecksumMismatchException):
+                file.download(directory + '/b', verify={'sha256': '0' * 64})
+            assert not os.path.exists(directory + '/b')
+
+def test_file_download_cache():
+    with tempfile.TemporaryDirectory() as cache_dir, tempfile.TemporaryDirectory() as directory:
+        cached_client = helper.get_wh_client()
+        cached_client.file_cache = wh.FileCache(cache_dir)
+
+        with helper.TemporaryProject(cached_client) as p:
+            bundle = p.create_bundle({})
+            file = bundle.upload_file(b'data', 'testfile', checksum='sha256')
+
+            file.download(directory + '/a')
+            assert cached_client.file_cache.stats()['misses'] == 1
+
+            file.download(directory + '/b')
+            assert cached_client.file_cache.stats()['hits'] == 1
+            assert open(directory + '/b', 'rb').read() == b'data'
+
+def test_update_properties_cache():
+    cached_client = wh.Client(client.url, client.auth, property_cache=wh.LRUCache())
+    with helper.TemporaryProject(cached_client) as p:
+        bundle = p.create_bundle({})
+        file = bundle.upload_file(b'data', 'testfile')
+        bundle.get_properties()
+        file.get_properties()
+
+        file.update_properties({'integer': 1})
+        assert cached_client.property_cache.get(('bundles', bundle.id)) is None
+        assert file.get_properties()['integer'] == 1
+
+def test_file_download_segmented_resume():
+    with helper.TemporaryProject(client) as p:
+        file = p.create_bundle({}).upload_file(b'data', 'testfile')
+        with tempfile.TemporaryDirectory() as directory:
+            with pytest.raises(ValueError):
+                file.download(directory + '/', segments=2, resume=True)
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from warehouse import jsondecode
+from warehouse.jsondecode import iter_json_array, set_json_decoder
+
+def chunked(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+def test_iter_json_array():
+    rows = [[1, 'aé', None], [2.5e10, True, {'k': [1, 2]}], [-3, False, 'x"y']]
+    data = json.dumps({'total': 12345, 'results': rows, 'next': None}, ensure_ascii=False).encode('utf-8')
+
+    for size in (1, 2, 3, 7, len(data)):
+        assert list(iter_json_array(chunked(data, size), 'results')) == rows
+
+def test_iter_json_array_empty():
+    assert list(iter_json_array([b'{"results": [ ]}'], 'results')) == []
+
+def test_iter_json_array_missing_key():
+    with pytest.raises(KeyError):
+        list(iter_json_array([b'{"other": [1]}'], 'results'))
+
+    with pytest.raises(KeyError):
+        list(iter_json_array([b'{}'], 'results'))
+
+def test_iter_json_array_truncated():
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(b'{"results": [[1, 2], [3', 4), 'results'))
+
+def test_set_json_decoder():
+    calls = []
+    def loads(data):
+        calls.append(data)
+        return json.loads(data)
+
+    set_json_decoder(loads)
+    try:
+        assert jsondecode.loads(b'{"a": 1}') == {'a': 1}
+        assert calls == [b'{"a": 1}']
+    finally:
+        set_json_decoder()
+
+    assert jsondecode.loads(b'[1]') == [1]
+    assert len(calls) == 1
@@ -0,0 +1,79 @@
+import warnings
+
+import pytest
+
+import warehouse as wh
+from warehouse.compression import endpoint_name
+from warehouse.metrics import timed
+
+def test_histogram():
+    histogram = wh.Histogram((0.1, 1.0, float('inf')))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert histogram.as_dict() == {'count': 4, 'sum': 6.05, 'buckets': {0.1: 1, 1.0: 3, float('inf'): 4}}
+
+def test_record_request():
+    metrics = wh.Metrics()
+    events = []
+    metrics.add_callback(events.append)
+    metrics.record_request('GET /bundles/{id}', 0.01, 503)
+    metrics.record_request('GET /bundles/{id}', 0.02, 200, attempt=1)
+    metrics.record_request('GET /bundles/{id}', 0.03, None, error=OSError())
+
+    stats = metrics.stats()['requests']['GET /bundles/{id}']
+    assert stats['requests'] == 3
+    assert stats['retries'] == 1
+    assert stats['errors'] == 1
+    assert stats['statuses'] == {503: 1, 200: 1}
+    assert stats['latency']['count'] == 3
+    assert [(e.kind, e.status, e.attempt) for e in events] == [('request', 503, 0), ('request', 200, 1),
+                                                               ('request', None, 0)]
+
+def test_endpoint_name():
+    bundle_id = '8c6f3e1a-2b4d-4f5e-9a7b-1c2d3e4f5a6b'
+    assert endpoint_name('get', '/bundles/%s' % bundle_id) == 'GET /bundles/{id}'
+    assert endpoint_name('GET', '/api/bundles/%s/files' % bundle_id) == 'GET /api/bundles/{id}/files'
+    assert endpoint_name('GET', '/projects/test%2Fmyproj') == 'GET /projects/{id}'
+    assert endpoint_name('GET', '/projects/test%2Fmyproj/bundles') == 'GET /projects/{id}/bundles'
+    assert endpoint_name('DELETE', '/projects/files/subscriptions/abc') == 'DELETE /projects/{id}/subscriptions/{id}'
+    assert endpoint_name('GET', '/organizations/test') == 'GET /organizations/{id}'
+    assert endpoint_name('POST', '/organizations/test/projects') == 'POST /organizations/{id}/projects'
+    assert endpoint_name('GET', '/organizations') == 'GET /organizations'
+    assert endpoint_name('POST', '/search/keys') == 'POST /search/keys'
+
+def test_callback_errors():
+    metrics = wh.Metrics()
+    metrics.add_callback(lambda event: 1 / 0)
+    metrics.record_call('Client.find_bundles', 0.1)
+    assert metrics.stats()['callback_errors'] == 1
+
+def test_timed():
+    class Thing():
+        def __init__(self):
+            self.metrics = wh.Metrics()
+
+        @timed
+        def work(self, fail):
+            if fail:
+                raise ValueError()
+            return 1
+
+    thing = Thing()
+    assert thing.work(False) == 1
+    with pytest.raises(ValueError):
+        thing.work(True)
+
+    assert thing.metrics.stats()['calls']['test_timed.<locals>.Thing.work']['calls'] == 2
+    assert thing.metrics.stats()['calls']['test_timed.<locals>.Thing.work']['errors'] == 1
+
+def test_repeated_gets():
+    metrics = wh.Metrics(repeat_window=10.0, repeat_threshold=3)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        for _ in range(3):
+            metrics.check_repeated('GET', 'http://warehouse/bundles/1')
+            metrics.check_repeated('POST', 'http://warehouse/search/keys')
+
+    assert [w.category for w in caught] == [wh.RepeatedRequestWarning]
+    assert metrics.stats()['repeated'] == {'http://warehouse/bundles/1': 1}
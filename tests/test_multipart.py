@@ -0,0 +1,44 @@
+import io
+import tempfile
+import pytest
+from email.parser import BytesParser
+from warehouse.multipart import FileRegion, MultipartEncoder
+
+def parse(encoder):
+    body = b''.join(encoder)
+    message = BytesParser().parsebytes(b'Content-Type: %s\r\n\r\n' % encoder.content_type.encode() + body)
+    return body, {part.get_param('name', header='content-disposition'): part.get_payload(decode=True)
+                  for part in message.get_payload()}
+
+def test_encoder_known_length():
+    encoder = MultipartEncoder()
+    encoder.add_file('file', io.BytesIO(b'filedata'))
+    encoder.add_field('properties', '{"a": 1}')
+
+    body, parts = parse(encoder)
+    assert parts == {'file': b'filedata', 'properties': b'{"a": 1}'}
+    assert encoder.len == len(body)
+
+def test_encoder_iterable():
+    encoder = MultipartEncoder(chunk_size=4)
+    encoder.add_file('file', iter([b'ab', b'', b'cd']))
+    encoder.add_field('properties', lambda: b'late', length=4)
+
+    assert encoder.len is None
+    assert parse(encoder)[1] == {'file': b'abcd', 'properties': b'late'}
+
+def test_encoder_length_mismatch():
+    encoder = MultipartEncoder()
+    encoder.add_file('file', iter([b'ab']), length=3)
+    with pytest.raises(ValueError):
+        b''.join(encoder)
+
+def test_encoder_file_region():
+    with tempfile.TemporaryFile() as f:
+        f.write(b'regiondata')
+        f.flush()
+
+        encoder = MultipartEncoder(chunk_size=4)
+        encoder.add_file('file', FileRegion(f, 10, chunk_size=4))
+        assert any(isinstance(segment, FileRegion) for segment in encoder.segments())
+        assert parse(encoder)[1] == {'file': b'regiondata'}
@@ -31,4 +31,23 @@ def test_find_file():
     with helper.TemporaryProject(client) as p:
         bundle = p.create_bundle({})
         bundle.upload_file(b'test', 'testfile')
-        assert type(p.find_file('')) is wh.WHFile
\ No newline at end of file
+        assert type(p.find_file('')) is wh.WHFile
+
+def test_iter_bundles_sorted():
+    with helper.TemporaryProject(client) as p:
+        for i in range(6):
+            p.create_bundle({'group': i % 2, 'index': i})
+
+        bundles = list(p.iter_bundles('', wh.Sorting(None, 'asc', 'bundle.group'), page_size=2))
+        assert len(bundles) == 6
+        assert len(set(b.id for b in bundles)) == 6
+
+def test_iter_bundles_missing_key():
+    with helper.TemporaryProject(client) as p:
+        for i in range(5):
+            p.create_bundle({'index': i} if i % 2 else {})
+
+        sorting = wh.Sorting(None, 'asc', 'bundle.index')
+        bundles = list(p.iter_bundles('', sorting, page_size=1))
+        assert len(bundles) == 5
+        assert set(b.id for b in bundles) == set(b.id for b in p.find_bundles('', sorting))
@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+
+from warehouse.resultset import Column, IdColumn, ResultSet
+
+def test_id_column():
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    column = IdColumn()
+    for value in ids:
+        column.append(value)
+    assert column.packed is not None
+    assert [column[i] for i in range(len(column))] == ids
+
+    column.append('not-a-uuid')
+    column.append(ids[0].upper())
+    assert column.packed is None
+    assert [column[i] for i in range(len(column))] == ids + ['not-a-uuid', ids[0].upper()]
+
+def test_column_types():
+    values = [[1, 2, 3], [1.5, 2.0], [1, 2.0], [True, False], [1, True], [2 ** 70, 1], ['a', None], [1, None]]
+    for expected in values:
+        column = Column()
+        for value in expected:
+            column.append(value)
+        stored = [column[i] for i in range(len(column))]
+        assert stored == expected
+        assert [type(v) for v in stored] == [type(v) for v in expected]
+
+def test_result_set():
+    ids = [str(uuid.uuid4()) for _ in range(5)]
+    rows = [[ids[i], 'name%d' % i, i] for i in range(5)]
+    result = ResultSet(lambda object_id, properties: (object_id, properties), ['name', 'size'])
+    result.extend_rows(['id', 'name', 'size'], rows)
+
+    assert len(result) == 5
+    assert result[0] == (ids[0], {'name': 'name0', 'size': 0})
+    assert result[-1] == (ids[4], {'name': 'name4', 'size': 4})
+    assert result[1:3] == [(ids[i], {'name': 'name%d' % i, 'size': i}) for i in (1, 2)]
+    assert [r[0] for r in result] == ids
+    assert result.ids() == ids
+    assert result.column('size') == list(range(5))
+
+    with pytest.raises(IndexError):
+        result[5]
+
+def test_result_set_without_keys():
+    result = ResultSet(lambda object_id, properties: (object_id, properties))
+    result.append('a')
+    assert list(result) == [('a', None)]
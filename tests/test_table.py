@@ -0,0 +1,62 @@
+import subprocess
+import sys
+
+import pytest
+
+from warehouse.table import TableBuilder, require
+
+ROWS = [['a', 1, 0.5, 'x', True, None], ['b', 2, 1.5, None, False, 3], ['c', 3, 2.0, 'z', True, 4.5]]
+NAMES = ['id', 'int', 'float', 'str', 'bool', 'missing']
+
+def builder():
+    table = TableBuilder(NAMES)
+    table.add_rows(ROWS)
+    return table
+
+def test_numpy():
+    numpy = pytest.importorskip('numpy')
+    table = builder().to_numpy()
+    assert table.dtype.names == tuple(NAMES)
+    assert table['int'].dtype == numpy.int64
+    assert table['float'].dtype == numpy.float64
+    assert table['bool'].dtype == numpy.bool_
+    assert table['missing'].dtype == numpy.float64
+    assert list(table['int']) == [1, 2, 3]
+    assert list(table['str']) == ['x', None, 'z']
+    assert numpy.isnan(table['missing'][0])
+
+def test_arrow():
+    pyarrow = pytest.importorskip('pyarrow')
+    table = builder().to_arrow()
+    assert table.column_names == NAMES
+    assert table.schema.field('int').type == pyarrow.int64()
+    assert table.column('int').to_pylist() == [1, 2, 3]
+    assert table.column('str').to_pylist() == ['x', None, 'z']
+
+def test_arrow_mixed_types():
+    pytest.importorskip('pyarrow')
+    table = TableBuilder(['mixed'])
+    table.add_rows([['a'], [1], [None]])
+    assert table.to_arrow().column('mixed').to_pylist() == ['"a"', '1', None]
+
+def test_pandas():
+    pytest.importorskip('pandas')
+    frame = builder().to_pandas()
+    assert list(frame.columns) == NAMES
+    assert list(frame['int']) == [1, 2, 3]
+
+def test_empty():
+    pytest.importorskip('numpy')
+    assert len(TableBuilder(NAMES).to_numpy()) == 0
+
+def test_invalid_output():
+    with pytest.raises(ValueError):
+        builder().build('csv')
+
+def test_require_missing():
+    with pytest.raises(ImportError):
+        require('warehouse_missing_package')
+
+def test_lazy_imports():
+    check = 'import sys, warehouse; print(any(m in sys.modules for m in ("numpy", "pyarrow", "pandas")))'
+    assert subprocess.check_output([sys.executable, '-c', check], text=True).strip() == 'False'
@@ -0,0 +1,123 @@
+"""Admission control module
+
+Limits the number of requests in flight to what the server handles
+without overload, and computes retry delays.
+"""
+from __future__ import annotations
+
+import email.utils
+import random
+import threading
+import time
+
+from typing import Any, Dict, Optional
+
+# Statuses signalling an overloaded or unavailable server
+OVERLOAD_STATUSES = (429, 503)
+
+# Statuses retried for idempotent requests
+RETRY_STATUSES = (429, 502, 503, 504)
+
+# Methods that may be sent again without changing the outcome
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+class AdmissionController():
+    """Adaptive limit on the number of requests in flight
+
+    The limit follows additive increase, multiplicative decrease (AIMD): it
+    grows by about one for every limit successful requests, and shrinks by
+    the decrease factor when the server answers 429 or 503, or when a
+    response takes longer than target_latency seconds (if set). Decreases
+    happen at most once per smoothed latency, so one burst of failures
+    counts once. Requests beyond the limit wait in acquire().
+
+    pause() holds back all requests until a given time, which is used to
+    honour Retry-After."""
+
+    def __init__(self, initial: int=8, minimum: int=1, maximum: int=64, target_latency: Optional[float]=None,
+                 decrease: float=0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.decrease = decrease
+        self.in_flight = 0
+        self.latency: Optional[float] = None
+        self.paused_until = 0.0
+        self.decreased = 0.0
+        self.condition = threading.Condition()
+        self.requests = 0
+        self.overloads = 0
+
+    def acquire(self):
+        """Waits for a free slot and takes it"""
+        with self.condition:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                elif self.in_flight >= int(self.limit):
+                    self.condition.wait()
+                else:
+                    break
+
+            self.in_flight += 1
+
+    def release(self, latency: float, overloaded: bool):
+        """Gives back a slot, adjusting the limit to the outcome of the request"""
+        with self.condition:
+            self.in_flight -= 1
+            self.requests += 1
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+
+            slow = self.target_latency is not None and latency > self.target_latency
+            if overloaded or slow:
+                self.overloads += 1
+                now = time.monotonic()
+                if now - self.decreased >= (self.latency or 0.0):
+                    self.decreased = now
+                    self.limit = max(float(self.minimum), self.limit * self.decrease)
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+            self.condition.notify_all()
+
+    def pause(self, seconds: float):
+        """Holds back all requests for the given number of seconds"""
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns a dictionary with the current limit and request counters"""
+        with self.condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'latency': self.latency,
+                'requests': self.requests,
+                'overloads': self.overloads,
+            }
+
+
+def retry_after(value: Optional[str]) -> Optional[float]:
+    """Returns the delay in seconds of a Retry-After header, None if absent or invalid"""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, date.timestamp() - time.time())
+
+
+def backoff_delay(attempt: int, base: float=0.5, maximum: float=30.0) -> float:
+    """Returns a jittered exponential backoff delay for a retry attempt (0 based)"""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
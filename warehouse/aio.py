@@ -0,0 +1,608 @@
+"""Asyncio client module
+
+This module contains an asyncio based client for warehouse communication,
+mirroring the blocking Client, WHBundle, WHFile and WHProject API with
+awaitable methods. It requires the optional aiohttp package:
+
+    pip install warehouse-client[async]
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import os
+import types
+import uuid
+
+import aiohttp
+
+from warehouse import jsondecode
+from warehouse.client import Client
+from warehouse.errors import WarehouseClientException
+from warehouse.file import WHFile
+from warehouse.pagination import KeysetPaginator
+from warehouse.properties import property_operations
+from warehouse.sorting import Sorting
+
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+
+class AsyncClient():
+    """Asyncio client object for warehouse
+
+    All requests share one connection pool of at most max_connections
+    connections, and at most max_concurrency requests are in flight at any
+    time. Subscription long polls use a separate, unbounded pool, so waiting
+    for events does not take request slots. The client must be closed with
+    close(), or used as an async context manager."""
+
+    def __init__(self, url: str, auth: Any, verify: bool=True, connect_timeout: float=10.0, read_timeout: float=600.0,
+                 page_size: int=1000, max_concurrency: int=100, max_connections: int=100):
+        self.url = url
+        self.auth = auth
+        self.verify = verify
+        self.page_size = page_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_connections = max_connections
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.poll_session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args: Any):
+        await self.close()
+
+    async def close(self):
+        """Closes the connection pools"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.poll_session is not None:
+            await self.poll_session.close()
+            self.poll_session = None
+
+    def auth_headers(self) -> Dict[str, str]:
+        """Returns the headers added by the authentication object"""
+        if self.auth is None:
+            return {}
+
+        # The authentication objects only set request headers, so a stand-in
+        # request is enough to collect them
+        req = types.SimpleNamespace(headers={})
+        self.auth(req)
+        return req.headers
+
+    @contextlib.asynccontextmanager
+    async def request(self, method: str, path: str, long_poll: bool=False,
+                      **kwargs: Any) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Performs a request within the concurrency limit, yielding the response
+
+        With long_poll, the request is sent on the long poll pool instead,
+        outside the concurrency limit."""
+        if long_poll:
+            if self.poll_session is None:
+                connector = aiohttp.TCPConnector(limit=0, ssl=None if self.verify else False)
+                self.poll_session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                          headers=self.auth_headers())
+
+            async with self.poll_session.request(method, '%s%s' % (self.url, path), **kwargs) as res:
+                yield res
+            return
+
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, ssl=None if self.verify else False)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                                 headers=self.auth_headers())
+
+        async with self.semaphore:
+            async with self.session.request(method, '%s%s' % (self.url, path), **kwargs) as res:
+                yield res
+
+    async def request_json(self, method: str, path: str, error: str, long_poll: bool=False, **kwargs: Any) -> Any:
+        """Performs a request and returns the decoded JSON response"""
+        async with self.request(method, path, long_poll, **kwargs) as res:
+            if res.status < 200 or res.status >= 300:
+                raise WarehouseClientException('%s: %s' % (error, await res.text()))
+
+            body = await res.read()
+            return jsondecode.loads(body) if body else None
+
+    async def ping(self):
+        """Tests the connection to warehouse"""
+        async with self.request('GET', '/ping') as res:
+            res.raise_for_status()
+
+    async def check_token(self):
+        """Tests the provided authentication method"""
+        try:
+            async with self.request('POST', '/checkToken') as res:
+                if res.status == 401:
+                    raise WarehouseClientException('Permission denied')
+                if res.status < 200 or res.status >= 300:
+                    raise WarehouseClientException('Unknown server response: %d' % res.status)
+        except aiohttp.ClientError as e:
+            raise WarehouseClientException('Connection error') from e
+
+    and_query = staticmethod(Client.and_query)
+    equals_query = staticmethod(Client.equals_query)
+    str_matches_query = staticmethod(Client.str_matches_query)
+    natural_query = staticmethod(Client.natural_query)
+    greater_than_query = staticmethod(Client.greater_than_query)
+    less_than_query = staticmethod(Client.less_than_query)
+    internal_query = Client.internal_query
+    internal_columns = staticmethod(Client.internal_columns)
+    internal_row_properties = staticmethod(Client.internal_row_properties)
+
+    def bundle(self, bundle_id: str, properties: Optional[Dict[str, Any]]=None) -> AsyncWHBundle:
+        """Returns an AsyncWHBundle object with the provided ID"""
+        return AsyncWHBundle(self, bundle_id, properties)
+
+    def file(self, file_id: str, properties: Optional[Dict[str, Any]]=None) -> AsyncWHFile:
+        """Returns an AsyncWHFile object with the provided ID"""
+        return AsyncWHFile(self, file_id, properties)
+
+    def project(self, project_id: str) -> AsyncWHProject:
+        """Returns an AsyncWHProject object with the provided ID"""
+        return AsyncWHProject(self, project_id)
+
+    async def projects(self) -> List[AsyncWHProject]:
+        """Returns a list of all accessible warehouse projects"""
+        json_res = await self.request_json('GET', '/organizations', 'returned error')
+        _projects: List[AsyncWHProject] = []
+        for organization in json_res['organizations']:
+            for project in organization['projects']:
+                _projects.append(self.project(
+                    '%s/%s' % (organization['organization_name'], project['project_name'])))
+
+        return _projects
+
+    async def internal_search(self, table: str, keys: List[str], query: Dict[str, Any],
+                              sorting: Optional[Sorting]=None, limit: int=0) -> List[List[Any]]:
+        """Internal search method, returns the raw result rows for the requested keys"""
+        if not sorting:
+            sorting = Sorting(None, None, None)
+
+        query_obj: Dict[str, Any] = {
+            'table': table,
+            'keys': keys,
+            'sorting': sorting.as_dict(),
+            'query': query
+        }
+
+        if limit > 0:
+            query_obj['limit'] = limit
+
+        json_res = await self.request_json('POST', '/search/keys', 'error searching', json=query_obj)
+        return json_res['results']
+
+    async def internal_iter_search(self, table: str, keys: List[str], query: Dict[str, Any],
+                                   sorting: Optional[Sorting]=None, limit: int=0,
+                                   page_size: Optional[int]=None) -> AsyncIterator[List[Any]]:
+        """Internal paginated search method, yields result rows one page at a time"""
+        paginator = KeysetPaginator(self, keys, query, sorting, limit, page_size or self.page_size)
+        while not paginator.done:
+            page_query, page_limit = paginator.next_page()
+            rows = await self.internal_search(table, paginator.keys, page_query, paginator.sorting, page_limit)
+            for row in paginator.feed(rows):
+                yield row
+
+    async def internal_find_bundles(self, query: Dict[str, Any], sorting: Optional[Sorting]=None, limit: int=0,
+                                    keys: Optional[List[str]]=None) -> List[AsyncWHBundle]:
+        """Internal bundle lookup method"""
+        columns = self.internal_columns('bundle.id', keys, sorting)
+        rows = await self.internal_search('bundles', columns, query, sorting, limit)
+        return [self.bundle(row[0], self.internal_row_properties(columns, keys, row)) for row in rows]
+
+    async def internal_iter_bundles(self, query: Dict[str, Any], sorting: Optional[Sorting]=None, limit: int=0,
+                                    page_size: Optional[int]=None,
+                                    keys: Optional[List[str]]=None) -> AsyncIterator[AsyncWHBundle]:
+        """Internal paginated bundle lookup method"""
+        columns = self.internal_columns('bundle.id', keys, None)
+        async for row in self.internal_iter_search('bundles', columns, query, sorting, limit, page_size):
+            yield self.bundle(row[0], self.internal_row_properties(columns, keys, row))
+
+    async def internal_find_files(self, query: Dict[str, Any], sorting: Optional[Sorting]=None, limit: int=0,
+                                  keys: Optional[List[str]]=None) -> List[AsyncWHFile]:
+        """Internal file lookup method"""
+        columns = self.internal_columns('file.id', keys, sorting)
+        rows = await self.internal_search('files', columns, query, sorting, limit)
+        return [self.file(row[0], self.internal_row_properties(columns, keys, row)) for row in rows]
+
+    async def internal_iter_files(self, query: Dict[str, Any], sorting: Optional[Sorting]=None, limit: int=0,
+                                  page_size: Optional[int]=None,
+                                  keys: Optional[List[str]]=None) -> AsyncIterator[AsyncWHFile]:
+        """Internal paginated file lookup method"""
+        columns = self.internal_columns('file.id', keys, None)
+        async for row in self.internal_iter_search('files', columns, query, sorting, limit, page_size):
+            yield self.file(row[0], self.internal_row_properties(columns, keys, row))
+
+    async def find_bundles(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                           keys: Optional[List[str]]=None) -> List[AsyncWHBundle]:
+        """Perform a search for bundles with the given parameters"""
+        return await self.internal_find_bundles(self.internal_query(query), sorting, limit, keys)
+
+    def iter_bundles(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                     page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> AsyncIterator[AsyncWHBundle]:
+        """Returns an async generator yielding bundles for the given search, fetched one page at a time"""
+        return self.internal_iter_bundles(self.internal_query(query), sorting, limit, page_size, keys)
+
+    async def find_bundle(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None,
+                          keys: Optional[List[str]]=None) -> Optional[AsyncWHBundle]:
+        """Perform a search for a single bundle"""
+        bundles = await self.find_bundles(query, sorting, 1, keys)
+        return bundles[0] if bundles else None
+
+    async def find_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                         keys: Optional[List[str]]=None) -> List[AsyncWHFile]:
+        """Perform a search for files with the given parameters"""
+        return await self.internal_find_files(self.internal_query(query), sorting, limit, keys)
+
+    def iter_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                   page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> AsyncIterator[AsyncWHFile]:
+        """Returns an async generator yielding files for the given search, fetched one page at a time"""
+        return self.internal_iter_files(self.internal_query(query), sorting, limit, page_size, keys)
+
+    async def find_file(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None,
+                        keys: Optional[List[str]]=None) -> Optional[AsyncWHFile]:
+        """Perform a search for a single file"""
+        files = await self.find_files(query, sorting, 1, keys)
+        return files[0] if files else None
+
+
+class AsyncWHBundle():
+    """Class representing a single warehouse bundle, for use with AsyncClient"""
+
+    __slots__ = ('wh', 'id', 'properties')
+
+    def __init__(self, wh: AsyncClient, bundle_id: str, properties: Optional[Dict[str, Any]]=None):
+        self.wh = wh
+        self.id = bundle_id
+        self.properties = properties
+
+    def __str__(self):
+        return 'AsyncWHBundle(id=%s)' % self.id
+
+    async def get_properties(self) -> Dict[str, Any]:
+        """Returns a dictionary with properties for the bundle"""
+        return await self.wh.request_json('GET', '/bundles/%s' % self.id, 'error getting properties')
+
+    async def files(self) -> List[AsyncWHFile]:
+        """Returns a list of the files contained in the bundle"""
+        json_res = await self.wh.request_json('GET', '/bundles/%s' % self.id, 'error getting files')
+        return [self.wh.file(f['file_id']) for f in json_res['files']]
+
+    def internal_query(self, query: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Internal conversion of a str or dict query to a query object limited to this bundle"""
+        return self.wh.and_query([self.wh.equals_query('bundle.id', self.id), self.wh.internal_query(query)])
+
+    async def find_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                         keys: Optional[List[str]]=None) -> List[AsyncWHFile]:
+        """Performs a search for files in the bundle"""
+        return await self.wh.internal_find_files(self.internal_query(query), sorting, limit, keys)
+
+    def iter_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                   page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> AsyncIterator[AsyncWHFile]:
+        """Returns an async generator yielding files in the bundle, fetched one page at a time"""
+        return self.wh.internal_iter_files(self.internal_query(query), sorting, limit, page_size, keys)
+
+    async def update_properties(self, props: Dict[str, Any]):
+        """Sets the provided properties for the bundle"""
+        return await self.wh.request_json('PATCH', '/bundles/%s' % self.id, 'error updating properties',
+                                          json=property_operations(props))
+
+    async def trash(self):
+        """Trashes the bundle"""
+        await self.wh.request_json('POST', '/bundles/%s/trash' % self.id, 'error trashing bundle')
+
+    async def restore(self):
+        """Restores the bundle from trash"""
+        await self.wh.request_json('POST', '/bundles/%s/restore' % self.id, 'error restoring bundle')
+
+    async def delete(self):
+        """Permanently deletes the bundle"""
+        await self.wh.request_json('DELETE', '/bundles/%s' % self.id, 'error deleting bundle')
+
+    async def upload_file(self, f: Union[bytes, Any], name: Optional[str]=None,
+                          props: Optional[Dict[str, Any]]=None) -> AsyncWHFile:
+        """Uploads the passed bytes or binary file object to the bundle"""
+        props = dict(props or {})
+        if name:
+            props['filename'] = name
+
+        if isinstance(f, bytes):
+            size = len(f)
+        elif hasattr(f, 'fileno'):
+            size = os.fstat(f.fileno()).st_size
+            f.seek(0)
+        else:
+            raise TypeError('f must be bytes or a binary file object')
+
+        with aiohttp.MultipartWriter('form-data') as writer:
+            part = writer.append(f, {'Content-Type': 'application/octet-stream'})
+            part.set_content_disposition('form-data', name='file')
+            # aiohttp refuses part lengths on append, but warehouse expects them
+            part.headers['Content-Length'] = str(size)
+            part = writer.append(json.dumps(props))
+            part.set_content_disposition('form-data', name='properties', filename='properties')
+
+            json_res = await self.wh.request_json('POST', '/bundles/%s/files' % self.id, 'error uploading file',
+                                                  data=writer)
+
+        file_id = json_res.get('file_id')
+        if not file_id:
+            raise WarehouseClientException(
+                'could not upload file: no id received')
+
+        return self.wh.file(file_id)
+
+
+class AsyncWHFile():
+    """Class representing a single warehouse file, for use with AsyncClient"""
+
+    __slots__ = ('wh', 'id', 'properties')
+
+    def __init__(self, wh: AsyncClient, file_id: str, properties: Optional[Dict[str, Any]]=None):
+        self.wh = wh
+        self.id = file_id
+        self.properties = properties
+
+    def __str__(self):
+        return 'AsyncWHFile(id=%s)' % self.id
+
+    async def get_properties(self) -> Dict[str, Any]:
+        """Returns the properties associated with this file"""
+        return await self.wh.request_json('GET', '/files/%s' % self.id, 'error getting properties')
+
+    async def update_properties(self, props: Dict[str, Any]):
+        """Update the file properties with the provided values"""
+        return await self.wh.request_json('PATCH', '/files/%s' % self.id, 'error updating properties',
+                                          json=property_operations(props))
+
+    async def trash(self):
+        """Trash this file"""
+        await self.wh.request_json('POST', '/files/%s/trash' % self.id, 'error trashing file')
+
+    async def restore(self):
+        """Restore this file from trash"""
+        await self.wh.request_json('POST', '/files/%s/restore' % self.id, 'error restoring file')
+
+    async def delete(self):
+        """Permanently delete this file"""
+        await self.wh.request_json('DELETE', '/files/%s' % self.id, 'error deleting file')
+
+    async def download(self, path: Optional[str]=None, create_dirs: bool=False) -> str:
+        """Download this file"""
+        async with self.wh.request('GET', '/files/%s/download' % self.id) as res:
+            res.raise_for_status()
+
+            filename = WHFile.target_path(res.headers.get('x-content-filename'), path)
+            if create_dirs and os.path.dirname(filename):
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+            with open(filename + '.part', 'wb') as f:
+                async for chunk in res.content.iter_chunked(64 * 1024):
+                    f.write(chunk)
+
+        os.replace(filename + '.part', filename)
+        return filename
+
+
+class AsyncWHProject():
+    """Class representing a warehouse project, for use with AsyncClient"""
+
+    __slots__ = ('wh', 'id')
+
+    def __init__(self, wh: AsyncClient, project_id: str):
+        self.wh = wh
+        self.id = project_id
+
+    def __str__(self):
+        return 'AsyncWHProject(id=%s)' % self.id
+
+    def path(self) -> str:
+        """Returns the URL path of the project"""
+        return '/projects/%s' % self.id.replace('/', '%2F')
+
+    def query_param(self) -> Dict[str, Any]:
+        """Returns a query object identifying this project"""
+        try:
+            uuid.UUID(self.id)
+            return self.wh.equals_query('project.id', self.id)
+        except ValueError:
+            return self.wh.equals_query('project.name', self.id)
+
+    def internal_query(self, query: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Internal conversion of a str or dict query to a query object limited to this project"""
+        return self.wh.and_query([self.query_param(), self.wh.internal_query(query)])
+
+    async def get_info(self) -> Dict[str, Any]:
+        """Returns a dictionary with project info"""
+        return await self.wh.request_json('GET', self.path(), 'error getting project info')
+
+    async def find_bundles(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                           keys: Optional[List[str]]=None) -> List[AsyncWHBundle]:
+        """Performs a search for bundles within this project"""
+        return await self.wh.internal_find_bundles(self.internal_query(query), sorting, limit, keys)
+
+    def iter_bundles(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                     page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> AsyncIterator[AsyncWHBundle]:
+        """Returns an async generator yielding bundles within this project, fetched one page at a time"""
+        return self.wh.internal_iter_bundles(self.internal_query(query), sorting, limit, page_size, keys)
+
+    async def find_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                         keys: Optional[List[str]]=None) -> List[AsyncWHFile]:
+        """Performs a search for files within this project"""
+        return await self.wh.internal_find_files(self.internal_query(query), sorting, limit, keys)
+
+    def iter_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                   page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> AsyncIterator[AsyncWHFile]:
+        """Returns an async generator yielding files within this project, fetched one page at a time"""
+        return self.wh.internal_iter_files(self.internal_query(query), sorting, limit, page_size, keys)
+
+    async def create_bundle(self, params: Dict[str, Any]) -> AsyncWHBundle:
+        """Creates a bundle within this project, and returns the AsyncWHBundle object"""
+        json_res = await self.wh.request_json('POST', '%s/bundles' % self.path(), 'returned error', json=params)
+
+        bundle_id = json_res.get('bundle_id')
+        if not bundle_id:
+            raise WarehouseClientException('could not create bundle')
+
+        return self.wh.bundle(bundle_id)
+
+    async def create_subscription(self) -> uuid.UUID:
+        """Subscribes to changes in the project"""
+        json_res = await self.wh.request_json('POST', '%s/subscriptions' % self.path(), 'error creating subscription')
+        return uuid.UUID(json_res.get('subscription_id'))
+
+    async def delete_subscription(self, subscription_id: uuid.UUID):
+        """Delete subscription"""
+        await self.wh.request_json('DELETE', '%s/subscriptions/%s' % (self.path(), subscription_id),
+                                   'error deleting subscription')
+
+    async def subscription_wait(self, subscription_id: uuid.UUID) -> Any:
+        """Wait for events on the provided subscription"""
+        return await self.wh.request_json('POST', '%s/subscriptions/%s' % (self.path(), subscription_id),
+                                          'error polling subscription', long_poll=True,
+                                          timeout=aiohttp.ClientTimeout(total=None, sock_read=None))
+
+    async def wait_events(self, max_backoff: float=30.0) -> AsyncIterator[Any]:
+        """Returns an async generator yielding events
+
+        Failed polls are retried with exponential backoff, up to max_backoff
+        seconds between attempts. A poll rejected by the server, as for an
+        expired subscription, creates a new subscription. The subscription
+        is deleted when the generator is closed."""
+        subscription_id: Optional[uuid.UUID] = await self.create_subscription()
+        backoff = 0.0
+        try:
+            while True:
+                try:
+                    if subscription_id is None:
+                        subscription_id = await self.create_subscription()
+                    events = await self.subscription_wait(subscription_id)
+                    backoff = 0.0
+                except WarehouseClientException:
+                    if subscription_id is not None:
+                        await self.internal_discard_subscription(subscription_id)
+                        subscription_id = None
+                    backoff = min(max(backoff * 2, 0.5), max_backoff)
+                    await asyncio.sleep(backoff)
+                    continue
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    backoff = min(max(backoff * 2, 0.5), max_backoff)
+                    await asyncio.sleep(backoff)
+                    continue
+
+                yield events
+        finally:
+            if subscription_id is not None:
+                await self.delete_subscription(subscription_id)
+
+    async def internal_discard_subscription(self, subscription_id: uuid.UUID):
+        """Internal deletion of a subscription that may no longer exist"""
+        try:
+            await self.delete_subscription(subscription_id)
+        except (WarehouseClientException, aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+
+
+class EventDispatcher():
+    """Delivers the events of many project subscriptions through one bounded queue
+
+    Every project is watched by a task of the event loop running
+    wait_events, so any number of projects share one thread, and their long
+    polls share the long poll pool of the client. Items are (project,
+    events) tuples. When the queue is full, the tasks stop polling until
+    items are taken, leaving further events buffered by the server.
+
+        async with EventDispatcher(client, ['org/project1', 'org/project2']) as dispatcher:
+            async for project, events in dispatcher:
+                ...
+
+    Use get_batch() to take several items at once. close() deletes the
+    subscriptions."""
+
+    def __init__(self, wh: AsyncClient, projects: Iterable[Union[str, AsyncWHProject]]=(), maxsize: int=1000,
+                 max_backoff: float=30.0):
+        self.wh = wh
+        self.max_backoff = max_backoff
+        self.queue: asyncio.Queue[Tuple[AsyncWHProject, Any]] = asyncio.Queue(maxsize)
+        self.tasks: Dict[str, asyncio.Task[None]] = {}
+        self.errors: Dict[str, BaseException] = {}
+        for project in projects:
+            self.add(project)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args: Any):
+        await self.close()
+
+    def __aiter__(self) -> AsyncIterator[Tuple[AsyncWHProject, Any]]:
+        return self
+
+    async def __anext__(self) -> Tuple[AsyncWHProject, Any]:
+        return await self.get()
+
+    def add(self, project: Union[str, AsyncWHProject]):
+        """Starts watching a project"""
+        if isinstance(project, str):
+            project = self.wh.project(project)
+        if project.id not in self.tasks:
+            self.tasks[project.id] = asyncio.ensure_future(self.internal_watch(project))
+
+    async def remove(self, project: Union[str, AsyncWHProject]):
+        """Stops watching a project and deletes its subscription"""
+        task = self.tasks.pop(project if isinstance(project, str) else project.id, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def internal_watch(self, project: AsyncWHProject):
+        """Internal task feeding the events of a project into the queue"""
+        events = project.wait_events(self.max_backoff)
+        try:
+            async for result in events:
+                await self.queue.put((project, result))
+        except (WarehouseClientException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Creating the first subscription failed, e.g. for an unknown project
+            self.errors[project.id] = e
+        finally:
+            await events.aclose()
+
+    async def get(self) -> Tuple[AsyncWHProject, Any]:
+        """Waits for and returns the next item"""
+        return await self.queue.get()
+
+    async def get_batch(self, max_items: int=100, max_delay: float=0.1) -> List[Tuple[AsyncWHProject, Any]]:
+        """Waits for an item, and returns it with the items arriving within max_delay seconds, up to max_items"""
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_delay
+        while len(batch) < max_items:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def close(self):
+        """Stops watching all projects and deletes their subscriptions"""
+        tasks = list(self.tasks.values())
+        self.tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,77 @@
+"""Batch operation module"""
+from __future__ import annotations
+
+import threading
+import time
+
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class BatchResult():
+    """Outcome of an operation on many objects
+
+    results maps each key to the value returned for it, and errors maps each
+    key that failed to the exception raised for it."""
+
+    def __init__(self):
+        self.results: Dict[Hashable, Any] = {}
+        self.errors: Dict[Hashable, Exception] = {}
+
+    def __str__(self):
+        return 'BatchResult(results=%d, errors=%d)' % (len(self.results), len(self.errors))
+
+    @property
+    def ok(self) -> bool:
+        """True if no errors occurred"""
+        return not self.errors
+
+
+class TransferProgress():
+    """Aggregate progress of a batch transfer
+
+    The callback is invoked with this object after every completed item, and
+    at most every interval seconds while data is transferred. It may be
+    called from several threads, but never concurrently."""
+
+    def __init__(self, total: int, callback: Optional[Callable[[TransferProgress], None]]=None,
+                 interval: float=0.5):
+        self.total = total
+        self.done = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.callback = callback
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.reported = self.started
+
+    def __str__(self):
+        return 'TransferProgress(done=%d/%d, bytes=%d, rate=%.0f B/s)' % (
+            self.done, self.total, self.bytes, self.rate)
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the transfer started"""
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self) -> float:
+        """Average throughput in bytes per second"""
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def add_bytes(self, count: int):
+        """Records transferred bytes"""
+        with self.lock:
+            self.bytes += count
+            now = time.monotonic()
+            if self.callback is not None and now - self.reported >= self.interval:
+                self.reported = now
+                self.callback(self)
+
+    def item_done(self):
+        """Records a completed (or failed) item"""
+        with self.lock:
+            self.done += 1
+            self.reported = time.monotonic()
+            if self.callback is not None:
+                self.callback(self)
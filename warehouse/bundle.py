@@ -1,49 +1,95 @@
 """Bundle module"""
 from __future__ import annotations
 
+from warehouse.batch import BatchResult, TransferProgress
+from warehouse.checksum import CHECKSUM_PROPERTY, MultiHasher
 from warehouse.errors import WarehouseClientException
+from warehouse.jsondecode import response_json
+from warehouse.metrics import timed
+from warehouse.properties import PropertyBuffer, property_operations
 from warehouse.file import WHFile
+from warehouse.multipart import FileRegion, MultipartEncoder, Source, iter_chunks
+from warehouse.sendfile import post_sendfile, sendfile_supported
 from warehouse.sorting import Sorting
 
-from typing import List, Union, Optional, Dict, Any
-import io
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, List, Union, Optional, Dict, Any, Iterator, Tuple
+import fnmatch
 import json
 import os
 
+import requests
+
 
 class WHBundle():
     """Class representing a single warehouse bundle"""
 
-    def __init__(self, wh: 'Client', bundle_id: str):
+    __slots__ = ('wh', 'id', 'properties')
+
+    def __init__(self, wh: 'Client', bundle_id: str, properties: Optional[Dict[str, Any]]=None):
         self.wh = wh
         self.id = bundle_id
+        # Values of the search keys requested when this object was found,
+        # keyed by search key. None if it was not returned by a search.
+        self.properties = properties
 
     def __str__(self):
         return 'WHBundle(id=%s)' % self.id
 
-    def get_properties(self) -> Dict[str, Any]:
-        """Returns a dictionary with properties for the bundle"""
+    def internal_document(self, error: str) -> Dict[str, Any]:
+        """Internal request for the bundle document, served from the property cache when enabled"""
+        cache = self.wh.property_cache
+        if cache is not None:
+            document = cache.get(('bundles', self.id))
+            if document is not None:
+                return document
+
         with self.wh.session.get('%s/bundles/%s' % (self.wh.url, self.id)) as req:
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
-                    'error getting properties: %s' % req.text)
-            return req.json()
+                    '%s: %s' % (error, req.text))
+            document = response_json(req)
+
+        if cache is not None:
+            cache.put(('bundles', self.id), document)
+
+        return document
+
+    def internal_invalidate(self):
+        """Internal removal of the bundle and its files from the property cache, and of all cached searches"""
+        self.wh.internal_invalidate_searches()
+        cache = self.wh.property_cache
+        if cache is None:
+            return
+
+        document = cache.pop(('bundles', self.id))
+        if document is not None:
+            for f in document.get('files', []):
+                cache.invalidate(('files', f['file_id']))
 
+    @timed
+    def get_properties(self) -> Dict[str, Any]:
+        """Returns a dictionary with properties for the bundle"""
+        return self.internal_document('error getting properties')
+
+    @timed
     def files(self) -> List[WHFile]:
         """Returns a list of the files contained in the bundle"""
-        with self.wh.session.get('%s/bundles/%s' % (self.wh.url, self.id)) as req:
-            if req.status_code < 200 or req.status_code >= 300:
-                raise WarehouseClientException(
-                    'error getting files: %s' % req.text)
-            json_res = req.json()
-            files: List[WHFile] = []
-            for f in json_res['files']:
-                files.append(self.wh.file(f['file_id']))
+        json_res = self.internal_document('error getting files')
+        files: List[WHFile] = []
+        for f in json_res['files']:
+            files.append(self.wh.file(f['file_id']))
 
-            return files
+        return files
 
-    def find_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0) -> List[WHFile]:
-        """Performs a search for files in the bundle"""
+    @timed
+    def download_all(self, dest_dir: str, workers: int=8,
+                     progress: Optional[Callable[[TransferProgress], None]]=None) -> BatchResult:
+        """Downloads all files in the bundle in parallel, see Client.download_many"""
+        return self.wh.download_many(self.files(), dest_dir, workers, progress)
+
+    def internal_query(self, query: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Internal conversion of a str or dict query to a query object limited to this bundle"""
         # pyright: reportUnnecessaryIsInstance=false
         query_obj = [self.wh.equals_query('bundle.id', self.id)]
 
@@ -55,36 +101,59 @@ class WHBundle():
         else:
             raise ValueError('only str and dict are supported as query types')
 
-        return self.wh.internal_find_files(self.wh.andQuery(query_obj), sorting, limit)
+        return self.wh.andQuery(query_obj)
 
-    def find_file(self, query: Dict[str, Any], sorting: Optional[Sorting]=None) -> Optional[WHFile]:
+    def find_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                   keys: Optional[List[str]]=None) -> List[WHFile]:
+        """Performs a search for files in the bundle"""
+        return self.wh.internal_find_files(self.internal_query(query), sorting, limit, keys)
+
+    def iter_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                   page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> Iterator[WHFile]:
+        """Returns a generator yielding files in the bundle, fetched one page at a time"""
+        return self.wh.internal_iter_files(self.internal_query(query), sorting, limit, page_size, keys)
+
+    def find_file(self, query: Dict[str, Any], sorting: Optional[Sorting]=None,
+                  keys: Optional[List[str]]=None) -> Optional[WHFile]:
         """Performs a search for a single file"""
         try:
-            return self.find_files(query, sorting, 1)[0]
+            return self.find_files(query, sorting, 1, keys)[0]
         except IndexError:
             return None
 
+    @timed
     def update_properties(self, props: Dict[str, Any]):
         """Sets the provided properties for the bundle
 
         props: dict"""
-        request_json: List[Dict[str, Any]] = []
-        for key, value in props.items():
-            if value is None:
-                request_json.append({'delete': {'key': key}})
-            else:
-                request_json.append({'assign': {'key': key, 'value': value}})
+        request_json = property_operations(props)
 
         with self.wh.session.patch('%s/bundles/%s' % (self.wh.url, self.id), json=request_json) as req:
+            if self.wh.property_cache is not None:
+                self.wh.property_cache.invalidate(('bundles', self.id))
+            self.wh.internal_invalidate_searches()
+
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error updating properties: %s' % req.text)
 
-            return req.json()
+            return response_json(req)
+
+    def batched_updates(self, max_delay: Optional[float]=None, max_keys: Optional[int]=None) -> PropertyBuffer:
+        """Returns a buffer coalescing property updates of this bundle into single requests
+
+        with bundle.batched_updates() as b:
+            b.update_properties({'status': 'running'})
+            ...
+
+        See PropertyBuffer for the flush thresholds."""
+        return PropertyBuffer(self, max_delay, max_keys)
 
     def trash(self):
         """Trashes the bundle"""
         with self.wh.session.post('%s/bundles/%s/trash' % (self.wh.url, self.id)) as req:
+            self.internal_invalidate()
+
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error trashing bundle: %s' % req.text)
@@ -92,6 +161,8 @@ class WHBundle():
     def restore(self):
         """Restores the bundle from trash"""
         with self.wh.session.post('%s/bundles/%s/restore' % (self.wh.url, self.id)) as req:
+            self.internal_invalidate()
+
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error restoring bundle: %s' % req.text)
@@ -99,40 +170,221 @@ class WHBundle():
     def delete(self):
         """Permanently deletes the bundle"""
         with self.wh.session.delete('%s/bundles/%s' % (self.wh.url, self.id)) as req:
+            self.internal_invalidate()
+
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error deleting bundle: %s' % req.text)
 
 
-    def upload_file(self, f: Union[bytes, io.IOBase], name: Optional[str]=None, props: Optional[Dict[str, Any]]={}) -> WHFile:
-        """Uploads the passed file object to the bundle"""
+    @timed
+    def upload_file(self, f: Source, name: Optional[str]=None, props: Optional[Dict[str, Any]]=None,
+                    checksum: Union[str, List[str], None]=None, length: Optional[int]=None,
+                    progress: Optional[Callable[[int], None]]=None) -> WHFile:
+        """Uploads the passed file object to the bundle
+
+        f is bytes, a binary file object or an iterable of bytes chunks, such
+        as a generator. The request body is streamed, so memory use does not
+        depend on the size of the file. Seekable file objects are uploaded
+        from the start. When the size is unknown (pipes, sockets and
+        iterables without length), the body is sent with chunked transfer
+        encoding.
+
+        With checksum (a hashlib algorithm name, or a list of them), the
+        digests of the contents are computed during the upload and stored in
+        the checksum property of the file, so downloads can verify them.
+
+        progress is called with the size of every chunk sent."""
+        props = dict(props or {})
         if name:
             props['filename'] = name
 
-        if isinstance(f, io.RawIOBase) or isinstance(f, io.BufferedIOBase):
-            size = os.fstat(f.fileno()).st_size
+        if hasattr(f, 'seekable') and f.seekable():
             f.seek(0)
-        elif isinstance(f, bytes):
-            size = len(f)
-        else:
-            raise TypeError('f must be bytes or a binary file object')
 
-        part_headers = {'Content-Length': str(size)}
-        file_part = (None, f, 'application/octet-stream', part_headers)
+        chunks, size = iter_chunks(f)
+        hasher = None
+        if checksum:
+            hasher = MultiHasher([checksum] if isinstance(checksum, str) else checksum)
+        if hasher is not None or progress is not None:
+            chunks = self.observed_chunks(chunks, hasher, progress)
+
+        encoder = MultipartEncoder()
+        encoder.add_file('file', chunks, length=size if size is not None else length)
+
+        if hasher is not None:
+            # The properties part follows the file part, so the digests are
+            # known when it is sent. Its size is known up front, as hex
+            # digests have a fixed length.
+            props[CHECKSUM_PROPERTY] = {algorithm: '0' * (2 * h.digest_size) for algorithm, h in hasher.hashes.items()}
+            placeholder = json.dumps(props)
+            def properties() -> bytes:
+                props[CHECKSUM_PROPERTY] = hasher.hexdigests()
+                return json.dumps(props).encode('utf-8')
+            encoder.add_field('properties', properties, len(placeholder.encode('utf-8')))
+        else:
+            encoder.add_field('properties', json.dumps(props))
 
         url = '%s/bundles/%s/files' % (self.wh.url, self.id)
-        with self.wh.session.post(url, files=dict(file=file_part, properties=json.dumps(props))) as req:
+        with self.wh.session.post(url, data=encoder, headers={'Content-Type': encoder.content_type}) as req:
+            if self.wh.property_cache is not None:
+                self.wh.property_cache.invalidate(('bundles', self.id))
+            self.wh.internal_invalidate_searches()
+
+            if req.status_code < 200 or req.status_code >= 300:
+                raise WarehouseClientException(
+                    'error uploading file: %s' % req.text)
+
+            json_res = response_json(req)
+            file_id = json_res.get('file_id')
+            if not file_id:
+                raise WarehouseClientException(
+                    'could not upload file: no id received')
+
+            uploaded = WHFile(self.wh, file_id)
+            uploaded.digests = hasher.hexdigests() if hasher is not None else None
+            return uploaded
+
+    @timed
+    def upload_path(self, path: str, name: Optional[str]=None, props: Optional[Dict[str, Any]]=None,
+                    checksum: Union[str, List[str], None]=None) -> WHFile:
+        """Uploads a local file to the bundle, by default named by its basename
+
+        Over plain HTTP the contents are sent with sendfile on a dedicated
+        connection, so they are never copied into user space. Otherwise
+        (TLS, proxies, or platforms without sendfile) they are sent from a
+        memory map of the file through the session. With checksum, the
+        digests are computed from the memory map before sending."""
+        props = dict(props or {})
+        props['filename'] = name or os.path.basename(path)
+
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            region = FileRegion(f, size)
+
+            if checksum:
+                hasher = MultiHasher([checksum] if isinstance(checksum, str) else checksum)
+                for chunk in region:
+                    hasher.update(chunk)
+                props[CHECKSUM_PROPERTY] = hasher.hexdigests()
+
+            encoder = MultipartEncoder()
+            encoder.add_file('file', region)
+            encoder.add_field('properties', json.dumps(props))
+
+            url = '%s/bundles/%s/files' % (self.wh.url, self.id)
+            if sendfile_supported(self.wh.session, url):
+                req = post_sendfile(self.wh.session, url, encoder)
+            else:
+                req = self.wh.session.post(url, data=encoder, headers={'Content-Type': encoder.content_type})
+
+        with req:
+            if self.wh.property_cache is not None:
+                self.wh.property_cache.invalidate(('bundles', self.id))
+            self.wh.internal_invalidate_searches()
+
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error uploading file: %s' % req.text)
 
-            json_res = req.json()
+            json_res = response_json(req)
             file_id = json_res.get('file_id')
             if not file_id:
                 raise WarehouseClientException(
                     'could not upload file: no id received')
 
-            return WHFile(self.wh, file_id)
+            uploaded = WHFile(self.wh, file_id)
+            uploaded.digests = props.get(CHECKSUM_PROPERTY) if checksum else None
+            return uploaded
+
+    @timed
+    def upload_tree(self, root: str, pattern: Optional[str]=None, workers: int=8,
+                    props_fn: Optional[Callable[[str], Dict[str, Any]]]=None,
+                    checksum: Union[str, List[str], None]=None,
+                    progress: Optional[Callable[[TransferProgress], None]]=None) -> BatchResult:
+        """Uploads the files below root in parallel
+
+        The tree is walked lazily, and files are uploaded by workers threads
+        over the pooled session while the walk continues. Each file is
+        stored with its path relative to root, using '/' separators, in the
+        filename property. With pattern, only files whose relative path
+        matches the fnmatch pattern are uploaded ('*' also matches '/').
+        props_fn is called with the relative path and returns additional
+        properties for the file.
+
+        Failed uploads do not stop the others; the returned BatchResult maps
+        relative paths to the uploaded WHFile objects, or to the exception
+        raised by the upload or by props_fn. Other errors, such as a failing
+        walk, cancel the uploads not yet started before they are raised.
+        The total of the progress object grows as files are found."""
+        tracker = TransferProgress(0, progress)
+        result = BatchResult()
+
+        def upload(path: str, relative: str) -> Union[WHFile, Exception]:
+            try:
+                props = props_fn(relative) if props_fn is not None else {}
+            except Exception as e:  # pylint: disable=broad-except
+                # Errors of the caller's props_fn are reported for the file, like failed uploads
+                return e
+            with open(path, 'rb') as f:
+                return self.upload_file(f, relative, props, checksum, progress=tracker.add_bytes)
+
+        def collect(future: Future[Union[WHFile, Exception]]):
+            relative = pending.pop(future)
+            try:
+                uploaded = future.result()
+            except (WarehouseClientException, requests.RequestException, OSError, ValueError) as e:
+                uploaded = e
+
+            if isinstance(uploaded, Exception):
+                result.errors[relative] = uploaded
+            else:
+                result.results[relative] = uploaded
+            tracker.item_done()
+
+        pending: Dict[Future[Union[WHFile, Exception]], str] = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                for path, relative in self.walk_tree(root, pattern):
+                    # Bound the number of queued uploads, so huge trees are not
+                    # walked ahead of the uploads
+                    while len(pending) >= 2 * workers:
+                        for future in wait(pending, return_when=FIRST_COMPLETED).done:
+                            collect(future)
+
+                    tracker.total += 1
+                    pending[executor.submit(upload, path, relative)] = relative
+
+                for future in as_completed(list(pending)):
+                    collect(future)
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        return result
+
+    @staticmethod
+    def walk_tree(root: str, pattern: Optional[str]=None) -> Iterator[Tuple[str, str]]:
+        """Yields the paths of the files below root, with their '/' separated paths relative to root"""
+        for directory, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(directory, filename)
+                relative = os.path.relpath(path, root).replace(os.sep, '/')
+                if pattern is None or fnmatch.fnmatchcase(relative, pattern):
+                    yield path, relative
+
+    @staticmethod
+    def observed_chunks(chunks: Iterator[bytes], hasher: Optional[MultiHasher],
+                        progress: Optional[Callable[[int], None]]) -> Iterator[bytes]:
+        """Yields the chunks, adding each to the hasher and reporting its size to progress"""
+        for chunk in chunks:
+            if hasher is not None:
+                hasher.update(chunk)
+            if progress is not None:
+                progress(len(chunk))
+            yield chunk
 
     # Deprecated camelCase methods
     # Will be removed in future release
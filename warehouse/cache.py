@@ -0,0 +1,126 @@
+"""Cache module"""
+from __future__ import annotations
+
+import copy
+import json
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class LRUCache():
+    """Bounded least recently used cache with a per-entry time to live
+
+    Values are copied on insertion and lookup, so callers can modify the
+    returned objects without affecting the cached entries. Immutable values,
+    such as the tuples of the search cache, can skip the copies with
+    copy_value=False. The cache is safe to share between threads."""
+
+    def __init__(self, maxsize: int=1024, ttl: Optional[float]=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: Hashable, copy_value: bool=True) -> Optional[Any]:
+        """Returns a copy of the cached value, or None if missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and entry[0] + self.ttl < time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            value = entry[1]
+
+        return copy.deepcopy(value) if copy_value else value
+
+    def put(self, key: Hashable, value: Any, copy_value: bool=True):
+        """Stores a copy of the value, evicting the least recently used entries if full"""
+        if copy_value:
+            value = copy.deepcopy(value)
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Removes an entry, returning its value if it was present"""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+
+        return entry[1] if entry is not None else None
+
+    def invalidate(self, key: Hashable):
+        """Removes an entry"""
+        self.pop(key)
+
+    def invalidate_matching(self, predicate: Callable[[Hashable], bool]):
+        """Removes all entries with keys matching the predicate"""
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+    def clear(self):
+        """Removes all entries"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns a dictionary with hit, miss and eviction counters"""
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+# Query operators whose operands may be given in any order
+COMMUTATIVE_OPERATORS = ('and', 'or')
+
+
+def canonical_key(obj: Any) -> str:
+    """Returns a string identifying a JSON query object regardless of key order
+
+    The operands of 'and' and 'or' queries are sorted as well, as their
+    order does not change the result."""
+    return json.dumps(canonical_value(obj), sort_keys=True, separators=(',', ':'))
+
+
+def canonical_value(obj: Any) -> Any:
+    """Returns obj with the operands of commutative query operators sorted"""
+    if isinstance(obj, dict):
+        result = {}
+        for key, value in obj.items():
+            value = canonical_value(value)
+            if key in COMMUTATIVE_OPERATORS and isinstance(value, list):
+                value = sorted(value, key=lambda operand: json.dumps(operand, sort_keys=True))
+            result[key] = value
+        return result
+
+    if isinstance(obj, (list, tuple)):
+        return [canonical_value(value) for value in obj]
+
+    return obj
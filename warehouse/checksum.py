@@ -0,0 +1,77 @@
+"""Checksum module"""
+from __future__ import annotations
+
+import hashlib
+
+from warehouse.errors import ChecksumMismatchException, WarehouseClientException
+
+from typing import Any, Dict, Iterable, Optional, Union
+
+# File property holding the digests of the file contents, as a dictionary
+# mapping hashlib algorithm names to hex digests, e.g. {'sha256': '...'}
+CHECKSUM_PROPERTY = 'checksum'
+
+
+class MultiHasher():
+    """Computes digests with several algorithms in a single pass"""
+
+    def __init__(self, algorithms: Iterable[str]):
+        self.hashes = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+
+    def update(self, data: Union[bytes, memoryview]):
+        """Adds data to all digests"""
+        for h in self.hashes.values():
+            h.update(data)
+
+    def hexdigests(self) -> Dict[str, str]:
+        """Returns the hex digests, keyed by algorithm"""
+        return {algorithm: h.hexdigest() for algorithm, h in self.hashes.items()}
+
+
+def hash_file(hasher: MultiHasher, path: str, length: Optional[int]=None):
+    """Adds the first length bytes (or all) of a file to the hasher"""
+    with open(path, 'rb') as f:
+        while length is None or length > 0:
+            chunk = f.read(1024 * 1024 if length is None else min(length, 1024 * 1024))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            if length is not None:
+                length -= len(chunk)
+
+
+def expected_digests(verify: Any, properties: Optional[Dict[str, Any]]) -> Dict[str, Optional[str]]:
+    """Returns the digests to compute for a download, mapped to the expected values
+
+    verify is one of:
+      True: check every known algorithm stored in the checksum property
+      str or list of str: compute these algorithms, checking the stored
+        values where present
+      dict: expected hex digests keyed by algorithm
+    Algorithms mapped to None are computed without being checked."""
+    stored: Dict[str, Any] = {}
+    if properties is not None and isinstance(properties.get(CHECKSUM_PROPERTY), dict):
+        stored = properties[CHECKSUM_PROPERTY]
+
+    if verify is True:
+        expected = {algorithm: value for algorithm, value in stored.items()
+                    if algorithm in hashlib.algorithms_available}
+        if not expected:
+            raise WarehouseClientException('no known checksum stored for file')
+        return expected
+
+    if isinstance(verify, dict):
+        return dict(verify)
+
+    if isinstance(verify, str):
+        verify = [verify]
+
+    return {algorithm: stored.get(algorithm) for algorithm in verify}
+
+
+def check_digests(expected: Dict[str, Optional[str]], computed: Dict[str, str]):
+    """Raises ChecksumMismatchException if a computed digest differs from the expected one"""
+    for algorithm, value in expected.items():
+        if value is not None and value.lower() != computed[algorithm]:
+            raise ChecksumMismatchException(
+                'checksum mismatch: %s is %s, expected %s' % (algorithm, computed[algorithm], value))
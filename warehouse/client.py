@@ -4,16 +4,37 @@ Warehouse Client
 This module contains the main client for warehouse communication.
 """
 
+import os
+import threading
+import time
+import urllib.parse
+import warnings
 import requests
+import requests.adapters
 import requests.auth
-
-from typing import Optional, Any, List, Dict, Union
+import requests.utils
+from requests.structures import CaseInsensitiveDict
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Any, Callable, Iterable, List, Dict, Mapping, Sequence, Tuple, Union, Iterator
+from warehouse.admission import AdmissionController, IDEMPOTENT_METHODS, OVERLOAD_STATUSES, RETRY_STATUSES, \
+    backoff_delay, retry_after
+from warehouse.batch import BatchResult, TransferProgress
 from warehouse.bundle import WHBundle
+from warehouse.cache import LRUCache, canonical_key
+from warehouse.compression import ACCEPT_ENCODING, TransferCounters, compress_json, endpoint_name
 from warehouse.file import WHFile
+from warehouse.filecache import FileCache
+from warehouse.jsondecode import iter_json_array, response_json, set_json_decoder
+from warehouse.metrics import Histogram, MetricEvent, Metrics, RepeatedRequestWarning, timed
+from warehouse.httpcache import ResponseStore, MemoryResponseStore, DiskResponseStore
 from warehouse.organization import WHOrganization
+from warehouse.pagination import KeysetPaginator
 from warehouse.project import WHProject
+from warehouse.properties import PropertyBuffer
+from warehouse.resultset import ResultSet
 from warehouse.sorting import Sorting
-from warehouse.errors import WarehouseClientException
+from warehouse.errors import WarehouseClientException, ChecksumMismatchException
 
 
 class UserCredentialsAuth():
@@ -50,28 +71,349 @@ class ApikeyAuth():
         return req
 
 class TimeoutSession(requests.Session):
-    """Requests session override with Timeout handling"""
-    def __init__(self, connect_timeout, read_timeout):
+    """Requests session override with Timeout handling
+
+    When a response_cache is set, GET responses carrying an ETag or
+    Last-Modified header are stored, later GETs of the same URL are sent as
+    conditional requests, and a 304 Not Modified answer is served with the
+    stored body.
+
+    With retries, idempotent requests (GET, HEAD, OPTIONS, PUT, DELETE)
+    failing with a connection error, a timeout or a 429, 502, 503 or 504
+    response are retried up to retries times, after the Retry-After delay
+    of the response or a jittered exponential backoff of at most
+    max_backoff seconds. When an admission controller is set, every request waits for a
+    slot in it, and Retry-After holds back all requests of the session.
+    Only 429 and 503 responses and timeouts count as overload for the
+    controller; other connection errors, such as a refused connection, do
+    not say anything about the load of the server.
+
+    Responses are requested compressed with every coding urllib3 can
+    decode while reading (gzip and deflate, and br and zstd with the
+    compression extra). With compress_requests, JSON request bodies larger
+    than that many bytes are sent gzip compressed. The bytes on the wire
+    and decoded are counted per endpoint in transfer.
+
+    Every request sent, including each retry, is recorded in metrics. For
+    streamed responses, the latency is the time until the headers arrived."""
+    def __init__(self, connect_timeout, read_timeout, response_cache: Optional[ResponseStore]=None,
+                 admission: Optional[AdmissionController]=None, retries: int=0, max_backoff: float=30.0,
+                 compress_requests: Optional[int]=None, metrics: Optional[Metrics]=None):
         self.connect_timeout = connect_timeout
         self.read_timeout = read_timeout
+        self.response_cache = response_cache
+        self.admission = admission
+        self.retries = retries
+        self.max_backoff = max_backoff
+        self.compress_requests = compress_requests
+        self.transfer = TransferCounters()
+        self.metrics = metrics if metrics is not None else Metrics()
 
         super(TimeoutSession, self).__init__()
+        self.headers['Accept-Encoding'] = ACCEPT_ENCODING
 
-    def request(self, *args, **kwargs):
+    def request(self, method, url, *args, **kwargs):
         kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
-        return super(TimeoutSession, self).request(*args, **kwargs)
+        sent_decoded = None
+        if (self.compress_requests is not None and kwargs.get('json') is not None
+                and method.upper() in ('POST', 'PUT', 'PATCH')):
+            body, headers, sent_decoded = compress_json(kwargs.pop('json'), self.compress_requests)
+            kwargs['data'] = body
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **headers)
+
+        self.metrics.check_repeated(method, url)
+        res = self.internal_cached_request(method, url, *args, **kwargs)
+        if not kwargs.get('stream'):
+            self.internal_count(method, res, sent_decoded)
+
+        return res
+
+    def internal_count(self, method: str, res: requests.Response, sent_decoded: Optional[int],
+                       received_decoded: Optional[int]=None):
+        """Internal update of the transfer counters with a completed response
+
+        received_decoded is the size of a streamed body, which is not kept in
+        the response."""
+        if received_decoded is None:
+            received_decoded = len(res.content)
+        body = res.request.body if res.request is not None else None
+        sent = len(body) if isinstance(body, (bytes, str)) else getattr(body, 'len', None) or 0
+        raw = getattr(res, 'raw', None)
+        received = raw.tell() if raw is not None and hasattr(raw, 'tell') else received_decoded
+        self.transfer.add(endpoint_name(method, urllib.parse.urlsplit(res.url).path), sent,
+                          sent if sent_decoded is None else sent_decoded, received, received_decoded)
+
+    def internal_cached_request(self, method, url, *args, **kwargs) -> requests.Response:
+        """Internal request through the response cache, if any"""
+        if self.response_cache is None or method.upper() != 'GET' or kwargs.get('stream'):
+            return self.internal_send(method, url, *args, **kwargs)
+
+        key = requests.Request('GET', url, params=kwargs.get('params')).prepare().url or url
+        entry = self.response_cache.get(key)
+        if entry is not None:
+            headers = dict(kwargs.get('headers') or {})
+            if 'ETag' in entry['headers']:
+                headers['If-None-Match'] = entry['headers']['ETag']
+            if 'Last-Modified' in entry['headers']:
+                headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+            kwargs['headers'] = headers
+
+        res = self.internal_send(method, url, *args, **kwargs)
+
+        if res.status_code == 304 and entry is not None:
+            return self.cached_response(res, entry)
+
+        if 200 <= res.status_code < 300 and ('ETag' in res.headers or 'Last-Modified' in res.headers):
+            stored_headers = {key: value for key, value in res.headers.items()
+                              if key.lower() not in ('content-encoding', 'content-length', 'transfer-encoding')}
+            self.response_cache.put(key, {
+                'status_code': res.status_code,
+                'headers': stored_headers,
+                'content': res.content,
+            })
+
+        return res
+
+    def internal_send(self, method, url, *args, **kwargs) -> requests.Response:
+        """Internal request through the admission controller, retrying idempotent requests"""
+        retry = method.upper() in IDEMPOTENT_METHODS
+        endpoint = endpoint_name(method, urllib.parse.urlsplit(url).path)
+        attempt = 0
+
+        while True:
+            if self.admission is not None:
+                self.admission.acquire()
+
+            started = time.monotonic()
+            overloaded = False
+            res = None
+            error: Optional[BaseException] = None
+            try:
+                res = super(TimeoutSession, self).request(method, url, *args, **kwargs)
+                overloaded = res.status_code in OVERLOAD_STATUSES
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+                overloaded = isinstance(e, requests.exceptions.Timeout)
+                if not retry or attempt >= self.retries:
+                    raise
+            except BaseException as e:
+                error = e
+                overloaded = isinstance(e, requests.exceptions.Timeout)
+                raise
+            finally:
+                latency = time.monotonic() - started
+                if self.admission is not None:
+                    self.admission.release(latency, overloaded)
+                self.metrics.record_request(endpoint, latency, res.status_code if res is not None else None,
+                                            attempt, error)
+
+            delay = backoff_delay(attempt, maximum=self.max_backoff)
+            if res is not None:
+                wait = retry_after(res.headers.get('Retry-After')) if overloaded else None
+                if wait is not None:
+                    delay = wait
+                    if self.admission is not None:
+                        self.admission.pause(wait)
+
+                if not retry or res.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return res
+
+                res.close()
+
+            time.sleep(delay)
+            attempt += 1
 
-class Client():
-    """Main client object for warehouse"""
+    @staticmethod
+    def cached_response(res: requests.Response, entry: Dict[str, Any]) -> requests.Response:
+        """Turns a 304 Not Modified response into the stored response"""
+        # pylint: disable=protected-access
+        headers = CaseInsensitiveDict(entry['headers'])
+        for key in ('ETag', 'Last-Modified', 'Date', 'Cache-Control', 'Expires'):
+            if key in res.headers:
+                headers[key] = res.headers[key]
+
+        res.status_code = entry['status_code']
+        res.headers = headers
+        res._content = entry['content']
+        res._content_consumed = True
+        res.from_cache = True
+        return res
 
-    def __init__(self, url: str, auth: Any, verify: bool=True, connect_timeout: float=10.0, read_timeout: float=600.0):
+class Client():
+    """Main client object for warehouse
+
+    A client may be shared between threads. All requests go through one
+    session, whose connection pool hands each connection to one thread at a
+    time, and the caches take locks. pool_maxsize is the number of
+    connections kept open per host; size it to the number of threads
+    sharing the client, as connections opened beyond it are closed after
+    every request. With pool_block, threads wait for a free connection
+    instead of opening extra ones. pool_connections is the number of hosts
+    pools are kept for."""
+
+    def __init__(self, url: str, auth: Any, verify: bool=True, connect_timeout: float=10.0, read_timeout: float=600.0,
+                 page_size: int=1000, property_cache: Optional[LRUCache]=None,
+                 http_cache: Union[bool, ResponseStore]=False, file_cache: Optional[FileCache]=None,
+                 retries: int=0, admission: Union[bool, AdmissionController]=False,
+                 pool_connections: int=10, pool_maxsize: int=10, pool_block: bool=False,
+                 compress_requests: Optional[int]=None, search_cache: Optional[LRUCache]=None,
+                 metrics: Optional[Metrics]=None):
         self.url = url
         self.auth = auth
-        self.session = TimeoutSession(connect_timeout, read_timeout)
+        self.page_size = page_size
+        # Optional cache of bundle and file property documents, keyed by
+        # ('bundles', id) and ('files', id)
+        self.property_cache = property_cache
+        # Optional on-disk cache of downloaded file contents
+        self.file_cache = file_cache
+        # Optional cache of search result rows, keyed by ('search', canonical
+        # query). Changes made through this client clear it, see
+        # internal_invalidate_searches; changes made elsewhere are seen after
+        # the time to live of its entries.
+        self.search_cache = search_cache
+        self.search_generation = 0
+        if http_cache is True:
+            http_cache = MemoryResponseStore()
+        if admission is True:
+            admission = AdmissionController()
+        self.session = TimeoutSession(connect_timeout, read_timeout, http_cache or None, admission or None, retries,
+                                      compress_requests=compress_requests, metrics=metrics)
+        # Request and method timings, see Metrics
+        self.metrics = self.session.metrics
 
         self.session.auth = auth
         self.session.verify = verify
 
+        self.pool_maxsize = pool_maxsize
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                                pool_block=pool_block)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def warmup(self, n: int) -> int:
+        """Opens up to n connections to warehouse in parallel and keeps them in the pool
+
+        This moves TCP and TLS setup out of the way of a following burst of
+        requests. The connections are opened by n concurrent ping requests,
+        which hold on to their connection until all of them have a response,
+        so each one opens its own. At most pool_maxsize connections are kept.
+        Errors of the requests are raised once all have completed. Returns
+        the number of idle connections in the pool."""
+        n = min(n, self.pool_maxsize)
+        if n <= 0:
+            return 0
+
+        barrier = threading.Barrier(n)
+
+        def open_connection():
+            try:
+                req = self.session.get('%s/ping' % self.url, auth=self.auth, stream=True)
+            except BaseException:
+                barrier.abort()
+                raise
+
+            with req:
+                try:
+                    barrier.wait(timeout=self.session.connect_timeout + self.session.read_timeout)
+                except threading.BrokenBarrierError:
+                    # Another request failed, its error is raised below
+                    pass
+                # Reading the body returns the connection to the pool
+                req.raise_for_status()
+                req.content  # pylint: disable=pointless-statement
+
+        with warnings.catch_warnings():
+            # The pings are repeated on purpose
+            warnings.simplefilter('ignore', RepeatedRequestWarning)
+            with ThreadPoolExecutor(max_workers=n) as executor:
+                futures = [executor.submit(open_connection) for _ in range(n)]
+        for future in futures:
+            future.result()
+
+        return self.pool_stats()[self.internal_pool_key(self.internal_pool())]['idle']
+
+    def internal_pool(self) -> Any:
+        """Internal lookup of the urllib3 connection pool used for warehouse requests"""
+        adapter = self.session.get_adapter(self.url)
+        if hasattr(adapter, 'get_connection_with_tls_context'):
+            # Resolve verify like requests does, as it is part of the pool key
+            settings = self.session.merge_environment_settings(self.url, {}, None, None, None)
+            request = requests.Request('GET', self.url).prepare()
+            return adapter.get_connection_with_tls_context(request, settings['verify'], cert=settings['cert'])
+        return adapter.get_connection(self.url)
+
+    @staticmethod
+    def internal_pool_key(pool: Any) -> str:
+        """Internal name of a connection pool in pool_stats"""
+        return '%s://%s:%s' % (pool.scheme, pool.host, pool.port)
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns connection pool counters, keyed by scheme://host:port
+
+        For every host: maxsize, idle (open connections waiting in the
+        pool), opened (connections opened so far; more than maxsize means
+        connections were discarded) and requests."""
+        stats: Dict[str, Dict[str, int]] = {}
+        for adapter in set(self.session.adapters.values()):
+            manager = getattr(adapter, 'poolmanager', None)
+            if manager is None:
+                continue
+
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                queue = pool.pool
+                counters = stats.setdefault(self.internal_pool_key(pool),
+                                            {'maxsize': 0, 'idle': 0, 'opened': 0, 'requests': 0})
+                if queue is not None:
+                    counters['maxsize'] += queue.maxsize
+                    counters['idle'] += sum(1 for conn in list(queue.queue) if conn is not None)
+                counters['opened'] += pool.num_connections
+                counters['requests'] += pool.num_requests
+
+        return stats
+
+    def transfer_stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns byte counters keyed by endpoint, e.g. 'POST /search/keys'
+
+        For every endpoint: requests, sent and received (bytes on the wire),
+        and sent_decoded and received_decoded (bytes before compression and
+        after decompression). Streamed downloads are not counted."""
+        return self.session.transfer.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the counters of the client in one dictionary
+
+        endpoints: per endpoint, the request metrics (requests, errors,
+        retries, statuses and latency histogram, see Metrics) with the byte
+        counters of transfer_stats; calls: per API method, the call count,
+        errors and latency histogram; repeated: URLs flagged by the repeated
+        GET detection; pools: pool_stats(); admission: the admission
+        controller counters, None without one; caches: the counters of the
+        enabled property, search and file caches."""
+        metrics = self.metrics.stats()
+        endpoints = metrics['requests']
+        for endpoint, counters in self.transfer_stats().items():
+            merged = endpoints.setdefault(endpoint, {})
+            merged.update({key: value for key, value in counters.items() if key != 'requests'})
+
+        caches = {}
+        for name, cache in (('property', self.property_cache), ('search', self.search_cache),
+                            ('file', self.file_cache)):
+            if cache is not None:
+                caches[name] = cache.stats()
+
+        admission = self.session.admission
+        return {
+            'endpoints': endpoints,
+            'calls': metrics['calls'],
+            'repeated': metrics['repeated'],
+            'pools': self.pool_stats(),
+            'admission': admission.stats() if admission is not None else None,
+            'caches': caches,
+        }
+
     def ping(self):
         """Tests the connection to warehouse"""
         with self.session.get('%s/ping' % self.url, auth=self.auth) as req:
@@ -112,13 +454,39 @@ class Client():
         """Returns a natural query"""
         return {'natural_query': query}
 
-    def bundle(self, bundle_id: str):
+    @staticmethod
+    def greater_than_query(key: str, value: Any, inclusive: bool=False) -> Dict[str, Any]:
+        """Returns a warehouse greater than (or equals) query"""
+        operator = 'greater_than_or_equals' if inclusive else 'greater_than'
+        return {operator: {'key': key, 'value': value}}
+
+    @staticmethod
+    def less_than_query(key: str, value: Any, inclusive: bool=False) -> Dict[str, Any]:
+        """Returns a warehouse less than (or equals) query"""
+        operator = 'less_than_or_equals' if inclusive else 'less_than'
+        return {operator: {'key': key, 'value': value}}
+
+    def internal_query(self, query: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Internal conversion of a str or dict query to a query object"""
+        # pyright: reportUnnecessaryIsInstance=false
+        if isinstance(query, str):
+            return self.natural_query(query)
+        if isinstance(query, dict):
+            items: List[Any] = []
+            for key, value in query.items():
+                items.append(self.str_matches_query(key, value))
+
+            return self.and_query(items)
+
+        raise ValueError('only str and dict are supported as query types')
+
+    def bundle(self, bundle_id: str, properties: Optional[Dict[str, Any]]=None):
         """Returns a WHBundle object with the provided ID"""
-        return WHBundle(self, bundle_id)
+        return WHBundle(self, bundle_id, properties)
 
-    def file(self, file_id: str):
+    def file(self, file_id: str, properties: Optional[Dict[str, Any]]=None):
         """Returns a WHFile object with the provided ID"""
-        return WHFile(self, file_id)
+        return WHFile(self, file_id, properties)
 
     def project(self, project_id: str):
         """Returns a WHProject object with the provided ID"""
@@ -133,7 +501,7 @@ class Client():
         with self.session.get('%s/organizations' % self.url) as req:
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException('returned error: %s' % req.text)
-            json_res = req.json()
+            json_res = response_json(req)
             _projects: List[WHProject] = []
             for organization in json_res['organizations']:
                 for project in organization['projects']:
@@ -142,18 +510,24 @@ class Client():
 
             return _projects
 
-    def internal_find_bundles(self, query: Dict[str, Any], sorting:Optional[Sorting]=None, limit:int=0) -> List[WHBundle]:
-        """Internal bundle lookup method"""
-        if not sorting:
-            sorting = Sorting(None, None, None)
+    def internal_search(self, table: str, keys: List[str], query: Dict[str, Any], sorting: Optional[Sorting]=None,
+                        limit: int=0) -> List[Sequence[Any]]:
+        """Internal search method, returns the raw result rows for the requested keys"""
+        return list(self.internal_search_rows(table, keys, query, sorting, limit))
 
-        keys = ['bundle.id']
+    def internal_search_rows(self, table: str, keys: List[str], query: Dict[str, Any],
+                             sorting: Optional[Sorting]=None, limit: int=0) -> Iterator[Sequence[Any]]:
+        """Internal streaming search method, yields the raw result rows as they are received
 
-        if sorting.key:
-            keys.append(sorting.key)
+        The results array is decoded one row at a time while the response is
+        read, so the whole response is never held in memory at once. With a
+        search_cache, the rows are cached as tuples, which are shared between
+        the searches hitting the entry instead of copied."""
+        if not sorting:
+            sorting = Sorting(None, None, None)
 
         query_obj: Dict[str, Any] = {
-            'table': 'bundles',
+            'table': table,
             'keys': keys,
             'sorting': sorting.as_dict(),
             'query': query
@@ -162,101 +536,274 @@ class Client():
         if limit > 0:
             query_obj['limit'] = limit
 
-        bundles: List[WHBundle] = []
-        with self.session.post('%s/search/keys' % self.url, json=query_obj) as req:
+        cache = self.search_cache
+        if cache is not None:
+            cache_key = ('search', canonical_key(query_obj))
+            cached = cache.get(cache_key, copy_value=False)
+            if cached is not None:
+                yield from cached
+                return
+
+            rows: List[Tuple[Any, ...]] = []
+            generation = self.search_generation
+            for row in self.internal_search_request(query_obj):
+                row = tuple(row)
+                rows.append(row)
+                yield row
+
+            # A change made during the search may not be reflected in the rows
+            if generation == self.search_generation:
+                cache.put(cache_key, tuple(rows), copy_value=False)
+            return
+
+        yield from self.internal_search_request(query_obj)
+
+    def internal_search_request(self, query_obj: Dict[str, Any]) -> Iterator[List[Any]]:
+        """Internal search request, yields the result rows as they are decoded"""
+        with self.session.post('%s/search/keys' % self.url, json=query_obj, stream=True) as req:
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error searching: %s' % req.text)
-            json_res = req.json()
 
-            for bundle in json_res['results']:
-                bundles.append(self.bundle(bundle[0]))
+            received = 0
+            def chunks() -> Iterator[bytes]:
+                nonlocal received
+                for chunk in req.iter_content(chunk_size=64 * 1024):
+                    received += len(chunk)
+                    yield chunk
 
-        return bundles
+            yield from iter_json_array(chunks(), 'results')
+            self.session.internal_count('POST', req, None, received)
 
-    def find_bundles(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting] = None, limit: int=0):
-        """Perform a search for bundles with the given parameters"""
-        # pyright: reportUnnecessaryIsInstance=false
-        if isinstance(query, str):
-            query_obj = self.natural_query(query)
-        elif isinstance(query, dict):
-            items: List[Any] = []
-            for key, value in query.items():
-                items.append(self.str_matches_query(key, value))
+    def internal_invalidate_searches(self):
+        """Internal removal of all cached search results, after a change made through this client"""
+        self.search_generation += 1
+        if self.search_cache is not None:
+            self.search_cache.invalidate_matching(lambda key: isinstance(key, tuple) and key[0] == 'search')
 
-            query_obj = self.and_query(items)
-        else:
-            raise ValueError('only str and dict are supported as query types')
+    @staticmethod
+    def internal_columns(id_key: str, keys: Optional[List[str]], sorting: Optional[Sorting]) -> List[str]:
+        """Internal list of search keys: the ID, the projected keys and the sorting key"""
+        columns = [id_key]
+        for key in (keys or []) + ([sorting.key] if sorting and sorting.key else []):
+            if key not in columns:
+                columns.append(key)
 
-        return self.internal_find_bundles(query_obj, sorting, limit)
+        return columns
 
-    def find_bundle(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None):
-        """Perform a search for a single bundle"""
-        try:
-            return self.find_bundles(query, sorting, 1)[0]
-        except IndexError:
+    @staticmethod
+    def internal_row_properties(columns: List[str], keys: Optional[List[str]], row: Sequence[Any]) -> Optional[Dict[str, Any]]:
+        """Internal mapping of a result row to the projected properties"""
+        if keys is None:
             return None
 
-    def internal_find_files(self, query: Dict[str, Any], sorting: Optional[Sorting]=None, limit: int=0):
-        """Internal file lookup method"""
-        if not sorting:
-            sorting = Sorting(None, None, None)
+        return {key: row[columns.index(key)] for key in keys}
 
-        keys = ['file.id']
+    def internal_iter_search(self, table: str, keys: List[str], query: Dict[str, Any], sorting: Optional[Sorting]=None,
+                             limit: int=0, page_size: Optional[int]=None) -> Iterator[Sequence[Any]]:
+        """Internal paginated search method, yields result rows one page at a time
 
-        if sorting.key:
-            keys.append(sorting.key)
+        The first key must be the ID of the table, see KeysetPaginator"""
+        paginator = KeysetPaginator(self, keys, query, sorting, limit, page_size or self.page_size)
+        while not paginator.done:
+            page_query, page_limit = paginator.next_page()
+            rows = self.internal_search(table, paginator.keys, page_query, paginator.sorting, page_limit)
+            yield from paginator.feed(rows)
 
-        query_obj: Dict[str, Any] = {
-            'table': 'files',
-            'keys': keys,
-            'sorting': sorting.as_dict(),
-            'query': query
-        }
+    def internal_find_bundles(self, query: Dict[str, Any], sorting:Optional[Sorting]=None, limit:int=0,
+                              keys: Optional[List[str]]=None,
+                              compact: bool=False) -> Union[List[WHBundle], ResultSet]:
+        """Internal bundle lookup method"""
+        columns = self.internal_columns('bundle.id', keys, sorting)
+        if compact:
+            result = ResultSet(self.bundle, keys)
+            result.extend_rows(columns, self.internal_search_rows('bundles', columns, query, sorting, limit))
+            return result
 
-        if limit > 0:
-            query_obj['limit'] = limit
+        bundles: List[WHBundle] = []
+        for bundle in self.internal_search_rows('bundles', columns, query, sorting, limit):
+            bundles.append(self.bundle(bundle[0], self.internal_row_properties(columns, keys, bundle)))
 
-        files: List[WHFile] = []
-        with self.session.post('%s/search/keys' % self.url, json=query_obj) as req:
-            if req.status_code < 200 or req.status_code >= 300:
-                raise WarehouseClientException(
-                    'error searching: %s' % req.text)
-            json_res = req.json()
+        return bundles
 
-            for f in json_res['results']:
-                files.append(self.file(f[0]))
+    def internal_iter_bundles(self, query: Dict[str, Any], sorting: Optional[Sorting]=None, limit: int=0,
+                              page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> Iterator[WHBundle]:
+        """Internal paginated bundle lookup method"""
+        columns = self.internal_columns('bundle.id', keys, None)
+        for bundle in self.internal_iter_search('bundles', columns, query, sorting, limit, page_size):
+            yield self.bundle(bundle[0], self.internal_row_properties(columns, keys, bundle))
+
+    @timed
+    def find_bundles(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting] = None, limit: int=0,
+                     keys: Optional[List[str]]=None, compact: bool=False):
+        """Perform a search for bundles with the given parameters
+
+        The values of the search keys in keys (e.g. 'bundle.version') are
+        returned with the search and available in WHBundle.properties
+
+        With compact, a ResultSet is returned instead of a list. It stores the
+        IDs and key values in compact columns and creates the WHBundle objects
+        when accessed, which takes far less memory for large results."""
+        return self.internal_find_bundles(self.internal_query(query), sorting, limit, keys, compact)
+
+    def iter_bundles(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                     page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> Iterator[WHBundle]:
+        """Returns a generator yielding bundles for the given search, fetched one page at a time"""
+        return self.internal_iter_bundles(self.internal_query(query), sorting, limit, page_size, keys)
+
+    def find_bundle(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None,
+                    keys: Optional[List[str]]=None):
+        """Perform a search for a single bundle"""
+        try:
+            return self.find_bundles(query, sorting, 1, keys)[0]
+        except IndexError:
+            return None
+
+    def internal_find_files(self, query: Dict[str, Any], sorting: Optional[Sorting]=None, limit: int=0,
+                            keys: Optional[List[str]]=None, compact: bool=False):
+        """Internal file lookup method"""
+        columns = self.internal_columns('file.id', keys, sorting)
+        if compact:
+            result = ResultSet(self.file, keys)
+            result.extend_rows(columns, self.internal_search_rows('files', columns, query, sorting, limit))
+            return result
+
+        files: List[WHFile] = []
+        for f in self.internal_search_rows('files', columns, query, sorting, limit):
+            files.append(self.file(f[0], self.internal_row_properties(columns, keys, f)))
 
         return files
 
-    def find_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0):
-        """Perform a search for files with the given parameters"""
-        if isinstance(query, str):
-            query_obj = self.natural_query(query)
-        elif isinstance(query, dict):
-            items: List[Any] = []
-            for key, value in query.items():
-                items.append(self.str_matches_query(key, value))
+    def internal_iter_files(self, query: Dict[str, Any], sorting: Optional[Sorting]=None, limit: int=0,
+                            page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> Iterator[WHFile]:
+        """Internal paginated file lookup method"""
+        columns = self.internal_columns('file.id', keys, None)
+        for f in self.internal_iter_search('files', columns, query, sorting, limit, page_size):
+            yield self.file(f[0], self.internal_row_properties(columns, keys, f))
+
+    @timed
+    def find_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                   keys: Optional[List[str]]=None, compact: bool=False):
+        """Perform a search for files with the given parameters
 
-            query_obj = self.and_query(items)
-        else:
-            raise ValueError('only str and dict are supported as query types')
+        The values of the search keys in keys (e.g. 'file.filename') are
+        returned with the search and available in WHFile.properties
 
-        return self.internal_find_files(query_obj, sorting, limit)
+        With compact, a ResultSet is returned instead of a list, see
+        find_bundles."""
+        return self.internal_find_files(self.internal_query(query), sorting, limit, keys, compact)
 
-    def find_file(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None):
+    def iter_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                   page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> Iterator[WHFile]:
+        """Returns a generator yielding files for the given search, fetched one page at a time"""
+        return self.internal_iter_files(self.internal_query(query), sorting, limit, page_size, keys)
+
+    def find_file(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None,
+                  keys: Optional[List[str]]=None):
         """Perform a search for a single file"""
         try:
-            return self.find_files(query, sorting, 1)[0]
+            return self.find_files(query, sorting, 1, keys)[0]
         except IndexError:
             return None
 
+    @timed
+    def search_table(self, table: str, query: Union[str, Dict[str, Any]], keys: List[str],
+                     sorting: Optional[Sorting]=None, limit: int=0, page_size: Optional[int]=None,
+                     output: str='numpy') -> Any:
+        """Searches bundles or files and returns the values of keys as a table
+
+        table is 'bundles' or 'files'. The table has a column for the ID
+        ('bundle.id' or 'file.id') followed by one column per search key.
+        Results are fetched one page at a time and decoded into typed columns,
+        without creating objects per row. output selects a numpy structured
+        array ('numpy'), a pyarrow Table ('arrow') or a pandas DataFrame
+        ('pandas'), which require the respective package."""
+        if table not in ('bundles', 'files'):
+            raise ValueError('table must be bundles or files')
+        # Imported here, as the table module is only needed by this method
+        from warehouse.table import OUTPUTS, TableBuilder  # pylint: disable=import-outside-toplevel
+        if output not in OUTPUTS:
+            raise ValueError('output must be one of %s' % ', '.join(OUTPUTS))
+
+        columns = self.internal_columns('bundle.id' if table == 'bundles' else 'file.id', keys, None)
+        builder = TableBuilder(columns)
+        builder.add_rows(self.internal_iter_search(table, columns, self.internal_query(query), sorting, limit,
+                                                   page_size))
+        return builder.build(output)
+
+    @timed
+    def download_many(self, files: Iterable[Union[WHFile, str]], dest_dir: str, workers: int=8,
+                      progress: Optional[Callable[[TransferProgress], None]]=None) -> BatchResult:
+        """Downloads files in parallel into dest_dir
+
+        Each file is stored as <dest_dir>/<file id>/<x-content-filename>, so
+        files with the same name never collide. Failed downloads do not stop
+        the others; the returned BatchResult maps file IDs to the downloaded
+        paths, or to the exception raised."""
+        _files = [f if isinstance(f, WHFile) else self.file(f) for f in files]
+        tracker = TransferProgress(len(_files), progress)
+        result = BatchResult()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(f.download, os.path.join(dest_dir, f.id, ''), True, tracker.add_bytes): f
+                       for f in _files}
+
+            for future in as_completed(futures):
+                f = futures[future]
+                try:
+                    result.results[f.id] = future.result()
+                except (WarehouseClientException, requests.RequestException, OSError) as e:
+                    result.errors[f.id] = e
+
+                tracker.item_done()
+
+        return result
+
+    @timed
+    def update_properties_many(self, updates: Union[Mapping[Any, Dict[str, Any]], Iterable[Tuple[Any, Dict[str, Any]]]],
+                               workers: int=8, table: str='bundles') -> BatchResult:
+        """Updates the properties of many bundles and files in parallel
+
+        updates maps WHBundle or WHFile objects, or IDs of objects in table
+        ('bundles' or 'files'), to the properties to set, like
+        update_properties. It may also be a sequence of (object, properties)
+        pairs; updates of the same object are merged into one request, later
+        values taking precedence. The requests are sent by up to workers
+        threads. Failed updates do not stop the others; the returned
+        BatchResult maps object IDs to the server response, or to the
+        exception raised."""
+        if table not in ('bundles', 'files'):
+            raise ValueError('table must be bundles or files')
+
+        merged: Dict[Tuple[str, str], Tuple[Union[WHBundle, WHFile], Dict[str, Any]]] = {}
+        for obj, props in (updates.items() if isinstance(updates, Mapping) else updates):
+            if isinstance(obj, str):
+                obj = self.bundle(obj) if table == 'bundles' else self.file(obj)
+            key = ('files' if isinstance(obj, WHFile) else 'bundles', obj.id)
+            if key in merged:
+                merged[key][1].update(props)
+            else:
+                merged[key] = (obj, dict(props))
+
+        result = BatchResult()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(obj.update_properties, props): obj for obj, props in merged.values()}
+
+            for future in as_completed(futures):
+                obj = futures[future]
+                try:
+                    result.results[obj.id] = future.result()
+                except (WarehouseClientException, requests.RequestException) as e:
+                    result.errors[obj.id] = e
+
+        return result
+
     def create_organization(self, name: str):
         with self.session.post('%s/organizations' % self.url, json={"name": name}) as req:
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException('returned error: %s' % req.text)
             
-            json_res = req.json()
+            json_res = response_json(req)
             return WHOrganization(self, json_res['organization_id'])
     # Deprecated camelCase methods
     # Will be removed in future release
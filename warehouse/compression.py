@@ -0,0 +1,89 @@
+"""Compression module
+
+Negotiation of compressed responses, compression of request bodies, and
+counters comparing the bytes on the wire with the decoded bytes.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import re
+import threading
+
+import urllib3.util.request
+
+from typing import Any, Dict, Optional, Tuple
+
+# Content codings urllib3 decodes while streaming: gzip and deflate, plus
+# br and zstd when the brotli and zstandard modules are installed
+ACCEPT_ENCODING = ', '.join(re.split(r',\s*', urllib3.util.request.ACCEPT_ENCODING))
+
+# Collections whose next path segment identifies an object, by ID or name,
+# and is replaced by {id} in endpoint names
+COLLECTIONS = frozenset(('bundles', 'files', 'projects', 'organizations', 'subscriptions'))
+
+
+def compress_json(obj: Any, threshold: int) -> Tuple[bytes, Dict[str, str], int]:
+    """Returns obj encoded as JSON, gzip compressed if larger than threshold, its headers and decoded size"""
+    body = json.dumps(obj).encode('utf-8')
+    size = len(body)
+    headers = {'Content-Type': 'application/json'}
+    if size > threshold:
+        body = gzip.compress(body, 6)
+        headers['Content-Encoding'] = 'gzip'
+
+    return body, headers, size
+
+
+def endpoint_name(method: str, path: str) -> str:
+    """Returns the endpoint of a request, e.g. 'GET /bundles/{id}'
+
+    The segment after a collection name is replaced whatever its shape, so
+    project and organization names do not create an endpoint each."""
+    segments = []
+    previous = None
+    for segment in path.split('/'):
+        if previous in COLLECTIONS and segment:
+            segment = '{id}'
+        segments.append(segment)
+        previous = segment
+
+    return '%s %s' % (method.upper(), '/'.join(segments))
+
+
+class TransferCounters():
+    """Byte counters per endpoint
+
+    For every endpoint the bytes sent and received on the wire are counted
+    next to the decoded sizes, so the effect of compression is visible.
+    Streamed responses (downloads) are not counted."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints: Dict[str, Dict[str, int]] = {}
+
+    def add(self, endpoint: str, sent: int=0, sent_decoded: int=0, received: int=0,
+            received_decoded: int=0):
+        """Adds the bytes of one request to the counters of the endpoint"""
+        with self.lock:
+            counters = self.endpoints.get(endpoint)
+            if counters is None:
+                counters = self.endpoints[endpoint] = {
+                    'requests': 0, 'sent': 0, 'sent_decoded': 0, 'received': 0, 'received_decoded': 0}
+            counters['requests'] += 1
+            counters['sent'] += sent
+            counters['sent_decoded'] += sent_decoded
+            counters['received'] += received
+            counters['received_decoded'] += received_decoded
+
+    def stats(self, endpoint: Optional[str]=None) -> Dict[str, Any]:
+        """Returns a copy of the counters, keyed by endpoint, or of a single endpoint"""
+        with self.lock:
+            if endpoint is not None:
+                return dict(self.endpoints.get(endpoint, {}))
+            return {name: dict(counters) for name, counters in self.endpoints.items()}
+
+    def clear(self):
+        """Resets all counters"""
+        with self.lock:
+            self.endpoints.clear()
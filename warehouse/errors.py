@@ -3,3 +3,7 @@
 
 class WarehouseClientException(Exception):
     """Exception thrown on warehouse related errors"""
+
+
+class ChecksumMismatchException(WarehouseClientException):
+    """Exception thrown when downloaded contents do not match the expected checksum"""
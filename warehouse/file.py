@@ -2,49 +2,135 @@
 from __future__ import annotations
 
 import os
+import posixpath
 import shutil
+import threading
+import time
 
-from warehouse.errors import WarehouseClientException
+import requests
+
+from warehouse.checksum import CHECKSUM_PROPERTY, MultiHasher, check_digests, expected_digests, hash_file
+from warehouse.errors import ChecksumMismatchException, WarehouseClientException
+from warehouse.jsondecode import response_json
+from warehouse.metrics import timed
+from warehouse.properties import PropertyBuffer, property_operations
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Any, Optional, Tuple
+
+# Size of the first range of a segmented download, which also tells whether
+# the server supports ranges
+SEGMENT_PROBE_SIZE = 1024 * 1024
+
+
+def preallocate(fd: int, size: int):
+    """Reserves size bytes for the file, using posix_fallocate where available"""
+    os.ftruncate(fd, size)
+    if hasattr(os, 'posix_fallocate') and size > 0:
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError:
+            pass
+
+
+PWRITE_LOCK = threading.Lock()
+
+
+def pwrite(fd: int, data: bytes, position: int):
+    """Writes all of data at the given position of the file"""
+    view = memoryview(data)
+    while view:
+        if hasattr(os, 'pwrite'):
+            written = os.pwrite(fd, view, position)
+        else:
+            with PWRITE_LOCK:
+                os.lseek(fd, position, os.SEEK_SET)
+                written = os.write(fd, view)
+        view = view[written:]
+        position += written
 
-from typing import Dict, Any, List, Optional
 
 class WHFile():
     """Class representing a single warehouse file"""
 
-    def __init__(self, wh: 'Client', file_id: str):
+    __slots__ = ('wh', 'id', 'properties', 'digests')
+
+    def __init__(self, wh: 'Client', file_id: str, properties: Optional[Dict[str, Any]]=None):
         self.wh = wh
         self.id = file_id
+        # Values of the search keys requested when this object was found,
+        # keyed by search key. None if it was not returned by a search.
+        self.properties = properties
+        # Digests computed by the last verified download or upload
+        self.digests: Optional[Dict[str, str]] = None
 
     def __str__(self):
         return 'WHFile(id=%s)' % self.id
 
+    @timed
     def get_properties(self) -> Dict[str, Any]:
         """Returns the properties associated with this file"""
+        cache = self.wh.property_cache
+        if cache is not None:
+            document = cache.get(('files', self.id))
+            if document is not None:
+                return document
+
         with self.wh.session.get('%s/files/%s' % (self.wh.url, self.id)) as req:
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error getting properties: %s' % req.text)
-            return req.json()
+            document = response_json(req)
+
+        if cache is not None:
+            cache.put(('files', self.id), document)
 
+        return document
+
+    def internal_invalidate(self):
+        """Internal removal of the file and its bundle from the property cache, and of all cached searches"""
+        self.wh.internal_invalidate_searches()
+        cache = self.wh.property_cache
+        if cache is None:
+            return
+
+        document = cache.pop(('files', self.id))
+        if document is not None and document.get('bundle_id'):
+            cache.invalidate(('bundles', document['bundle_id']))
+        else:
+            # The bundle is unknown, and its file list may have changed
+            cache.invalidate_matching(lambda key: key[0] == 'bundles')
+
+    @timed
     def update_properties(self, props: Dict[str, Any]):
         """Update the file properties with the provided values"""
-        request_json: List[Dict[str, Any]] = []
-        for key, value in props.items():
-            if value is None:
-                request_json.append({'delete': {'key': key}})
-            else:
-                request_json.append({'assign': {'key': key, 'value': value}})
+        request_json = property_operations(props)
 
         with self.wh.session.patch('%s/files/%s' % (self.wh.url, self.id), json=request_json) as req:
+            # The bundle document lists the file with its properties
+            self.internal_invalidate()
+
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error updating properties: %s' % req.text)
 
-            return req.json()
+            return response_json(req)
+
+    def batched_updates(self, max_delay: Optional[float]=None, max_keys: Optional[int]=None) -> PropertyBuffer:
+        """Returns a buffer coalescing property updates of this file into single requests
+
+        with file.batched_updates() as b:
+            b.update_properties({'status': 'running'})
+            ...
+
+        See PropertyBuffer for the flush thresholds."""
+        return PropertyBuffer(self, max_delay, max_keys)
 
     def trash(self):
         """Trash this file"""
         with self.wh.session.post('%s/files/%s/trash' % (self.wh.url, self.id)) as req:
+            self.internal_invalidate()
+
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error trashing file: %s' % req.text)
@@ -52,6 +138,8 @@ class WHFile():
     def restore(self):
         """Restore this file from trash"""
         with self.wh.session.post('%s/files/%s/restore' % (self.wh.url, self.id)) as req:
+            self.internal_invalidate()
+
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error restoring file: %s' % req.text)
@@ -59,42 +147,408 @@ class WHFile():
     def delete(self):
         """Permanently delete this file"""
         with self.wh.session.delete('%s/files/%s' % (self.wh.url, self.id)) as req:
+            self.internal_invalidate()
+
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error deleting file: %s' % req.text)
 
 
-    def download(self, path: Optional[str]=None, create_dirs: bool=False):
-        """Download this file"""
+    @staticmethod
+    def safe_filename(filename: str) -> str:
+        """Returns a server provided filename as a relative path without '..' components"""
+        normalized = posixpath.normpath('/' + filename.replace('\\', '/'))
+        parts = [part for part in normalized.split('/') if part not in ('', '.', '..')]
+        return os.path.join(*parts) if parts else 'download'
+
+    @staticmethod
+    def target_filename(req: requests.Response, path: Optional[str]) -> str:
+        """Returns the download target for a response and the path passed to download()"""
+        return WHFile.target_path(req.headers.get('x-content-filename'), path)
+
+    @staticmethod
+    def target_path(server_filename: Optional[str], path: Optional[str]) -> str:
+        """Returns the download target for a server provided filename and the path passed to download()"""
+        filename = "download"
+
+        if server_filename is not None:
+            filename = WHFile.safe_filename(server_filename)
+
+        if path is not None:
+            basename = os.path.basename(path)
+            if not basename:
+                filename = os.path.join(os.path.dirname(path), filename)
+            else:
+                filename = path
+
+        return filename
+
+    @staticmethod
+    def response_validator(req: requests.Response) -> Optional[str]:
+        """Returns a strong validator for the response usable in If-Range, or None"""
+        etag = req.headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            return etag
+
+        return req.headers.get('Last-Modified')
+
+    @staticmethod
+    def resume_state(filename: str) -> Tuple[int, Optional[str]]:
+        """Returns the size and validator of a partial download, (0, None) if it cannot be resumed"""
+        try:
+            with open(filename + '.part.validator', 'r', encoding='utf-8') as f:
+                validator = f.read().strip()
+            offset = os.path.getsize(filename + '.part')
+        except OSError:
+            return 0, None
+
+        return (offset, validator) if validator else (0, None)
+
+    @timed
+    def download(self, path: Optional[str]=None, create_dirs: bool=False,
+                 progress: Optional[Callable[[int], None]]=None, resume: bool=False, retries: int=3,
+                 segments: int=1, segment_size: Optional[int]=None, verify: Any=None):
+        """Download this file
+
+        progress is called with the size of every chunk written.
+
+        With verify, digests of the contents are computed while the chunks are
+        written, and the file is only moved into place if they match (see
+        expected_digests for the accepted values, e.g. True to check the
+        checksum property of the file, or {'sha256': '...'}). Otherwise the
+        partial file is removed and ChecksumMismatchException raised. The
+        computed digests are stored in the digests attribute.
+
+        With segments > 1 the file is fetched as byte ranges over up to
+        segments parallel connections, see download_segmented. Segmented
+        downloads always start from scratch, so resume cannot be combined
+        with them.
+
+        With resume, an existing <filename>.part from an earlier attempt is
+        continued with a Range request, if the server answers with the
+        remaining bytes of the same version of the file (206 and a matching
+        ETag/Last-Modified validator). Otherwise the file is downloaded from
+        the start. Interrupted transfers are resumed up to retries times
+        within the call. The validator is kept in <filename>.part.validator
+        until the download completes.
+
+        With a file_cache set on the client, the contents are looked up in
+        the cache first, keyed by the checksum property of the file or, if
+        there is none, the ETag of a HEAD request. Hits are placed at the
+        target without a transfer, and downloaded files are added to the
+        cache."""
+        if resume and segments > 1:
+            raise ValueError('resume is not supported for segmented downloads')
+
+        cache = self.wh.file_cache
+        validator, server_filename = self.internal_cache_validator(path) if cache is not None else (None, None)
+        if cache is None or validator is None:
+            return self.internal_download(path, create_dirs, progress, resume, retries, segments,
+                                          segment_size, verify)
+
+        filename = self.target_path(server_filename, path)
+        if create_dirs and os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        key = cache.key(self.id, validator)
+        if cache.get(key, filename):
+            expected_sums = self.internal_expected_digests(verify)
+            if expected_sums is None:
+                return filename
+
+            hasher = MultiHasher(expected_sums)
+            hash_file(hasher, filename)
+            self.digests = hasher.hexdigests()
+            try:
+                check_digests(expected_sums, self.digests)
+                return filename
+            except ChecksumMismatchException:
+                # A corrupted entry, download the file again
+                cache.delete(key)
+
+        filename = self.internal_download(filename, False, progress, resume, retries, segments, segment_size, verify)
+        cache.put(key, filename)
+        return filename
+
+    def internal_cache_validator(self, path: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+        """Internal lookup of the file cache validator and server filename, (None, None) if not cacheable
+
+        The checksum and filename are taken from the search keys in
+        properties, or the digests of an earlier upload or verified download,
+        before requesting the file properties. The filename is only needed
+        when path does not name the target file. Without a filename
+        property, it is taken from a HEAD request like an uncached download,
+        so the target is the same with and without the cache."""
+        need_filename = path is None or not os.path.basename(path)
+        found = self.properties or {}
+        checksum = found.get('file.%s' % CHECKSUM_PROPERTY) or self.digests
+        filename = found.get('file.filename')
+
+        if not (isinstance(checksum, dict) and checksum) or (need_filename and filename is None):
+            properties = self.get_properties()
+            checksum = properties.get(CHECKSUM_PROPERTY)
+            filename = properties.get('filename')
+
+        validator = None
+        if isinstance(checksum, dict) and checksum:
+            validator = ','.join('%s:%s' % (algorithm, value) for algorithm, value in sorted(checksum.items()))
+            if not need_filename or filename is not None:
+                return validator, filename
+
+        with self.wh.session.head('%s/files/%s/download' % (self.wh.url, self.id)) as req:
+            if req.status_code < 200 or req.status_code >= 300:
+                return None, None
+            return validator or self.response_validator(req), req.headers.get('x-content-filename', filename)
+
+    def internal_download(self, path: Optional[str]=None, create_dirs: bool=False,
+                          progress: Optional[Callable[[int], None]]=None, resume: bool=False, retries: int=3,
+                          segments: int=1, segment_size: Optional[int]=None, verify: Any=None):
+        """Internal download bypassing the file cache, see download"""
+        if segments > 1:
+            return self.download_segmented(path, create_dirs, progress, retries, segments, segment_size, verify)
+
         url = '%s/files/%s/download' % (self.wh.url, self.id)
-        with self.wh.session.get(url, stream=True) as req:
-            req.raise_for_status()
+        filename = path if path is not None and os.path.basename(path) else None
+        expected_sums = self.internal_expected_digests(verify)
+        attempt = 0
 
-            filename = "download"
+        while True:
+            offset, validator = self.resume_state(filename) if resume and filename else (0, None)
+            headers = {'Range': 'bytes=%d-' % offset, 'If-Range': validator} if offset else {}
 
             try:
-                filename = req.headers['x-content-filename']
-            except KeyError:
-                pass
-    
-            if path is not None:
-                basename = os.path.basename(path)
-                if not basename:
-                    filename = os.path.join(os.path.dirname(path), filename)
-                else:
-                    filename = path
+                with self.wh.session.get(url, stream=True, headers=headers) as req:
+                    if req.status_code == 416 and offset:
+                        # The partial file does not match the file on the server
+                        os.unlink(filename + '.part')
+                        continue
+
+                    req.raise_for_status()
+
+                    if filename is None:
+                        filename = self.target_filename(req, path)
+                        if resume and self.resume_state(filename)[0]:
+                            # A partial download exists, request the remainder
+                            continue
+
+                    if create_dirs and os.path.dirname(filename):
+                        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+                    content_range = req.headers.get('Content-Range', '')
+                    append = (req.status_code == 206 and content_range.startswith('bytes %d-' % offset)
+                              and self.response_validator(req) in (None, validator))
+                    if req.status_code == 206 and not append:
+                        # Not the requested range of the expected version, start over
+                        os.unlink(filename + '.part')
+                        continue
+
+                    if not append:
+                        offset = 0
+                        if resume:
+                            with open(filename + '.part.validator', 'w', encoding='utf-8') as f:
+                                f.write(self.response_validator(req) or '')
 
-                if create_dirs:
-                    os.makedirs(os.path.dirname(filename), exist_ok=True)
+                    expected = None
+                    if '/' in content_range and not content_range.endswith('/*'):
+                        expected = int(content_range.rsplit('/', 1)[1])
+                    elif 'Content-Length' in req.headers and 'Content-Encoding' not in req.headers:
+                        expected = int(req.headers['Content-Length'])
 
-            with open(filename + '.part', 'wb') as f:
-                for chunk in req.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+                    hasher = None
+                    if expected_sums is not None:
+                        hasher = MultiHasher(expected_sums)
+                        if append:
+                            hash_file(hasher, filename + '.part', offset)
+
+                    with open(filename + '.part', 'ab' if append else 'wb') as f:
+                        for chunk in req.iter_content(chunk_size=64 * 1024):
+                            if chunk:
+                                f.write(chunk)
+                                if hasher is not None:
+                                    hasher.update(chunk)
+                                if progress is not None:
+                                    progress(len(chunk))
+
+                        size = f.tell()
+
+                    if expected is not None and size != expected:
+                        raise requests.exceptions.ChunkedEncodingError(
+                            'incomplete download: %d of %d bytes' % (size, expected))
+
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout):
+                if not resume or attempt >= retries:
+                    raise
+
+                time.sleep(min(0.5 * 2 ** attempt, 10.0))
+                attempt += 1
+                continue
+
+            if hasher is not None:
+                self.internal_check_digests(filename, expected_sums, hasher.hexdigests())
 
             shutil.move(filename + '.part', filename)
+            if resume:
+                try:
+                    os.unlink(filename + '.part.validator')
+                except OSError:
+                    pass
+
             return filename
 
+    def internal_expected_digests(self, verify: Any) -> Optional[Dict[str, Optional[str]]]:
+        """Internal lookup of the digests to compute for a download, see expected_digests"""
+        if verify is None or verify is False:
+            return None
+
+        properties = None if isinstance(verify, dict) else self.get_properties()
+        return expected_digests(verify, properties)
+
+    def internal_check_digests(self, filename: str, expected: Dict[str, Optional[str]], computed: Dict[str, str]):
+        """Internal digest check, removing the partial download on mismatch"""
+        self.digests = computed
+        try:
+            check_digests(expected, computed)
+        except ChecksumMismatchException:
+            for suffix in ('.part', '.part.validator'):
+                try:
+                    os.unlink(filename + suffix)
+                except OSError:
+                    pass
+            raise
+
+    def download_segmented(self, path: Optional[str]=None, create_dirs: bool=False,
+                           progress: Optional[Callable[[int], None]]=None, retries: int=3, segments: int=4,
+                           segment_size: Optional[int]=None, verify: Any=None):
+        """Download this file as byte ranges fetched in parallel
+
+        The first range doubles as a probe for range support. The remaining
+        bytes are split into ranges of segment_size bytes (by default evenly
+        over the segments), fetched by up to segments threads and written
+        with positional writes into <filename>.part, preallocated to the full
+        size, which is renamed into place when complete. Every range is
+        requested with If-Range, so a file changing on the server mid-way
+        is detected. Servers without range support are read in a single
+        stream. progress may be called from several threads.
+
+        When a range fails, the ranges not yet started are cancelled and the
+        running ones stop at their next chunk before the error is raised.
+
+        As ranges complete out of order, verify needs one read pass over the
+        completed file before it is renamed."""
+        url = '%s/files/%s/download' % (self.wh.url, self.id)
+        probe_size = segment_size or SEGMENT_PROBE_SIZE
+        expected_sums = self.internal_expected_digests(verify)
+
+        with self.wh.session.get(url, stream=True, headers={'Range': 'bytes=0-%d' % (probe_size - 1)}) as req:
+            content_range = req.headers.get('Content-Range', '')
+            if req.status_code != 206 or not content_range.startswith('bytes 0-') or content_range.endswith('/*'):
+                # No usable range support (or an empty file), read a single stream
+                if req.status_code != 416:
+                    req.raise_for_status()
+                req.close()
+                return self.internal_download(path, create_dirs, progress, retries=retries, verify=expected_sums)
+
+            total = int(content_range.rsplit('/', 1)[1])
+            validator = self.response_validator(req)
+            filename = self.target_filename(req, path)
+
+            if create_dirs and os.path.dirname(filename):
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+            fd = os.open(filename + '.part', os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o666)
+            try:
+                preallocate(fd, total)
+                position = self.write_range(fd, req, 0, progress)
+                if position < min(probe_size, total):
+                    raise requests.exceptions.ChunkedEncodingError('incomplete range 0-%d' % (probe_size - 1))
+                req.close()
+
+                remaining = total - position
+                if remaining > 0:
+                    size = segment_size or max(-(-remaining // segments), SEGMENT_PROBE_SIZE)
+                    ranges = [(start, min(start + size, total) - 1) for start in range(position, total, size)]
+                    cancelled = threading.Event()
+                    executor = ThreadPoolExecutor(max_workers=segments)
+                    futures = [executor.submit(self.fetch_range, url, fd, start, end, validator, progress, retries,
+                                               cancelled) for start, end in ranges]
+                    try:
+                        for future in as_completed(futures):
+                            future.result()
+                    finally:
+                        # Stop the other ranges on failure, before fd is closed
+                        cancelled.set()
+                        for future in futures:
+                            future.cancel()
+                        executor.shutdown(wait=True)
+            except BaseException:
+                os.close(fd)
+                os.unlink(filename + '.part')
+                raise
+
+            os.close(fd)
+
+        if expected_sums is not None:
+            hasher = MultiHasher(expected_sums)
+            hash_file(hasher, filename + '.part')
+            self.internal_check_digests(filename, expected_sums, hasher.hexdigests())
+
+        os.replace(filename + '.part', filename)
+        return filename
+
+    @staticmethod
+    def write_range(fd: int, req: requests.Response, position: int,
+                    progress: Optional[Callable[[int], None]], cancelled: Optional[threading.Event]=None) -> int:
+        """Writes a response body at the given position, returning the position after it
+
+        Stops early once cancelled is set."""
+        for chunk in req.iter_content(chunk_size=256 * 1024):
+            if cancelled is not None and cancelled.is_set():
+                break
+            if chunk:
+                pwrite(fd, chunk, position)
+                position += len(chunk)
+                if progress is not None:
+                    progress(len(chunk))
+
+        return position
+
+    def fetch_range(self, url: str, fd: int, start: int, end: int, validator: Optional[str],
+                    progress: Optional[Callable[[int], None]], retries: int,
+                    cancelled: Optional[threading.Event]=None):
+        """Fetches bytes start-end (inclusive) into fd, continuing after dropped connections
+
+        Returns without completing the range once cancelled is set."""
+        position = start
+        attempt = 0
+        while position <= end:
+            if cancelled is not None and cancelled.is_set():
+                return
+
+            headers = {'Range': 'bytes=%d-%d' % (position, end)}
+            if validator:
+                headers['If-Range'] = validator
+
+            try:
+                with self.wh.session.get(url, stream=True, headers=headers) as req:
+                    req.raise_for_status()
+                    if req.status_code != 206 or not req.headers.get('Content-Range', '').startswith(
+                            'bytes %d-%d/' % (position, end)):
+                        raise WarehouseClientException(
+                            'file changed during segmented download: %s' % req.headers.get('Content-Range'))
+
+                    position = self.write_range(fd, req, position, progress, cancelled)
+                    if position <= end and not (cancelled is not None and cancelled.is_set()):
+                        raise requests.exceptions.ChunkedEncodingError(
+                            'incomplete range %d-%d' % (start, end))
+            except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.Timeout):
+                if attempt >= retries:
+                    raise
+
+                time.sleep(min(0.5 * 2 ** attempt, 10.0))
+                attempt += 1
+
     # Deprecated camelCase methods
     # Will be removed in future release
     getProperties = get_properties
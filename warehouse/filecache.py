@@ -0,0 +1,199 @@
+"""Download cache module
+
+Keeps downloaded file contents in a local directory, keyed by file ID and a
+content validator, so repeated downloads of the same version of a file are
+served from disk instead of the network.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore
+
+# ioctl request cloning a file on copy-on-write filesystems (btrfs, XFS)
+FICLONE = 0x40049409
+
+
+class FileCache():
+    """Content-addressed on-disk cache of downloaded files
+
+    Entries are stored under <directory>/objects, named by a hash of the
+    file ID and validator (a checksum of the contents, or the ETag), so a
+    new version of a file never hits an old entry. Entries are inserted by
+    writing a temporary file and renaming it into place, and eviction is
+    serialized with an flock on <directory>/lock, so several processes can
+    share a directory.
+
+    When the total size exceeds max_bytes, the least recently used entries
+    are removed. Hits update the modification time of the entry, which
+    serves as its last use across processes.
+
+    Hits are copied to the download target as a reflink where the
+    filesystem supports it, and as a plain copy otherwise. With hardlink,
+    a hard link is tried first; this is the cheapest, but the target then
+    shares its contents with the cache and must not be modified in place."""
+
+    def __init__(self, directory: str, max_bytes: int=10 * 1024 ** 3, hardlink: bool=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hardlink = hardlink
+        self.objects = os.path.join(directory, 'objects')
+        os.makedirs(self.objects, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.inserts = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(file_id: str, validator: str) -> str:
+        """Returns the cache key for a version of a file"""
+        return hashlib.sha256(('%s\0%s' % (file_id, validator)).encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> str:
+        """Returns the path of the entry for the key"""
+        return os.path.join(self.objects, key)
+
+    def get(self, key: str, target: str) -> bool:
+        """Places the entry for the key at target, returning False on a miss"""
+        source = self.path(key)
+        try:
+            os.utime(source)
+            if self.hardlink and os.path.exists(target) and os.path.samefile(source, target):
+                # Already linked by an earlier hit
+                with self.lock:
+                    self.hits += 1
+                return True
+            self.place(source, target + '.part', self.hardlink)
+        except FileNotFoundError:
+            if os.path.exists(source):
+                raise
+            # Not cached, or evicted by another process in the meantime
+            with self.lock:
+                self.misses += 1
+            return False
+
+        os.replace(target + '.part', target)
+        with self.lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, source: str):
+        """Stores a copy of the file at source for the key, then evicts over budget"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects, prefix='.tmp')
+        os.close(fd)
+        try:
+            self.place(source, tmp_path, False)
+            os.replace(tmp_path, self.path(key))
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self.lock:
+            self.inserts += 1
+        self.evict()
+
+    def delete(self, key: str):
+        """Removes the entry for the key"""
+        try:
+            os.unlink(self.path(key))
+        except OSError:
+            pass
+
+    def evict(self, max_bytes: Optional[int]=None):
+        """Removes least recently used entries until the cache fits max_bytes"""
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        with open(os.path.join(self.directory, 'lock'), 'a', encoding='utf-8') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+
+            entries = []
+            total = 0
+            for entry in os.scandir(self.objects):
+                if entry.name.startswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            entries.sort()
+            evicted = 0
+            for _, size, path in entries:
+                if total <= budget:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                evicted += 1
+
+        with self.lock:
+            self.evictions += evicted
+
+    def clear(self):
+        """Removes all entries"""
+        self.evict(0)
+
+    def size(self) -> int:
+        """Returns the total size of the entries in bytes"""
+        total = 0
+        for entry in os.scandir(self.objects):
+            try:
+                total += entry.stat().st_size
+            except OSError:
+                pass
+        return total
+
+    def stats(self) -> Dict[str, float]:
+        """Returns a dictionary with hit, miss, insert and eviction counters of this process"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'inserts': self.inserts,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    @staticmethod
+    def place(source: str, target: str, hardlink: bool):
+        """Makes target a copy of source, as a hard link, reflink or plain copy"""
+        if hardlink:
+            try:
+                if os.path.lexists(target):
+                    os.unlink(target)
+                os.link(source, target)
+                return
+            except FileNotFoundError:
+                if not os.path.exists(source):
+                    raise
+            except OSError:
+                pass
+
+        with open(source, 'rb') as src:
+            with open(target, 'wb') as dst:
+                if fcntl is not None:
+                    try:
+                        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+                        return
+                    except OSError:
+                        pass
+                shutil.copyfileobj(src, dst, 1024 * 1024)
@@ -0,0 +1,205 @@
+"""HTTP response cache module
+
+Stores GET response bodies together with their validators (ETag and
+Last-Modified), so repeated reads can be revalidated with a conditional
+request and served from the store when the server answers 304 Not Modified.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore
+
+
+class ResponseStore(ABC):
+    """Base class for response cache storage
+
+    Entries are dictionaries with the keys 'status_code', 'headers' and
+    'content' (bytes)."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored entry for the key, or None"""
+
+    @abstractmethod
+    def put(self, key: str, entry: Dict[str, Any]):
+        """Stores an entry for the key"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Removes the entry for the key"""
+
+
+class MemoryResponseStore(ResponseStore):
+    """In-memory response store with least recently used eviction"""
+
+    def __init__(self, maxsize: int=1024):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class DiskResponseStore(ResponseStore):
+    """Persistent response store keeping one file per entry in a directory
+
+    Entries survive between processes, so short-lived jobs start with a warm
+    cache. Files are replaced atomically and the directory can be shared by
+    several processes.
+
+    When the store holds more than max_entries entries or max_bytes bytes,
+    the least recently used entries are removed until it is down to 90% of
+    both limits. Hits update the modification time of the entry, which
+    serves as its last use across processes. The size of the directory is
+    counted once and then tracked from the entries this process writes, so
+    entries written by other processes are only seen by the next eviction."""
+
+    def __init__(self, directory: str, max_entries: int=10000, max_bytes: int=1024 ** 3):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.evictions = 0
+        # Estimated number of entries and bytes, None until the first scan
+        self.entries: Optional[int] = None
+        self.bytes = 0
+
+    def path(self, key: str) -> str:
+        """Returns the path of the file holding the entry for the key"""
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                content = f.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('key') != key or len(content) != meta.get('length'):
+            return None
+
+        return {'status_code': meta['status_code'], 'headers': meta['headers'], 'content': content}
+
+    def put(self, key: str, entry: Dict[str, Any]):
+        meta = {
+            'key': key,
+            'status_code': entry['status_code'],
+            'headers': entry['headers'],
+            'length': len(entry['content']),
+        }
+        header = json.dumps(meta).encode('utf-8') + b'\n'
+        if self.entries is None:
+            self.scan()
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header)
+                f.write(entry['content'])
+            os.replace(tmp_path, self.path(key))
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return
+
+        with self.lock:
+            # Replaced entries are counted twice until the next eviction
+            self.entries = (self.entries or 0) + 1
+            self.bytes += len(header) + len(entry['content'])
+            over = self.entries > self.max_entries or self.bytes > self.max_bytes
+
+        if over:
+            self.evict(int(self.max_entries * 0.9), int(self.max_bytes * 0.9))
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self.path(key))
+        except OSError:
+            pass
+
+    def scan(self) -> List[Tuple[float, int, str]]:
+        """Returns the modification time, size and path of the entries, and updates the size estimate"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('.'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        with self.lock:
+            self.entries = len(entries)
+            self.bytes = total
+        return entries
+
+    def evict(self, max_entries: Optional[int]=None, max_bytes: Optional[int]=None):
+        """Removes least recently used entries until the store fits max_entries and max_bytes"""
+        max_entries = self.max_entries if max_entries is None else max_entries
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+
+        with open(os.path.join(self.directory, '.lock'), 'a', encoding='utf-8') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+
+            entries = sorted(self.scan())
+            count = len(entries)
+            total = sum(size for _, size, _ in entries)
+            evicted = 0
+            for _, size, path in entries:
+                if count <= max_entries and total <= max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                count -= 1
+                total -= size
+                evicted += 1
+
+        with self.lock:
+            self.entries = count
+            self.bytes = total
+            self.evictions += evicted
+
+    def clear(self):
+        """Removes all entries"""
+        self.evict(0, 0)
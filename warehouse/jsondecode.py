@@ -0,0 +1,136 @@
+"""JSON decoding module
+
+Decodes response bodies with the fastest available decoder (orjson when it
+is installed, the json module otherwise), and parses large arrays in
+responses incrementally while they are received.
+"""
+from __future__ import annotations
+
+import codecs
+import json
+
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+JSON_LOADS: Callable[[Any], Any] = orjson.loads if orjson is not None else json.loads
+
+WHITESPACE = ' \t\r\n'
+
+
+def set_json_decoder(decoder: Optional[Callable[[Any], Any]]=None):
+    """Sets the function decoding JSON responses, called with bytes
+
+    None restores the default, orjson.loads if available, else json.loads."""
+    global JSON_LOADS  # pylint: disable=global-statement
+    if decoder is None:
+        decoder = orjson.loads if orjson is not None else json.loads
+    JSON_LOADS = decoder
+
+
+def loads(data: Any) -> Any:
+    """Decodes a JSON document from bytes or str with the configured decoder"""
+    return JSON_LOADS(data)
+
+
+def response_json(res: Any) -> Any:
+    """Decodes the body of a requests response with the configured decoder"""
+    return JSON_LOADS(res.content)
+
+
+class JSONStream():
+    """Incremental reader of JSON values from a stream of bytes chunks
+
+    Values are decoded one at a time with the scanner of the json module,
+    reading more chunks whenever the buffered text ends inside a value, so
+    only the value being decoded is held in memory."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.scanner = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Appends the next chunk to the buffer, returning False at the end of the stream"""
+        while not self.eof:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                self.eof = True
+                text = self.decoder.decode(b'', final=True)
+            else:
+                text = self.decoder.decode(chunk)
+
+            if text:
+                self.buf = self.buf[self.pos:] + text
+                self.pos = 0
+                return True
+
+        return False
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character, '' at the end of the stream"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars: str) -> str:
+        """Consumes the next character, which must be one of chars"""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('invalid JSON stream: expected one of %r, got %r' % (chars, char))
+        self.pos += 1
+        return char
+
+    def value(self) -> Any:
+        """Decodes the next value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.scanner.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.fill():
+                    continue
+                raise
+
+            # A number or literal ending with the buffer may continue in the next chunk
+            if end == len(self.buf) and self.buf[self.pos] not in '[{"' and self.fill():
+                continue
+
+            self.pos = end
+            return value
+
+
+def iter_json_array(chunks: Iterable[bytes], key: str) -> Iterator[Any]:
+    """Yields the elements of the array at key of the JSON object in chunks as they are decoded
+
+    Raises KeyError if the object has no such key."""
+    stream = JSONStream(chunks)
+    stream.expect('{')
+    if stream.peek() == '}':
+        raise KeyError(key)
+
+    while True:
+        name = stream.value()
+        stream.expect(':')
+        if name == key:
+            stream.expect('[')
+            if stream.peek() == ']':
+                return
+            while True:
+                yield stream.value()
+                if stream.expect(',]') == ']':
+                    return
+
+        stream.value()
+        if stream.expect(',}') == '}':
+            raise KeyError(key)
@@ -0,0 +1,241 @@
+"""Metrics module
+
+Request and method timings of a client, with callbacks for exporting them
+to monitoring systems such as Prometheus or OpenTelemetry.
+"""
+from __future__ import annotations
+
+import functools
+import sys
+import threading
+import time
+import warnings
+
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+
+
+class RepeatedRequestWarning(UserWarning):
+    """Warning issued when the same URL is fetched repeatedly in a short time"""
+
+
+class MetricEvent():
+    """A completed request or method call, passed to metrics callbacks
+
+    kind is 'request' for HTTP requests, named by endpoint (e.g.
+    'GET /bundles/{id}'), and 'call' for methods of the client API, named by
+    qualified name (e.g. 'WHBundle.upload_file'). status is the HTTP status,
+    None for calls and failed requests; attempt is 0 for the first request
+    and counts the retries after it; error is the exception raised, if
+    any."""
+
+    __slots__ = ('kind', 'name', 'duration', 'status', 'attempt', 'error')
+
+    def __init__(self, kind: str, name: str, duration: float, status: Optional[int]=None, attempt: int=0,
+                 error: Optional[BaseException]=None):
+        self.kind = kind
+        self.name = name
+        self.duration = duration
+        self.status = status
+        self.attempt = attempt
+        self.error = error
+
+    def __str__(self):
+        return 'MetricEvent(kind=%s, name=%s, duration=%.3f)' % (self.kind, self.name, self.duration)
+
+
+class Histogram():
+    """Cumulative histogram with fixed bucket bounds, like a Prometheus histogram"""
+
+    def __init__(self, buckets: Tuple[float, ...]=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """Adds a value"""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns the count, sum and cumulative counts keyed by upper bound"""
+        cumulative: Dict[float, int] = {}
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            cumulative[bound] = total
+
+        return {'count': self.count, 'sum': self.sum, 'buckets': cumulative}
+
+
+class Metrics():
+    """Request and method call metrics of a client
+
+    Requests are counted per endpoint with a latency histogram, the status
+    codes, retries and errors; calls of the client API per method with a
+    latency histogram and errors. Every completed request and call is also
+    passed as a MetricEvent to the callbacks, which must be thread-safe and
+    fast as they run in the calling thread; exceptions they raise are
+    counted in callback_errors and otherwise ignored.
+
+    With repeat_window set, a RepeatedRequestWarning is issued when the same
+    URL is fetched with GET repeat_threshold times within repeat_window
+    seconds, which usually means a loop fetching objects one by one (an N+1
+    pattern). Repeated URLs are counted in stats()['repeated']."""
+
+    def __init__(self, repeat_window: Optional[float]=None, repeat_threshold: int=3):
+        self.repeat_window = repeat_window
+        self.repeat_threshold = repeat_threshold
+        self.lock = threading.Lock()
+        self.callbacks: List[Callable[[MetricEvent], None]] = []
+        self.callback_errors = 0
+        self.requests: Dict[str, Dict[str, Any]] = {}
+        self.calls: Dict[str, Dict[str, Any]] = {}
+        self.recent_gets: Dict[str, Deque[float]] = {}
+        self.repeated: Dict[str, int] = {}
+
+    def add_callback(self, callback: Callable[[MetricEvent], None]):
+        """Registers a function called with every MetricEvent"""
+        with self.lock:
+            self.callbacks = self.callbacks + [callback]
+
+    def remove_callback(self, callback: Callable[[MetricEvent], None]):
+        """Unregisters a callback"""
+        with self.lock:
+            self.callbacks = [c for c in self.callbacks if c is not callback]
+
+    def record_request(self, endpoint: str, duration: float, status: Optional[int], attempt: int=0,
+                       error: Optional[BaseException]=None):
+        """Records a request to an endpoint, attempt being the number of the retry (0 if none)"""
+        with self.lock:
+            counters = self.requests.get(endpoint)
+            if counters is None:
+                counters = self.requests[endpoint] = {
+                    'requests': 0, 'errors': 0, 'retries': 0, 'statuses': {}, 'latency': Histogram()}
+            counters['requests'] += 1
+            if attempt > 0:
+                counters['retries'] += 1
+            counters['latency'].observe(duration)
+            if error is not None:
+                counters['errors'] += 1
+            else:
+                counters['statuses'][status] = counters['statuses'].get(status, 0) + 1
+
+        self.internal_emit(MetricEvent('request', endpoint, duration, status, attempt, error))
+
+    def record_call(self, name: str, duration: float, error: Optional[BaseException]=None):
+        """Records a completed call of a client method"""
+        with self.lock:
+            counters = self.calls.get(name)
+            if counters is None:
+                counters = self.calls[name] = {'calls': 0, 'errors': 0, 'latency': Histogram()}
+            counters['calls'] += 1
+            counters['latency'].observe(duration)
+            if error is not None:
+                counters['errors'] += 1
+
+        self.internal_emit(MetricEvent('call', name, duration, error=error))
+
+    def check_repeated(self, method: str, url: str):
+        """Warns if url was fetched repeat_threshold times within repeat_window seconds"""
+        if self.repeat_window is None or method.upper() != 'GET':
+            return
+
+        now = time.monotonic()
+        with self.lock:
+            times = self.recent_gets.setdefault(url, deque())
+            times.append(now)
+            while times and times[0] < now - self.repeat_window:
+                times.popleft()
+            # Drop other URLs that went quiet, so the table does not grow without bounds
+            if len(self.recent_gets) > 10000:
+                for key in [key for key, value in self.recent_gets.items()
+                            if not value or value[-1] < now - self.repeat_window]:
+                    del self.recent_gets[key]
+
+            repeated = len(times) >= self.repeat_threshold
+            if repeated:
+                self.repeated[url] = self.repeated.get(url, 0) + 1
+                times.clear()
+
+        if repeated:
+            warnings.warn('GET %s requested %d times within %g seconds, consider caching or batching' % (
+                url, self.repeat_threshold, self.repeat_window), RepeatedRequestWarning,
+                stacklevel=caller_stacklevel())
+
+    def internal_emit(self, event: MetricEvent):
+        """Internal delivery of an event to the callbacks"""
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception:  # pylint: disable=broad-except
+                with self.lock:
+                    self.callback_errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns a copy of the request and call counters, with histograms as dictionaries"""
+        with self.lock:
+            return {
+                'requests': {endpoint: dict(counters, statuses=dict(counters['statuses']),
+                                            latency=counters['latency'].as_dict())
+                             for endpoint, counters in self.requests.items()},
+                'calls': {name: dict(counters, latency=counters['latency'].as_dict())
+                          for name, counters in self.calls.items()},
+                'repeated': dict(self.repeated),
+                'callback_errors': self.callback_errors,
+            }
+
+    def clear(self):
+        """Resets all counters"""
+        with self.lock:
+            self.requests.clear()
+            self.calls.clear()
+            self.recent_gets.clear()
+            self.repeated.clear()
+            self.callback_errors = 0
+
+
+def caller_stacklevel() -> int:
+    """Returns the warnings stacklevel of the first caller outside this package and requests
+
+    The level is counted from the function calling this one."""
+    frame = sys._getframe(2)  # pylint: disable=protected-access
+    level = 2
+    while frame is not None and frame.f_globals.get('__name__', '').split('.')[0] in ('warehouse', 'requests'):
+        frame = frame.f_back
+        level += 1
+    return level
+
+
+def timed(method: Callable[..., Any]) -> Callable[..., Any]:
+    """Decorator recording the duration of a client API method in the metrics of its client
+
+    The client is the object itself, or its wh attribute for bundles,
+    files and projects."""
+    name = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        metrics = getattr(getattr(self, 'wh', self), 'metrics', None)
+        if metrics is None:
+            return method(self, *args, **kwargs)
+
+        started = time.monotonic()
+        error = None
+        try:
+            return method(self, *args, **kwargs)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            metrics.record_call(name, time.monotonic() - started, error)
+
+    return wrapper
@@ -0,0 +1,213 @@
+"""Multipart module
+
+Encodes multipart/form-data request bodies as a stream of chunks, so large
+uploads are sent without holding the body in memory.
+"""
+from __future__ import annotations
+
+import io
+import mmap
+import socket
+import uuid
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+CHUNK_SIZE = 256 * 1024
+
+Source = Union[bytes, bytearray, memoryview, io.IOBase, Iterable[bytes]]
+
+
+def iter_chunks(data: Any, chunk_size: int=CHUNK_SIZE) -> Tuple[Iterator[bytes], Optional[int]]:
+    """Returns an iterator over the chunks of data and its size, None if unknown
+
+    data is bytes-like, a binary file object (read from its current
+    position), or an iterable of bytes-like chunks."""
+    if isinstance(data, FileRegion):
+        return data, len(data)
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        view = memoryview(data).cast('B')
+        return (view[offset:offset + chunk_size] for offset in range(0, len(view), chunk_size)), len(view)
+
+    if hasattr(data, 'read'):
+        size = None
+        try:
+            if data.seekable():
+                position = data.tell()
+                size = data.seek(0, io.SEEK_END) - position
+                data.seek(position)
+        except (AttributeError, OSError):
+            pass
+
+        return read_chunks(data, chunk_size), size
+
+    if isinstance(data, str) or not hasattr(data, '__iter__'):
+        raise TypeError('data must be bytes, a binary file object or an iterable of bytes')
+
+    return iter(data), None
+
+
+def read_chunks(f: Any, chunk_size: int) -> Iterator[bytes]:
+    """Yields chunks read from a binary file object until end of file"""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        if isinstance(chunk, str):
+            raise TypeError('file must be opened in binary mode')
+        yield chunk
+
+
+class MultipartEncoder():
+    """Streaming multipart/form-data body
+
+    Parts are added with add_field and add_file, and the body is produced
+    chunk by chunk by iterating over the encoder, reading file parts as it
+    goes, so memory use does not depend on the size of the parts. A field
+    value may be a callable, which is called when the part is reached; this
+    allows a part to depend on the data streamed before it.
+
+    len is the size of the body if the size of every part is known, and
+    None otherwise. requests sends the body with a Content-Length header in
+    the first case, and with chunked transfer encoding in the second."""
+
+    def __init__(self, boundary: Optional[str]=None, chunk_size: int=CHUNK_SIZE):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.parts: List[Tuple[bytes, Any, Optional[int]]] = []
+
+    @property
+    def content_type(self) -> str:
+        """Content-Type header of the body"""
+        return 'multipart/form-data; boundary=%s' % self.boundary
+
+    @property
+    def len(self) -> Optional[int]:
+        """Size of the body in bytes, None if unknown"""
+        total = len(self.closing())
+        for head, _, length in self.parts:
+            if length is None:
+                return None
+            total += len(head) + length + 2
+
+        return total
+
+    def add_field(self, name: str, value: Union[str, bytes, Callable[[], bytes]], length: Optional[int]=None,
+                  content_type: Optional[str]=None):
+        """Adds a form field
+
+        A callable value is called when the part is reached, and must then
+        return length bytes, if a length is given."""
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        if isinstance(value, bytes):
+            length = len(value)
+
+        self.parts.append((self.head(name, None, content_type, {}), value, length))
+
+    def add_file(self, name: str, data: Source, filename: Optional[str]=None,
+                 content_type: str='application/octet-stream', length: Optional[int]=None):
+        """Adds a file part, see iter_chunks for the accepted data
+
+        The size of file objects and bytes is determined automatically,
+        the size of an iterable may be passed as length."""
+        chunks, size = iter_chunks(data, self.chunk_size)
+        if size is None:
+            size = length
+
+        headers = {'Content-Length': str(size)} if size is not None else {}
+        self.parts.append((self.head(name, filename, content_type, headers), chunks, size))
+
+    def head(self, name: str, filename: Optional[str], content_type: Optional[str],
+             headers: Dict[str, str]) -> bytes:
+        """Returns the boundary and headers preceding a part"""
+        disposition = 'form-data; name="%s"' % name
+        if filename is not None:
+            disposition += '; filename="%s"' % filename.replace('"', '%22')
+
+        lines = ['--%s' % self.boundary, 'Content-Disposition: %s' % disposition]
+        if content_type is not None:
+            lines.append('Content-Type: %s' % content_type)
+        lines.extend('%s: %s' % item for item in headers.items())
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8')
+
+    def closing(self) -> bytes:
+        """Returns the final boundary"""
+        return ('--%s--\r\n' % self.boundary).encode('ascii')
+
+    def segments(self) -> Iterator[Union[bytes, memoryview, FileRegion]]:
+        """Yields the body as chunks, with file regions left unread
+
+        This lets a sender transfer file regions directly, e.g. with
+        sendfile. Iterating over the encoder reads them instead."""
+        for head, value, length in self.parts:
+            yield head
+
+            if callable(value):
+                value = value()
+                if length is not None and len(value) != length:
+                    raise ValueError('part is %d bytes, expected %d' % (len(value), length))
+
+            if isinstance(value, (bytes, FileRegion)):
+                yield value
+            else:
+                sent = 0
+                for chunk in value:
+                    if chunk:
+                        sent += len(chunk)
+                        yield chunk
+                if length is not None and sent != length:
+                    raise ValueError('part is %d bytes, expected %d' % (sent, length))
+
+            yield b'\r\n'
+
+        yield self.closing()
+
+    def __iter__(self) -> Iterator[Union[bytes, memoryview]]:
+        for segment in self.segments():
+            if isinstance(segment, FileRegion):
+                yield from segment
+            else:
+                yield segment
+
+
+class FileRegion():
+    """The first length bytes of an open binary file, as a multipart file part
+
+    Senders with access to the socket transfer it with sendfile. Otherwise
+    iterating over it yields memoryview slices of a read-only memory map of
+    the file, so its contents are not copied into Python buffers."""
+
+    def __init__(self, f: Any, length: int, chunk_size: int=CHUNK_SIZE):
+        self.f = f
+        self.length = length
+        self.chunk_size = chunk_size
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[memoryview]:
+        if self.length == 0:
+            return
+
+        m = mmap.mmap(self.f.fileno(), self.length, access=mmap.ACCESS_READ)
+        try:
+            view = memoryview(m)
+            for offset in range(0, self.length, self.chunk_size):
+                yield view[offset:offset + self.chunk_size]
+            view.release()
+        finally:
+            try:
+                m.close()
+            except BufferError:
+                # A slice is still referenced, the map is closed when it is released
+                pass
+
+    def sendfile(self, sock: socket.socket):
+        """Sends the region over a socket, without copying it to user space where supported"""
+        if self.length == 0:
+            return
+
+        sent = sock.sendfile(self.f, 0, self.length)
+        if sent != self.length:
+            raise ValueError('file is %d bytes, expected %d' % (sent, self.length))
@@ -5,10 +5,13 @@ import uuid
 
 from warehouse.project import WHProject
 from warehouse.errors import WarehouseClientException
+from warehouse.jsondecode import response_json
 
 class WHOrganization():
     """Class representing a warehouse organization"""
 
+    __slots__ = ('wh', 'id')
+
     def __init__(self, wh: 'Client', organization_id: str):
         self.wh = wh
         self.id = organization_id
@@ -32,11 +35,12 @@ class WHOrganization():
                 raise WarehouseClientException(
                     'error getting project info: %s' % req.text)
 
-            return req.json()
+            return response_json(req)
     
     def delete(self):
         """Deletes the organization"""
         with self.wh.session.delete('%s/organizations/%s' % (self.wh.url, self.id)) as req:
+            self.wh.internal_invalidate_searches()
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error deleting organization: %s' % req.text)
@@ -47,6 +51,6 @@ class WHOrganization():
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException('returned error: %s' % req.text)
             
-            json_res = req.json()
+            json_res = response_json(req)
 
             return WHProject(self.wh, json_res['project_id'])
\ No newline at end of file
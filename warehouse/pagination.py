@@ -0,0 +1,113 @@
+"""Pagination module"""
+from __future__ import annotations
+
+from warehouse.sorting import Sorting
+
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+
+class KeysetPaginator():
+    """State of a search fetched one page at a time
+
+    Pages are fetched using keyset pagination: each page is requested with an
+    additional condition on the sorting key, starting after the last value of
+    the previous page. Without sorting, results are ordered by ID. When the
+    sorting key is not the ID, rows sharing the boundary value are requested
+    again and skipped by ID, so ties never drop or repeat rows. Rows without
+    a value for the sorting key cannot be placed relative to a boundary, so
+    the pages only cover rows that have one. Once they are exhausted, the
+    rows without a value are paged by ID and returned last.
+
+    The paginator performs no requests itself. The caller alternates between
+    next_page(), which returns the query and limit of the next request, and
+    feed(), which takes the returned rows and returns the rows to yield, until
+    done is set. This lets blocking and asyncio clients share the logic."""
+
+    def __init__(self, wh: Any, keys: List[str], query: Dict[str, Any], sorting: Optional[Sorting],
+                 limit: int, page_size: int):
+        id_key = keys[0]
+        if not sorting or (not sorting.key and not sorting.sort and not sorting.order):
+            sorting = Sorting(None, 'asc', id_key)
+
+        if sorting.key and sorting.key not in keys:
+            keys = keys + [sorting.key]
+
+        self.wh = wh
+        self.keys = keys
+        self.query = query
+        # Query of the pages, limited to rows with a value for the sorting key
+        self.page_query = query
+        if sorting.key and sorting.key != id_key:
+            self.page_query = wh.and_query([query, wh.natural_query('%s exists' % sorting.key)])
+        self.id_key = id_key
+        self.sorting = sorting
+        self.limit = limit
+        self.page_size = page_size
+        self.done = False
+
+        # Without a key there is nothing to paginate on, so everything is read
+        # in a single request
+        self.single = not sorting.key
+        self.sort_index = keys.index(sorting.key) if sorting.key else 0
+        self.unique = sorting.key == id_key
+        self.boundary: Any = None
+        self.boundary_ids: Set[str] = set()
+        self.count = 0
+        self.page_limit = 0
+
+    def next_page(self) -> Tuple[Dict[str, Any], int]:
+        """Returns the query and limit for the next request"""
+        if self.single:
+            return self.query, self.limit
+
+        query = self.page_query
+        if self.boundary is not None:
+            compare = self.wh.less_than_query if self.sorting.order == 'desc' else self.wh.greater_than_query
+            query = self.wh.and_query([self.page_query, compare(self.sorting.key, self.boundary, inclusive=not self.unique)])
+
+        self.page_limit = self.page_size + len(self.boundary_ids)
+        if self.limit > 0:
+            self.page_limit = min(self.page_limit, self.limit - self.count + len(self.boundary_ids))
+
+        return query, self.page_limit
+
+    def feed(self, rows: Sequence[Sequence[Any]]) -> Sequence[Sequence[Any]]:
+        """Processes the rows of the last request, returning the rows to yield"""
+        if self.single:
+            self.done = True
+            return rows
+
+        new_rows = [row for row in rows if row[0] not in self.boundary_ids]
+        self.count += len(new_rows)
+
+        if self.limit > 0 and self.count >= self.limit:
+            self.done = True
+            return new_rows
+
+        if len(rows) < self.page_limit:
+            if self.unique:
+                self.done = True
+            else:
+                self.page_missing()
+            return new_rows
+
+        last = rows[-1][self.sort_index]
+        if self.unique:
+            self.boundary = last
+        else:
+            if last != self.boundary:
+                self.boundary_ids = set()
+            self.boundary = last
+            self.boundary_ids.update(row[0] for row in rows if row[self.sort_index] == last)
+
+        return new_rows
+
+    def page_missing(self):
+        """Continues with the rows without a value for the sorting key, paged by ID"""
+        key = self.sorting.key
+        self.page_query = self.wh.and_query([self.query, self.wh.natural_query('not (%s exists)' % key)])
+        self.sorting = Sorting(None, 'asc', self.id_key)
+        self.sort_index = 0
+        self.unique = True
+        self.boundary = None
+        self.boundary_ids = set()
@@ -4,14 +4,22 @@ from __future__ import annotations
 from warehouse.file import WHFile
 from warehouse.bundle import WHBundle
 from warehouse.errors import WarehouseClientException
+from warehouse.jsondecode import response_json
+from warehouse.metrics import timed
+from warehouse.resultset import ResultSet
 from warehouse.sorting import Sorting
 
+import time
 import uuid
-from typing import Optional, Dict, Any, Union, List
+from typing import Optional, Dict, Any, Union, List, Iterator
+
+import requests
 
 class WHProject():
     """Class representing a warehouse project"""
 
+    __slots__ = ('wh', 'id')
+
     def __init__(self, wh: 'Client', project_id: str):
         self.wh = wh
         self.id = project_id
@@ -35,10 +43,10 @@ class WHProject():
                 raise WarehouseClientException(
                     'error getting project info: %s' % req.text)
 
-            return req.json()
+            return response_json(req)
 
-    def find_bundles(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0) -> List[WHBundle]:
-        """Performs a search for bundles within this project"""
+    def internal_query(self, query: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Internal conversion of a str or dict query to a query object limited to this project"""
         # pyright: reportUnnecessaryIsInstance=false
         items = [self.query_param()]
         if isinstance(query, str):
@@ -49,46 +57,57 @@ class WHProject():
         else:
             raise ValueError('only str and dict are supported as query types')
 
-        query_obj = self.wh.and_query(items)
-        return self.wh.internal_find_bundles(query_obj, sorting, limit)
+        return self.wh.and_query(items)
+
+    @timed
+    def find_bundles(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                     keys: Optional[List[str]]=None, compact: bool=False) -> Union[List[WHBundle], ResultSet]:
+        """Performs a search for bundles within this project, see Client.find_bundles for compact"""
+        return self.wh.internal_find_bundles(self.internal_query(query), sorting, limit, keys, compact)
+
+    def iter_bundles(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                     page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> Iterator[WHBundle]:
+        """Returns a generator yielding bundles within this project, fetched one page at a time"""
+        return self.wh.internal_iter_bundles(self.internal_query(query), sorting, limit, page_size, keys)
 
-    def find_bundle(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None) -> Optional[WHBundle]:
+    def find_bundle(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None,
+                    keys: Optional[List[str]]=None) -> Optional[WHBundle]:
         """Performs a search for a single bundle within this project"""
         try:
-            return self.find_bundles(query, sorting, 1)[0]
+            return self.find_bundles(query, sorting, 1, keys)[0]
         except IndexError:
             return None
 
-    def find_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0) -> List[WHFile]:
-        """Performs a search for files within this project"""
-        items = [self.query_param()]
-        if isinstance(query, str):
-            items.append(self.wh.naturalQuery(query))
-        elif isinstance(query, dict):
-            for key, value in query.items():
-                items.append(self.wh.strMatchesQuery(key, value))
-        else:
-            raise ValueError('only str and dict are supported as query types')
+    @timed
+    def find_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                   keys: Optional[List[str]]=None, compact: bool=False) -> Union[List[WHFile], ResultSet]:
+        """Performs a search for files within this project, see Client.find_files for compact"""
+        return self.wh.internal_find_files(self.internal_query(query), sorting, limit, keys, compact)
 
-        query_obj = self.wh.andQuery(items)
-        return self.wh.internal_find_files(query_obj, sorting, limit)
+    def iter_files(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None, limit: int=0,
+                   page_size: Optional[int]=None, keys: Optional[List[str]]=None) -> Iterator[WHFile]:
+        """Returns a generator yielding files within this project, fetched one page at a time"""
+        return self.wh.internal_iter_files(self.internal_query(query), sorting, limit, page_size, keys)
 
-    def find_file(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None) -> Optional[WHFile]:
+    def find_file(self, query: Union[str, Dict[str, Any]], sorting: Optional[Sorting]=None,
+                  keys: Optional[List[str]]=None) -> Optional[WHFile]:
         """Performs a search for a single file within this project"""
         try:
-            return self.find_files(query, sorting, 1)[0]
+            return self.find_files(query, sorting, 1, keys)[0]
         except IndexError:
             return None
 
+    @timed
     def create_bundle(self, params: Dict[str, Any]) -> WHBundle:
         """Creates a bundle within this project, and returns the WHBundle object"""
         url = '%s/projects/%s/bundles' % (self.wh.url,
                                           self.id.replace('/', '%2F'))
         with self.wh.session.post(url, json=params) as req:
+            self.wh.internal_invalidate_searches()
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException('returned error: %s' % req.text)
 
-            json_res = req.json()
+            json_res = response_json(req)
 
             bundle_id = json_res.get('bundle_id')
             if not bundle_id:
@@ -99,6 +118,7 @@ class WHProject():
     def delete(self):
         """Deletes the project"""
         with self.wh.session.delete('%s/projects/%s' % (self.wh.url, self.id.replace('/', '%2F'))) as req:
+            self.wh.internal_invalidate_searches()
             if req.status_code < 200 or req.status_code >= 300:
                 raise WarehouseClientException(
                     'error deleting project: %s' % req.text)
@@ -110,7 +130,7 @@ class WHProject():
                 raise WarehouseClientException(
                     'error creating subscription: %s' % req.text)
         
-        return uuid.UUID(req.json().get('subscription_id'))
+        return uuid.UUID(response_json(req).get('subscription_id'))
     
     def delete_subscription(self, subscription_id: uuid.UUID):
         """Delete subscription"""
@@ -126,19 +146,47 @@ class WHProject():
                 raise WarehouseClientException(
                     'error polling subscription: %s' % req.text)
         
-        return req.json()
+        return response_json(req)
 
-    def wait_events(self):
-        """Returns generator yielding events"""
-        subscription_id = self.create_subscription()
+    def wait_events(self, max_backoff: float=30.0):
+        """Returns generator yielding events
+
+        Failed polls are retried with exponential backoff, up to max_backoff
+        seconds between attempts. A poll rejected by the server, as for an
+        expired subscription, creates a new subscription. The subscription
+        is deleted when the generator is closed."""
+        subscription_id: Optional[uuid.UUID] = self.create_subscription()
+        backoff = 0.0
         try:
             while True:
                 try:
-                    yield self.subscription_wait(subscription_id)
-                except Exception as e:
-                    print(e)
+                    if subscription_id is None:
+                        subscription_id = self.create_subscription()
+                    events = self.subscription_wait(subscription_id)
+                    backoff = 0.0
+                except WarehouseClientException:
+                    if subscription_id is not None:
+                        self.internal_discard_subscription(subscription_id)
+                        subscription_id = None
+                    backoff = min(max(backoff * 2, 0.5), max_backoff)
+                    time.sleep(backoff)
+                    continue
+                except requests.RequestException:
+                    backoff = min(max(backoff * 2, 0.5), max_backoff)
+                    time.sleep(backoff)
+                    continue
+
+                yield events
         finally:
+            if subscription_id is not None:
+                self.delete_subscription(subscription_id)
+
+    def internal_discard_subscription(self, subscription_id: uuid.UUID):
+        """Internal deletion of a subscription that may no longer exist"""
+        try:
             self.delete_subscription(subscription_id)
+        except (WarehouseClientException, requests.RequestException):
+            pass
 
     # Deprecated camelCase methods
     # Will be removed in future release
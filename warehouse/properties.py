@@ -0,0 +1,103 @@
+"""Properties module"""
+from __future__ import annotations
+
+import threading
+
+from typing import Any, Dict, List, Optional
+
+
+def property_operations(props: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Returns the PATCH operations setting the provided properties
+
+    Properties with the value None are deleted"""
+    request_json: List[Dict[str, Any]] = []
+    for key, value in props.items():
+        if value is None:
+            request_json.append({'delete': {'key': key}})
+        else:
+            request_json.append({'assign': {'key': key, 'value': value}})
+
+    return request_json
+
+
+class PropertyBuffer():
+    """Write-behind buffer of property updates for one bundle or file
+
+    update_properties records the properties locally, later values of a key
+    replacing earlier ones (None still deletes the key), and flush() sends
+    all of them in a single PATCH through the update_properties method of
+    the target. The buffer is flushed when the with block exits, when it
+    holds max_keys keys, and max_delay seconds after the first buffered
+    update (from a timer thread). Errors of timer flushes are raised by the
+    next call. If a flush fails, its updates are kept for the next one,
+    unless overwritten in the meantime."""
+
+    def __init__(self, target: Any, max_delay: Optional[float]=None, max_keys: Optional[int]=None):
+        self.target = target
+        self.max_delay = max_delay
+        self.max_keys = max_keys
+        self.pending: Dict[str, Any] = {}
+        self.lock = threading.RLock()
+        self.timer: Optional[threading.Timer] = None
+        self.error: Optional[Exception] = None
+        self.flushes = 0
+
+    def __enter__(self) -> PropertyBuffer:
+        return self
+
+    def __exit__(self, *args: Any):
+        self.flush()
+
+    def update_properties(self, props: Dict[str, Any]):
+        """Buffers the provided properties, see update_properties of the target"""
+        with self.lock:
+            self.raise_error()
+            self.pending.update(props)
+
+            if self.max_keys is not None and len(self.pending) >= self.max_keys:
+                self.flush()
+            elif self.max_delay is not None and self.timer is None and self.pending:
+                self.timer = threading.Timer(self.max_delay, self.timer_flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """Sends the buffered updates, if any"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+            self.raise_error()
+            if not self.pending:
+                return
+
+            props = self.pending
+            self.pending = {}
+            try:
+                self.target.update_properties(props)
+            except Exception:
+                self.pending = dict(props, **self.pending)
+                raise
+
+            self.flushes += 1
+
+    def timer_flush(self):
+        """Flushes from the timer thread, keeping the error for the next call"""
+        with self.lock:
+            if self.timer is not threading.current_thread():
+                # Cancelled while waiting for the lock
+                return
+
+            self.timer = None
+            try:
+                self.flush()
+            except Exception as e:  # pylint: disable=broad-except
+                self.error = e
+
+    def raise_error(self):
+        """Raises the error of the last timer flush, if any"""
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
@@ -0,0 +1,160 @@
+"""Result set module
+
+Compact storage of search results, for searches returning many rows.
+"""
+from __future__ import annotations
+
+import uuid
+
+from array import array
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+UUID_SIZE = 16
+
+
+class IdColumn():
+    """Column of object IDs
+
+    IDs in canonical UUID form are packed into 16 bytes each. The column
+    falls back to a list of strings at the first ID in another form."""
+
+    def __init__(self):
+        self.packed: Optional[bytearray] = bytearray()
+        self.values: List[str] = []
+
+    def __len__(self) -> int:
+        if self.packed is not None:
+            return len(self.packed) // UUID_SIZE
+        return len(self.values)
+
+    def __getitem__(self, index: int) -> str:
+        if self.packed is not None:
+            start = index * UUID_SIZE
+            return str(uuid.UUID(bytes=bytes(self.packed[start:start + UUID_SIZE])))
+        return self.values[index]
+
+    def append(self, value: str):
+        """Adds an ID to the end of the column"""
+        if self.packed is not None:
+            try:
+                parsed = uuid.UUID(value)
+            except (AttributeError, TypeError, ValueError):
+                parsed = None
+            if parsed is not None and str(parsed) == value:
+                self.packed += parsed.bytes
+                return
+            self.values = [self[i] for i in range(len(self))]
+            self.packed = None
+
+        self.values.append(value)
+
+
+class Column():
+    """Column of search key values
+
+    Integer and float values are stored in typed arrays, 8 bytes each. The
+    column falls back to a list at the first value that does not fit, such
+    as a string, None, or a mix of integers and floats."""
+
+    def __init__(self):
+        self.values: Union[array, List[Any], None] = None
+
+    def __len__(self) -> int:
+        return len(self.values) if self.values is not None else 0
+
+    def __getitem__(self, index: int) -> Any:
+        if self.values is None:
+            raise IndexError(index)
+        return self.values[index]
+
+    def append(self, value: Any):
+        """Adds a value to the end of the column"""
+        if self.values is None:
+            if type(value) is int:  # pylint: disable=unidiomatic-typecheck
+                self.values = array('q')
+            elif type(value) is float:  # pylint: disable=unidiomatic-typecheck
+                self.values = array('d')
+            else:
+                self.values = []
+
+        if isinstance(self.values, array):
+            # bool is a subclass of int, and a float array would turn ints into floats
+            expected = int if self.values.typecode == 'q' else float
+            if type(value) is expected:  # pylint: disable=unidiomatic-typecheck
+                try:
+                    self.values.append(value)
+                    return
+                except OverflowError:
+                    pass
+            self.values = self.values.tolist()
+
+        self.values.append(value)
+
+
+class ResultSet(Sequence):
+    """Compact sequence of search results
+
+    Rows are stored as columns of IDs and search key values instead of one
+    object per row. WHBundle and WHFile objects are created on indexing and
+    iteration, so a new object is returned every time; keep a reference when
+    an object is used repeatedly. Slicing returns a list of objects."""
+
+    def __init__(self, factory: Callable[[str, Optional[Dict[str, Any]]], Any], keys: Optional[List[str]]=None):
+        self.factory = factory
+        self.keys = keys
+        self.id_column = IdColumn()
+        self.columns: Dict[str, Column] = {key: Column() for key in keys or []}
+
+    def __str__(self):
+        return 'ResultSet(rows=%d)' % len(self)
+
+    def __len__(self) -> int:
+        return len(self.id_column)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.internal_object(i) for i in range(*index.indices(len(self)))]
+
+        length = len(self)
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError('result set index out of range')
+
+        return self.internal_object(index)
+
+    def __iter__(self) -> Iterator[Any]:
+        for index in range(len(self)):
+            yield self.internal_object(index)
+
+    def internal_object(self, index: int) -> Any:
+        """Internal creation of the object of a row"""
+        properties = None
+        if self.keys is not None:
+            properties = {key: self.columns[key][index] for key in self.keys}
+
+        return self.factory(self.id_column[index], properties)
+
+    def append(self, object_id: str, properties: Optional[Dict[str, Any]]=None):
+        """Adds a row with the ID and the values of the search keys"""
+        for key, column in self.columns.items():
+            column.append(properties[key] if properties is not None else None)
+        self.id_column.append(object_id)
+
+    def extend_rows(self, columns: List[str], rows: Iterable[Sequence[Any]]):
+        """Adds raw search result rows, the ID first, then the values of columns"""
+        indexes = [(columns.index(key), column) for key, column in self.columns.items()]
+        for row in rows:
+            for index, column in indexes:
+                column.append(row[index])
+            self.id_column.append(row[0])
+
+    def ids(self) -> List[str]:
+        """Returns the IDs of all rows"""
+        return [self.id_column[i] for i in range(len(self))]
+
+    def column(self, key: str) -> List[Any]:
+        """Returns the values of a search key for all rows"""
+        column = self.columns[key]
+        return [column[i] for i in range(len(self))]
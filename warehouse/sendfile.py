@@ -0,0 +1,116 @@
+"""Sendfile module
+
+Sends multipart request bodies on a dedicated connection, transferring file
+parts with socket.sendfile so their contents are not copied through Python.
+"""
+from __future__ import annotations
+
+import http.client
+import os
+import socket
+import time
+import urllib.parse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, get_environ_proxies
+
+from warehouse.admission import OVERLOAD_STATUSES
+from warehouse.compression import endpoint_name
+from warehouse.multipart import FileRegion, MultipartEncoder
+
+from typing import Any
+
+
+def sendfile_supported(session: requests.Session, url: str) -> bool:
+    """Returns True if post_sendfile can send to url
+
+    This requires os.sendfile and a plain HTTP connection without a proxy,
+    as TLS encrypts the data in user space."""
+    if not hasattr(os, 'sendfile') or urllib.parse.urlsplit(url).scheme != 'http':
+        return False
+
+    if session.proxies or (session.trust_env and get_environ_proxies(url)):
+        return False
+
+    return True
+
+
+def post_sendfile(session: Any, url: str, encoder: MultipartEncoder) -> requests.Response:
+    """POSTs the encoded body to url, sending file regions with sendfile
+
+    The request is prepared by the session, so its authentication and
+    headers apply, and sent on a new connection with the session timeouts.
+    The body must have a known length."""
+    length = encoder.len
+    if length is None:
+        raise ValueError('sendfile requires a body of known length')
+
+    prepared = session.prepare_request(requests.Request('POST', url, headers={
+        'Content-Type': encoder.content_type,
+        'Content-Length': str(length),
+        'Accept-Encoding': 'identity',
+    }))
+
+    admission = getattr(session, 'admission', None)
+    metrics = getattr(session, 'metrics', None)
+    if admission is not None:
+        admission.acquire()
+    started = time.monotonic()
+    overloaded = False
+    response = None
+    error = None
+    try:
+        response = send_prepared(session, prepared, encoder, url)
+        overloaded = response.status_code in OVERLOAD_STATUSES
+    except BaseException as e:
+        error = e
+        overloaded = isinstance(e, socket.timeout)
+        raise
+    finally:
+        latency = time.monotonic() - started
+        if admission is not None:
+            admission.release(latency, overloaded)
+        if metrics is not None:
+            metrics.record_request(endpoint_name('POST', urllib.parse.urlsplit(url).path), latency,
+                                   response.status_code if response is not None else None, 0, error)
+
+    return response
+
+
+def send_prepared(session: Any, prepared: requests.PreparedRequest, encoder: MultipartEncoder,
+                  url: str) -> requests.Response:
+    """Sends a prepared request with the encoded body on a new connection"""
+    parts = urllib.parse.urlsplit(prepared.url)
+    connect_timeout = getattr(session, 'connect_timeout', None)
+    read_timeout = getattr(session, 'read_timeout', None)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=connect_timeout)
+    try:
+        conn.putrequest('POST', parts.path + ('?' + parts.query if parts.query else ''),
+                        skip_accept_encoding=True)
+        for key, value in prepared.headers.items():
+            conn.putheader(key, value)
+        conn.endheaders()
+
+        conn.sock.settimeout(read_timeout)
+        for segment in encoder.segments():
+            if isinstance(segment, FileRegion):
+                segment.sendfile(conn.sock)
+            else:
+                conn.sock.sendall(segment)
+
+        # pylint: disable=protected-access
+        res = conn.getresponse()
+        response = requests.Response()
+        response.status_code = res.status
+        response.reason = res.reason
+        response.headers = CaseInsensitiveDict(res.getheaders())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = prepared.url or url
+        response.request = prepared
+        response._content = res.read()
+        response._content_consumed = True
+    finally:
+        conn.close()
+
+    return response
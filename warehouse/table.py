@@ -0,0 +1,121 @@
+"""Table module
+
+Conversion of search results into columns for analysis. The output formats
+require the optional numpy, pyarrow or pandas packages:
+
+    pip install warehouse-client[table]
+"""
+from __future__ import annotations
+
+import importlib
+import importlib.util
+import json
+
+from array import array
+from typing import Any, Iterable, List, Sequence
+
+from warehouse.resultset import Column
+
+OUTPUTS = ('numpy', 'arrow', 'pandas')
+
+
+def require(name: str) -> Any:
+    """Returns an optional package, raising ImportError if it is not installed
+
+    The packages are only imported by the conversions, as importing them
+    takes longer than importing the rest of the client."""
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        raise ImportError('%s is required for this output, install it or warehouse-client[table]' % name) from None
+
+
+class TableBuilder():
+    """Accumulates search result rows in typed columns
+
+    Integer and float columns are kept in arrays of 8 bytes per value while
+    rows are added, see Column, and converted once at the end."""
+
+    def __init__(self, names: List[str]):
+        self.names = names
+        self.columns = [Column() for _ in names]
+        self.rows = 0
+
+    def add_rows(self, rows: Iterable[Sequence[Any]]):
+        """Adds search result rows, with one value per column name"""
+        columns = self.columns
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(value)
+            self.rows += 1
+
+    def build(self, output: str) -> Any:
+        """Returns the table in the output format, 'numpy', 'arrow' or 'pandas'"""
+        if output == 'numpy':
+            return self.to_numpy()
+        if output == 'arrow':
+            return self.to_arrow()
+        if output == 'pandas':
+            return self.to_pandas()
+
+        raise ValueError('output must be one of %s' % ', '.join(OUTPUTS))
+
+    def numpy_column(self, column: Column) -> Any:
+        """Returns the values of a column as a numpy array
+
+        Numeric columns with missing values become float with NaN, booleans
+        become bool, and anything else, such as strings, becomes object."""
+        numpy = require('numpy')
+        values = column.values
+        if isinstance(values, array):
+            return numpy.frombuffer(values, dtype=numpy.int64 if values.typecode == 'q' else numpy.float64)
+
+        values = values or []
+        if values and all(type(v) is bool for v in values):  # pylint: disable=unidiomatic-typecheck
+            return numpy.array(values, dtype=numpy.bool_)
+        if values and all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+            return numpy.array([numpy.nan if v is None else v for v in values], dtype=numpy.float64)
+
+        result = numpy.empty(len(values), dtype=object)
+        result[:] = values
+        return result
+
+    def to_numpy(self) -> Any:
+        """Returns the table as a numpy structured array with one field per column"""
+        numpy = require('numpy')
+        columns = [self.numpy_column(column) for column in self.columns]
+        table = numpy.empty(self.rows, dtype=[(name, column.dtype) for name, column in zip(self.names, columns)])
+        for name, column in zip(self.names, columns):
+            table[name] = column
+
+        return table
+
+    def arrow_column(self, column: Column) -> Any:
+        """Returns the values of a column as a pyarrow array
+
+        Columns arrow cannot type, such as a mix of strings and numbers,
+        are stored as JSON text."""
+        pyarrow = require('pyarrow')
+        values = column.values
+        if isinstance(values, array):
+            arrow_type = pyarrow.int64() if values.typecode == 'q' else pyarrow.float64()
+            return pyarrow.Array.from_buffers(arrow_type, len(values), [None, pyarrow.py_buffer(values)])
+
+        try:
+            return pyarrow.array(values or [])
+        except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+            return pyarrow.array([None if v is None else json.dumps(v) for v in values], type=pyarrow.string())
+
+    def to_arrow(self) -> Any:
+        """Returns the table as a pyarrow Table"""
+        pyarrow = require('pyarrow')
+        return pyarrow.table([self.arrow_column(column) for column in self.columns], names=self.names)
+
+    def to_pandas(self) -> Any:
+        """Returns the table as a pandas DataFrame"""
+        pandas = require('pandas')
+        if importlib.util.find_spec('pyarrow') is not None:
+            return self.to_arrow().to_pandas()
+
+        return pandas.DataFrame({name: self.numpy_column(column) for name, column in zip(self.names, self.columns)},
+                                columns=self.names)